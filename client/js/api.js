@@ -7,28 +7,94 @@
 // ============================================================================
 
 import { currentManager, currentUniquifyCategory, isProcessing, setIsProcessing, setCurrentPath } from './state.js';
-import { renderCard, renderResultsTable } from './ui.js';
+import { renderCard, renderResultsTable, appendResultRow } from './ui.js';
+
 
 // ============================================================================
 // ФУНКЦИИ ДЛЯ РАБОТЫ С ЛОГАМИ / LOG FUNCTIONS
 // ============================================================================
 
-// Функция для получения и отображения логов с сервера
-// Function to fetch and display logs from server
+// Максимум строк лога на экране / Max log lines kept on screen
+const LOG_MAX_LINES = 200;
+
+// Функция для получения и отображения логов с сервера: после первого запроса
+// запрашиваются только новые строки после курсора
+// Function to fetch and display logs from server: after the first request
+// only new lines after the cursor are requested
 export async function fetchLogs(manager = null) {
-    const response = await fetch('/api/logs');
-    const data = await response.json();
     // Находим элемент для отображения логов / Find element to display logs
     const logsElement = document.getElementById(`logs-${manager || 'global'}`);
-    if (logsElement) {
+    if (!logsElement) return;
+    
+    const params = new URLSearchParams();
+    if (manager) params.set('manager', manager);
+    if (logsElement.dataset.cursor) params.set('cursor', logsElement.dataset.cursor);
+    const response = await fetch(`/api/logs?${params}`);
+    const data = await response.json();
+    if (data.error) return;
+    
+    if (data.reset) {
+        // Первый запрос или сброс курсора: заменяем содержимое / First request or cursor reset: replace contents
         logsElement.textContent = data.logs.join('\n');
+    } else if (data.logs.length) {
+        // Дописываем новые строки / Append new lines
+        const lines = logsElement.textContent ? logsElement.textContent.split('\n') : [];
+        logsElement.textContent = lines.concat(data.logs).slice(-LOG_MAX_LINES).join('\n');
     }
+    logsElement.dataset.cursor = data.cursor;
 }
 
 // ============================================================================
 // ФУНКЦИИ ДЛЯ РАБОТЫ С ФАЙЛОВОЙ СИСТЕМОЙ / FILE SYSTEM FUNCTIONS
 // ============================================================================
 
+// Размер страницы списка файлов / File list page size
+const LIST_PAGE_SIZE = 200;
+
+// Функция загрузки одной страницы содержимого директории
+// Function to fetch one page of directory contents
+async function fetchListPage(manager, dir_type, path, cursor = null, params = {}) {
+    const query = new URLSearchParams({manager, dir: dir_type, path, limit: LIST_PAGE_SIZE, ...params});
+    if (cursor) query.set('cursor', cursor);
+    const response = await fetch(`/api/list?${query}`);
+    return response.json();
+}
+
+// Функция загрузки всех страниц (для небольших списков категорий)
+// Function to fetch all pages (for small category lists)
+async function fetchAllChildren(manager, dir_type, path, params = {}) {
+    const children = [];
+    let cursor = null;
+    do {
+        const data = await fetchListPage(manager, dir_type, path, cursor, params);
+        children.push(...(data.children || []));
+        cursor = data.next_cursor;
+    } while (cursor);
+    return children;
+}
+
+// Функция отрисовки страницы карточек с кнопкой "Показать ещё"
+// Function to render a page of cards with a "Show more" button
+function renderListPage(data, grid, manager, path, dir_type) {
+    data.children.forEach(node => renderCard(node, grid, manager, path, dir_type));
+    if (!data.next_cursor) return;
+    const moreBtn = document.createElement('button');
+    moreBtn.textContent = `Показать ещё (${data.total - grid.querySelectorAll('.card').length})`;
+    moreBtn.classList.add('load-more-btn', 'btn-common');
+    moreBtn.onclick = async () => {
+        moreBtn.disabled = true;
+        try {
+            const next = await fetchListPage(manager, dir_type, path, data.next_cursor);
+            grid.removeChild(moreBtn);
+            renderListPage(next, grid, manager, path, dir_type);
+        } catch (error) {
+            console.error(`Ошибка при загрузке страницы для ${manager}:`, error);
+            moreBtn.disabled = false;
+        }
+    };
+    grid.appendChild(moreBtn);
+}
+
 // Функция для загрузки и отображения сетки папок для менеджера
 // Function to fetch and display folder grid for manager
 export async function fetchManagerGrid(manager, gridId, path = '', dir_type = 'photo_cache') {
@@ -36,21 +102,17 @@ export async function fetchManagerGrid(manager, gridId, path = '', dir_type = 'p
     setIsProcessing(true);
     try {
         setCurrentPath(manager, path);
-        // Загружаем список файлов и папок / Fetch files and folders list
-        const response = await fetch(`/api/list?manager=${manager}&dir=${dir_type}&path=${path}`);
-        const data = await response.json();
         const grid = document.getElementById(gridId);
         
         // Специальная логика для корня photo_cache: парное отображение с ready_photos
         // Special logic for photo_cache root: paired display with ready_photos
         if (path === '' && dir_type === 'photo_cache') {
-            // Фильтруем только директории / Filter directories only
-            const photo_dirs = data.children.filter(node => node.type === 'dir');
+            // Только директории, все страницы / Directories only, all pages
+            const photo_dirs = await fetchAllChildren(manager, 'photo_cache', '', {type: 'dir'});
             
             // Загружаем список готовых фото / Fetch ready photos list
-            const ready_response = await fetch(`/api/list?manager=${manager}&dir=ready_photos&path=`);
-            const ready_data = await ready_response.json();
-            const ready_map = new Map(ready_data.children.filter(node => node.type === 'dir').map(node => [node.name, node]));
+            const ready_dirs = await fetchAllChildren(manager, 'ready_photos', '', {type: 'dir'});
+            const ready_map = new Map(ready_dirs.map(node => [node.name, node]));
             
             // Единый fetch для всех counts / Single fetch for all counts
             const count_response = await fetch(`/api/count_ready?manager=${manager}`);
@@ -85,10 +147,11 @@ export async function fetchManagerGrid(manager, gridId, path = '', dir_type = 'p
                 grid.appendChild(row);
             }
         } else {
-            // Обычная логика для поддиректорий или ready_photos
-            // Standard logic for subdirectories or ready_photos
+            // Обычная логика для поддиректорий или ready_photos: постранично
+            // Standard logic for subdirectories or ready_photos: page by page
+            const data = await fetchListPage(manager, dir_type, path);
             grid.innerHTML = '';
-            data.children.forEach(node => renderCard(node, grid, manager, path, dir_type));
+            renderListPage(data, grid, manager, path, dir_type);
         }
     } catch (error) {
         console.error(`Ошибка при загрузке сетки для ${manager}:`, error);
@@ -148,6 +211,9 @@ export async function startUniquify() {
     // Получаем параметры уникализации / Get uniquification parameters
     const count = parseInt(document.getElementById('ad-count').value);
     const useRotation = document.getElementById('use-rotation').checked;
+    const incremental = document.getElementById('incremental').checked;
+    const trim = document.getElementById('trim').checked;
+    const lazy = document.getElementById('lazy').checked;
     
     // Валидация / Validation
     if (count < 1) {
@@ -165,7 +231,7 @@ export async function startUniquify() {
     document.getElementById(`grid-${currentManager}`).after(progressDiv);
     
     try {
-        // Отправляем запрос на сервер / Send request to server
+        // Запускаем задачу на сервере в потоковом режиме / Start job on server in streaming mode
         const response = await fetch('/api/uniquify', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
@@ -173,19 +239,45 @@ export async function startUniquify() {
                 manager: currentManager,
                 folder_name: currentUniquifyCategory,
                 count: count,
-                use_rotation: useRotation
+                use_rotation: useRotation,
+                incremental: incremental,
+                trim: trim,
+                lazy: lazy,
+                stream: true
             })
         });
-        const data = await response.json();
         
-        if (data.success) {
-            // Отображаем результаты / Display results
-            renderResultsTable(data.results, currentManager);
-            // Обновляем сетку папок / Refresh folder grid
-            await fetchManagerGrid(currentManager, `grid-${currentManager}`);
-        } else {
-            alert(`Ошибка: ${data.error}`);
+        if (!response.ok) {
+            const data = await response.json();
+            // Сервер перегружен, подсказываем когда повторить / Server is busy, suggest when to retry
+            const retry = response.status === 429 ? ` (повторите через ${data.retry_after} сек)` : '';
+            alert(`Ошибка: ${data.error}${retry}`);
+            return;
         }
+        
+        // Таблица заполняется по мере готовности объявлений / Table fills in as ads complete
+        const manager = currentManager;
+        const results = [];
+        renderResultsTable(results, manager);
+        
+        const job = await readJobStream(response, event => {
+            if (event.type === 'ad') {
+                appendResultRow(results, event.row, manager);
+            } else if (event.type === 'progress') {
+                // Показываем прогресс и оценку времени / Show progress and time estimate
+                const state = event.job;
+                const eta = state.eta_sec !== null ? `, осталось ~${Math.ceil(state.eta_sec)} сек` : '';
+                const status = state.status === 'queued' ? 'в очереди' : `${state.done} из ${state.count} (${state.images_per_sec} фото/сек${eta})`;
+                progressDiv.innerHTML = `<p>Уникализация в процессе... ${status}</p>`;
+            }
+        });
+        if (!job || job.status !== 'done') {
+            alert(`Ошибка: ${(job && job.error) || 'задача не завершена'}`);
+            return;
+        }
+        
+        // Обновляем сетку папок / Refresh folder grid
+        await fetchManagerGrid(manager, `grid-${manager}`);
     } catch (error) {
         console.error('Ошибка уникализации:', error);
         alert(`Ошибка: ${error.message}`);
@@ -195,6 +287,66 @@ export async function startUniquify() {
     }
 }
 
+// Функция получения ёмкости категории (максимум различных объявлений)
+// Function to fetch category capacity (maximum distinct ads)
+export async function fetchCapacity(manager, category) {
+    const capacityElement = document.getElementById('ad-capacity');
+    const countInput = document.getElementById('ad-count');
+    capacityElement.textContent = '';
+    countInput.removeAttribute('max');
+    try {
+        const query = new URLSearchParams({manager, category});
+        const response = await fetch(`/api/capacity?${query}`);
+        const data = await response.json();
+        if (!data.success) return;
+        
+        const capacity = data.capacity;
+        if (!capacity.feasible) {
+            capacityElement.textContent = `Не хватает уникальных фото для позиций: ${capacity.unmatched_positions.join(', ')}`;
+            return;
+        }
+        // Очень большие значения не ограничивают ввод / Very large values don't limit input
+        if (capacity.max_ads <= Number.MAX_SAFE_INTEGER) {
+            countInput.max = capacity.max_ads;
+        }
+        capacityElement.textContent = `Максимум различных объявлений: ${capacity.max_ads.toLocaleString('ru-RU')}`;
+    } catch (error) {
+        console.error('Ошибка получения ёмкости категории:', error);
+    }
+}
+
+// Функция чтения потока событий задачи уникализации (NDJSON)
+// Function to read uniquify job event stream (NDJSON)
+// Возвращает итоговое состояние задачи / Returns final job state
+async function readJobStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            // Соединение закрыто до события end / Connection closed before end event
+            return null;
+        }
+        
+        // Событие может прийти частями, разбираем только полные строки
+        // Event may arrive in parts, parse only complete lines
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (!line) continue;
+            const event = JSON.parse(line);
+            if (event.type === 'end') {
+                reader.cancel();
+                return event.job;
+            }
+            onEvent(event);
+        }
+    }
+}
+
 // Функция получения ссылок для уникализированных объявлений
 // Function to fetch links for uniquified ads
 export async function fetchLinks(manager, category) {
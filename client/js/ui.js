@@ -19,7 +19,7 @@ import {
     initManagerState,
     copyToClipboard 
 } from './state.js';
-import { fetchManagerGrid, fetchLinks, fetchLogs } from './api.js';
+import { fetchManagerGrid, fetchLinks, fetchLogs, fetchCapacity } from './api.js';
 
 // ============================================================================
 // ФУНКЦИИ РЕНДЕРИНГА КАРТОЧЕК / CARD RENDERING FUNCTIONS
@@ -150,6 +150,8 @@ export function showUniquifyModal(manager, category) {
     document.getElementById('ad-count').value = 1;
     document.getElementById('use-rotation').checked = true;
     document.getElementById('uniquify-modal').style.display = 'block';
+    // Показываем, сколько различных объявлений даёт категория / Show how many distinct ads the category gives
+    fetchCapacity(manager, category);
 }
 
 // Функция закрытия модального окна для уникализации
@@ -212,12 +214,7 @@ export function renderResultsTable(results, manager) {
     
     // Создаём тело таблицы с данными / Create table body with data
     const tbody = document.createElement('tbody');
-    results.forEach(result => {
-        const tr = document.createElement('tr');
-        // Заменяем переводы строк на <br> для отображения / Replace newlines with <br> for display
-        tr.innerHTML = `<td>${result[0]}</td><td>${result[1].replace(/\n/g, '<br>')}</td>`;
-        tbody.appendChild(tr);
-    });
+    results.forEach(result => tbody.appendChild(createResultRow(result)));
     table.appendChild(tbody);
     tableSection.appendChild(table);
 
@@ -225,6 +222,31 @@ export function renderResultsTable(results, manager) {
     document.getElementById(`grid-${manager}`).after(tableSection);
 }
 
+// Функция создания строки таблицы результатов
+// Function to create results table row
+function createResultRow(result) {
+    const tr = document.createElement('tr');
+    // Заменяем переводы строк на <br> для отображения / Replace newlines with <br> for display
+    tr.innerHTML = `<td>${result[0]}</td><td>${result[1].replace(/\n/g, '<br>')}</td>`;
+    return tr;
+}
+
+// Функция добавления строки в таблицу результатов по мере готовности объявлений
+// Function to add row to results table as ads complete
+// results - тот же массив, что передан в renderResultsTable / same array passed to renderResultsTable
+export function appendResultRow(results, result, manager) {
+    // Объявления приходят в порядке готовности, держим строки по номеру
+    // Ads arrive in completion order, keep rows ordered by number
+    let index = results.findIndex(row => row[0] > result[0]);
+    if (index === -1) index = results.length;
+    results.splice(index, 0, result);
+    
+    const tbody = document.querySelector(`#results-table-${manager} tbody`);
+    if (tbody) {
+        tbody.insertBefore(createResultRow(result), tbody.children[index] || null);
+    }
+}
+
 // Функция показа модального окна для редактирования менеджера
 // Function to show modal window for editing manager
 export function showEditManagerModal(manager) {
@@ -0,0 +1,75 @@
+"""
+Logo compositing micro-benchmark / Микро-бенчмарк наложения логотипа
+
+Compares full-frame RGBA compositing with ROI-only compositing in apply_logo_to_image.
+Сравнивает наложение через полный кадр RGBA с наложением только в области логотипа.
+
+Usage / Использование:
+    cd server
+    python benchmarks/bench_logo_compositing.py
+"""
+import os
+import sys
+import timeit
+import numpy as np
+from PIL import Image
+
+# Add the server directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import image_processing
+
+IMAGE_SIZES = [(1024, 768), (1920, 1440), (4000, 3000)]
+LOGO_SIZES = [(128, 64), (400, 200), (800, 400)]
+REPEATS = 5
+
+
+def make_image(size):
+    """Random RGB photo stand-in"""
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8), "RGB")
+
+
+def make_logo(size):
+    """Random logo with horizontal alpha gradient, like logo bank variants"""
+    rng = np.random.default_rng(1)
+    arr = rng.integers(0, 256, (size[1], size[0], 4), dtype=np.uint8)
+    arr[..., 3] = np.linspace(0, 255, size[0]).astype(np.uint8)
+    return Image.fromarray(arr, "RGBA")
+
+
+def bench(im, logo, roi):
+    """Best time of REPEATS runs in milliseconds"""
+    image_processing.USE_ROI_COMPOSITING = roi
+    # ROI path modifies the image in place, so each run gets a fresh copy (excluded from timing)
+    timer = timeit.Timer(
+        "image_processing.apply_logo_to_image(base, logo)",
+        setup="base = im.copy()",
+        globals={"image_processing": image_processing, "im": im, "logo": logo},
+    )
+    return min(timer.repeat(repeat=REPEATS, number=1)) * 1000
+
+
+def run():
+    """Run benchmark over image and logo sizes"""
+    print(f"{'image':>12} {'logo':>10} {'full, ms':>10} {'roi, ms':>10} {'speedup':>8} {'max diff':>9}")
+    for image_size in IMAGE_SIZES:
+        im = make_image(image_size)
+        for logo_size in LOGO_SIZES:
+            logo = make_logo(logo_size)
+            full_ms = bench(im, logo, roi=False)
+            roi_ms = bench(im, logo, roi=True)
+
+            # Check that both paths give the same picture / Проверяем, что оба пути дают одинаковую картинку
+            image_processing.USE_ROI_COMPOSITING = False
+            full = np.asarray(image_processing.apply_logo_to_image(im.copy(), logo), dtype=np.int16)
+            image_processing.USE_ROI_COMPOSITING = True
+            roi = np.asarray(image_processing.apply_logo_to_image(im.copy(), logo), dtype=np.int16)
+            diff = int(np.abs(full - roi).max())
+
+            print(f"{'%dx%d' % image_size:>12} {'%dx%d' % logo_size:>10} {full_ms:>10.2f} {roi_ms:>10.2f} "
+                  f"{full_ms / roi_ms:>7.1f}x {diff:>9}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,107 @@
+"""
+Uniquify job memory benchmark / Бенчмарк памяти задачи уникализации
+
+Runs process_and_generate on synthetic sources and reports peak RSS of the server process
+against the number of ads. With the bounded submission window and a file sink the peak
+should stay flat as count grows.
+Запускает process_and_generate на синтетических исходниках и показывает пиковый RSS серверного
+процесса в зависимости от числа объявлений. С ограниченным окном отправки и файловым приёмником
+пик должен оставаться ровным при росте count.
+
+Usage / Использование:
+    cd server
+    python benchmarks/bench_uniquify_memory.py [count ...]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import numpy as np
+from PIL import Image
+
+# Add the server directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import ad_processing, worker_pool
+from modules.result_sinks import FileSink
+
+COUNTS = [50, 200, 1000]
+SOURCE_SIZE = (480, 360)
+SOURCES_PER_FOLDER = 12
+SUBFOLDERS = 9
+MANAGER = "bench"
+FOLDER = "category"
+SAMPLE_INTERVAL = 0.02
+
+
+def rss_mb():
+    """Current RSS of this process in MB (Linux)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class PeakSampler(threading.Thread):
+    """Sample RSS in the background and keep the maximum"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = rss_mb()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, rss_mb())
+            time.sleep(SAMPLE_INTERVAL)
+
+    def stop(self):
+        self.running = False
+        self.join()
+        return self.peak
+
+
+def make_sources(base_dir):
+    """Smooth gradient photos in root folder and subfolders, like a photo_cache category"""
+    w, h = SOURCE_SIZE
+    folder = os.path.join(base_dir, "data", "managers", MANAGER, "photo_cache", FOLDER)
+    for sub in [""] + [f"{k + 1}" for k in range(SUBFOLDERS)]:
+        os.makedirs(os.path.join(folder, sub), exist_ok=True)
+        for n in range(SOURCES_PER_FOLDER):
+            shade = (n * 20 + len(sub) * 30) % 256
+            arr = np.empty((h, w, 3), dtype=np.uint8)
+            arr[..., 0] = np.linspace(0, 255, w, dtype=np.uint8)
+            arr[..., 1] = shade
+            arr[..., 2] = np.linspace(255, 0, h, dtype=np.uint8)[:, None]
+            Image.fromarray(arr, "RGB").save(os.path.join(folder, sub, f"{n}.jpg"), quality=90)
+
+
+def run():
+    """Run benchmark over counts"""
+    counts = [int(arg) for arg in sys.argv[1:]] or COUNTS
+    base_dir = tempfile.mkdtemp(prefix="bench_uniquify_")
+    try:
+        make_sources(base_dir)
+        ad_processing.BASE_DIR = base_dir
+        # Warm up the pool so its start is not part of the first measurement
+        ad_processing.process_and_generate(FOLDER, 1, True, MANAGER)
+
+        print(f"{'count':>7} {'ads':>7} {'time, s':>9} {'ads/s':>8} {'base RSS, MB':>13} {'peak RSS, MB':>13}")
+        for count in counts:
+            sink = FileSink(os.path.join(base_dir, f"result_{count}.jsonl"))
+            base = rss_mb()
+            sampler = PeakSampler()
+            sampler.start()
+            start = time.time()
+            result = ad_processing.process_and_generate(FOLDER, count, True, MANAGER, sink=sink)
+            elapsed = time.time() - start
+            peak = sampler.stop()
+            ads = result['count'] if isinstance(result, dict) else 0
+            print(f"{count:>7} {ads:>7} {elapsed:>9.2f} {ads / elapsed:>8.1f} {base:>13.1f} {peak:>13.1f}")
+    finally:
+        worker_pool.shutdown_worker_pool()
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
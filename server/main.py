@@ -18,14 +18,26 @@ Features / Функции:
 """
 
 import time
+import json
+import itertools
 import threading
-from flask import Flask, request, jsonify, send_from_directory, abort, Response
+from flask import Flask, request, jsonify, send_from_directory, abort, Response, stream_with_context
 import logging
 from werkzeug.exceptions import BadRequest
 import os
 import shutil
 from modules.utils import get_timestamp, log_message, is_suspicious_request, allowed_file
-from modules.ad_processing import process_and_generate, PHOTOS_PER_AD
+from modules.ad_processing import category_capacity, rebuild_ads_manifest, rebuild_ready_counts
+from modules.ads_manifest import load_ads_manifest
+from modules.ready_counts import load_ready_counts, set_ready_count, drop_ready_count
+from modules.log_reader import tail_lines, read_since
+from modules.fs_index import query_dir, encode_cursor, decode_cursor, SORT_KEYS, index_key, indexed_managers, refresh_path, rename_indexed_manager, remove_indexed_manager, start_fs_watcher
+from modules.logo_bank import ensure_logo_bank
+from modules.worker_pool import shutdown_worker_pool
+from modules.job_manager import submit_job, get_job, get_job_results, stream_job, get_scheduler_metrics, resume_interrupted_jobs, shutdown_jobs
+from modules.job_scheduler import QueueFull
+from modules.generations import resolve_ready_dir, delete_category, collect_all_generations
+from modules.lazy_render import is_lazy_photo, render_lazy_photo
 from modules.user_management import (
     register_user, verify_user_email, authenticate_user, authenticate_user_with_session,
     resend_verification_code, get_user_by_email, get_user_by_username
@@ -44,8 +56,12 @@ CHECK_INTERVAL = 30  # Interval for periodic checks in seconds / Интерва
 BASE_DIR = os.path.dirname(__file__)  # Base server directory / Базовая директория сервера
 MANAGERS_DIR = os.path.join(BASE_DIR, 'data', 'managers')  # Managers data directory / Директория данных менеджеров
 LOG_FILE = os.path.join(BASE_DIR, 'logs', 'main.txt')  # Main log file path / Путь к основному лог-файлу
+LOG_LINES = 20  # Default number of log lines / Количество строк лога по умолчанию
+LOG_MAX_LINES = 500  # Largest number of log lines per request / Наибольшее количество строк лога за запрос
 BASE_SERVER_URL = "http://109.172.39.225:5000/"  # Public server URL / Публичный URL сервера
 CLIENT_DIR = os.path.join(BASE_DIR, '..', 'client')  # Client files directory / Директория файлов клиента
+LIST_PAGE_SIZE = 200  # Default /api/list page size / Размер страницы /api/list по умолчанию
+LIST_MAX_PAGE_SIZE = 1000  # Largest /api/list page / Наибольшая страница /api/list
 
 # ===== SECURITY / БЕЗОПАСНОСТЬ =====
 ALLOWED_USER_AGENTS = ['Mozilla/5.0', 'Chrome/', 'Safari/', 'Firefox/', 'Edge/']  # Allowed browser signatures / Разрешённые подписи браузеров
@@ -81,18 +97,26 @@ def security_middleware():
 @app.route('/api/count_ready', methods=['GET'])
 @require_auth
 def count_ready():
+    """
+    Get number of ready ads per category from the counters index / Получить число готовых объявлений по категориям из индекса счётчиков
+    
+    Query parameters / Параметры запроса:
+        manager: Manager name / Имя менеджера
+    
+    Returns:
+        JSON: {'counts': {category: number of ready ads}} / {'counts': {категория: число готовых объявлений}}
+    """
     manager = request.args.get('manager')
     if not manager:
         return jsonify({'error': 'Manager required'}), 400
     try:
-        ready_base = os.path.join(MANAGERS_DIR, manager, 'ready_photos')
-        if not os.path.exists(ready_base):
+        manager_dir = os.path.join(MANAGERS_DIR, manager)
+        if not os.path.exists(os.path.join(manager_dir, 'ready_photos')):
             return jsonify({'counts': {}}), 200
-        categories = [d for d in os.listdir(ready_base) if os.path.isdir(os.path.join(ready_base, d))]
-        counts = {}
-        for cat in categories:
-            cat_path = os.path.join(ready_base, cat)
-            counts[cat] = len([d for d in os.listdir(cat_path) if os.path.isdir(os.path.join(cat_path, d))])
+        counts = load_ready_counts(manager_dir)
+        if counts is None:
+            # First request after upgrade or lost index / Первый запрос после обновления или потерянный индекс
+            counts = rebuild_ready_counts(manager_dir)
         return jsonify({'counts': counts})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -115,40 +139,96 @@ def handle_bad_request(e):
 @app.route('/api/get_links', methods=['GET'])
 @require_auth
 def get_links():
+    """
+    Get links of ready ads from the category manifest / Получить ссылки готовых объявлений из манифеста категории
+    
+    Query parameters / Параметры запроса:
+        manager: Manager name / Имя менеджера
+        category: Category name / Имя категории
+        offset: Ads to skip (default 0) / Пропустить объявлений (по умолчанию 0)
+        limit: Max ads to return (default all) / Максимум объявлений (по умолчанию все)
+    
+    Returns:
+        JSON: [ad number, links] in ad number order, 304 if If-None-Match matches the ETag
+              [номер объявления, ссылки] по порядку номеров, 304 если If-None-Match совпадает с ETag
+    """
     manager = request.args.get('manager')
     category = request.args.get('category')
     if not manager or not category:
         return jsonify({'error': 'Manager and category required'}), 400
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'Offset and limit must be integers'}), 400
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({'error': 'Offset and limit must not be negative'}), 400
     try:
         ready_base = os.path.join(MANAGERS_DIR, manager, 'ready_photos', category)
-        if not os.path.exists(ready_base):
+        if not os.path.isdir(ready_base):
             return jsonify({'error': 'Category not found'}), 404
-        ad_dirs = sorted([d for d in os.listdir(ready_base) if os.path.isdir(os.path.join(ready_base, d))])
+        loaded = load_ads_manifest(ready_base)
+        if loaded is None:
+            # Category published before manifests or changed by hand / Категория опубликована до манифестов или изменена вручную
+            rebuild_ads_manifest(ready_base)
+            loaded = load_ads_manifest(ready_base)
+        manifest, version = loaded
+        
+        etag = f"{version}-{offset}-{limit}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        
+        ads = manifest['ads']
+        page = ads[offset:offset + limit if limit is not None else None]
         results = []
-        for idx, ad_dir in enumerate(ad_dirs, 1):
-            ad_path = os.path.join(ready_base, ad_dir)
-            files = sorted([f for f in os.listdir(ad_path) if f.lower().endswith('.jpg')])
-            if len(files) == PHOTOS_PER_AD:
-                links = []
-                for file in files:
-                    rel_path = os.path.join(category, ad_dir, file)
-                    url = f"{BASE_SERVER_URL}{manager}/ready_photos/{rel_path}"
-                    links.append(url)
-                results.append([idx, "\n".join(links)])
-        return jsonify({'success': True, 'results': results})
+        for number, ad_dir, files in page:
+            links = [f"{BASE_SERVER_URL}{manager}/ready_photos/{category}/{ad_dir}/{file}" for file in files]
+            results.append([number, "\n".join(links)])
+        response = jsonify({
+            'success': True,
+            'results': results,
+            'total': len(ads),
+            'offset': offset,
+            'limit': limit,
+            'generation': manifest['generation'],
+        })
+        response.set_etag(etag)
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/logs', methods=['GET'])
 @require_auth
 def get_logs():
+    """
+    Get last log lines or lines appended after a cursor / Получить последние строки лога или строки, дописанные после курсора
+    
+    Query parameters / Параметры запроса:
+        cursor: Cursor from the previous response, omitted for the last lines / Курсор из предыдущего ответа, без него - последние строки
+        limit: Max number of lines (default LOG_LINES) / Максимум строк (по умолчанию LOG_LINES)
+        manager: Only lines of this manager / Только строки этого менеджера
+    
+    Returns:
+        JSON: logs, cursor for the next poll and reset if the cursor was moved to the tail
+              logs, курсор для следующего опроса и reset если курсор перенесён на хвост
+    """
+    manager = request.args.get('manager') or None
     try:
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            last_20 = lines[-20:] if len(lines) > 20 else lines
-            return jsonify({'logs': [line.strip() for line in last_20]})
-        return jsonify({'logs': []})
+        limit = min(int(request.args.get('limit', LOG_LINES)), LOG_MAX_LINES)
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'error': 'Cursor and limit must be integers'}), 400
+    if limit < 0 or (cursor is not None and cursor < 0):
+        return jsonify({'error': 'Cursor and limit must not be negative'}), 400
+    try:
+        if cursor is None:
+            lines, cursor = tail_lines(LOG_FILE, limit, manager)
+            reset = True
+        else:
+            lines, cursor, reset = read_since(LOG_FILE, cursor, limit, manager)
+        return jsonify({'logs': lines, 'cursor': cursor, 'reset': reset})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -156,8 +236,7 @@ def get_logs():
 @require_auth
 def list_managers():
     try:
-        managers = [d for d in os.listdir(MANAGERS_DIR) if os.path.isdir(os.path.join(MANAGERS_DIR, d))]
-        return jsonify(managers)
+        return jsonify(indexed_managers())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -186,6 +265,11 @@ def upload_logo():
         file_path = os.path.join(img_dir, 'Logo.png')
         file.save(file_path)
         log_message(f"📤 Логотип загружен для менеджера '{manager}'")
+        # Pre-generate logo variants for uniquification / Заранее создаём варианты логотипа для уникализации
+        try:
+            ensure_logo_bank(file_path)
+        except Exception as e:
+            log_message(f"⚠️ Не удалось создать банк логотипа для '{manager}': {e}")
         return jsonify({'success': True})
     return jsonify({'error': 'Invalid file'}), 400
 
@@ -217,6 +301,7 @@ def create_manager():
         os.makedirs(os.path.join(manager_path, 'photo_cache'), exist_ok=True)
         os.makedirs(os.path.join(manager_path, 'ready_photos'), exist_ok=True)
         os.makedirs(os.path.join(manager_path, 'img'), exist_ok=True)  # Logo directory / Директория для логотипа
+        refresh_path(MANAGERS_DIR)
         
         log_message(f"📁 Создана папка для менеджера '{name}'")
         return jsonify({'success': True})
@@ -252,6 +337,7 @@ def rename_manager():
             return jsonify({'error': 'New name already exists'}), 400
         
         os.rename(old_path, new_path)
+        rename_indexed_manager(old_name, new_name)
         log_message(f"🔄 Менеджер '{old_name}' переименован в '{new_name}'")
         return jsonify({'success': True})
     except Exception as e:
@@ -280,6 +366,7 @@ def delete_manager():
         
         # Remove entire manager directory / Удалить всю директорию менеджера
         shutil.rmtree(path)
+        remove_indexed_manager(name)
         log_message(f"🗑️ Менеджер '{name}' удален")
         return jsonify({'success': True})
     except Exception as e:
@@ -288,6 +375,23 @@ def delete_manager():
 @app.route('/api/list', methods=['GET'])
 @require_auth
 def list_files():
+    """
+    List one page of a directory / Получить одну страницу содержимого директории
+    
+    Query parameters / Параметры запроса:
+        manager: Manager name / Имя менеджера
+        dir: photo_cache or ready_photos / photo_cache или ready_photos
+        path: Relative directory path / Относительный путь директории
+        cursor: next_cursor of the previous page / next_cursor предыдущей страницы
+        limit: Page size (default LIST_PAGE_SIZE) / Размер страницы (по умолчанию LIST_PAGE_SIZE)
+        sort: name, mtime or size (default name) / name, mtime или size (по умолчанию name)
+        order: asc or desc (default asc) / asc или desc (по умолчанию asc)
+        type: dir or file (default both) / dir или file (по умолчанию оба)
+        details: 1 to include size, mtime, width and height / 1 чтобы включить размер, mtime, ширину и высоту
+    
+    Returns:
+        JSON: children, total and next_cursor (null on the last page) / children, total и next_cursor (null на последней странице)
+    """
     manager = request.args.get('manager')
     dir_type = request.args.get('dir')
     if not manager or dir_type not in ['photo_cache', 'ready_photos']:
@@ -297,13 +401,39 @@ def list_files():
     full_path = os.path.normpath(os.path.join(base_dir, path))
     if not full_path.startswith(base_dir) or not os.path.exists(full_path):
         return jsonify({'error': 'Invalid path'}), 400
-    items = []
-    for item in sorted(os.listdir(full_path)):
-        item_path = os.path.join(full_path, item)
-        rel_path = os.path.relpath(item_path, base_dir)
-        item_type = 'dir' if os.path.isdir(item_path) else 'file'
-        items.append({'name': item, 'type': item_type, 'path': rel_path})
-    return jsonify({'children': items})
+    
+    sort = request.args.get('sort', 'name')
+    order = request.args.get('order', 'asc')
+    kind = request.args.get('type') or None
+    if sort not in SORT_KEYS or order not in ('asc', 'desc') or kind not in (None, 'dir', 'file'):
+        return jsonify({'error': 'Invalid sort, order or type'}), 400
+    try:
+        limit = min(int(request.args.get('limit', LIST_PAGE_SIZE)), LIST_MAX_PAGE_SIZE)
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if limit < 1:
+        return jsonify({'error': 'Limit must be positive'}), 400
+    details = request.args.get('details') in ('1', 'true')
+    
+    try:
+        # Indexed query, the directory is scanned only when new or changed / Запрос к индексу, директория читается только если новая или изменилась
+        rows, total, next_after = query_dir(*index_key(full_path), sort=sort, descending=order == 'desc',
+                                            kind=kind, after=after, limit=limit, dimensions=details)
+        items = []
+        for row in rows:
+            rel_path = os.path.relpath(os.path.join(full_path, row['name']), base_dir)
+            item = {'name': row['name'], 'type': 'dir' if row['is_dir'] else 'file', 'path': rel_path}
+            if details:
+                item.update(size=row['size'], mtime=row['mtime_ns'] / 1e9, width=row['width'], height=row['height'])
+            items.append(item)
+        return jsonify({
+            'children': items,
+            'total': total,
+            'next_cursor': encode_cursor(next_after) if next_after else None,
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/delete', methods=['POST'])
 @require_auth
@@ -319,10 +449,21 @@ def delete_item():
     if not full_path.startswith(base_dir) or not os.path.exists(full_path) or full_path == base_dir:
         return jsonify({'error': 'Invalid path or cannot delete root'}), 400
     try:
-        if os.path.isdir(full_path):
+        if dir_type == 'ready_photos' and os.path.dirname(full_path) == base_dir:
+            # Published category is a link to its generations / Опубликованная категория - ссылка на её поколения
+            delete_category(os.path.join(MANAGERS_DIR, manager), os.path.basename(full_path))
+            drop_ready_count(os.path.join(MANAGERS_DIR, manager), os.path.basename(full_path))
+        elif os.path.isdir(full_path):
             shutil.rmtree(full_path)
         else:
             os.remove(full_path)
+        if dir_type == 'ready_photos' and os.path.dirname(full_path) != base_dir:
+            # Ads of a published category changed: rebuild its links and counter
+            # Объявления опубликованной категории изменились: перестраиваем её ссылки и счётчик
+            category = os.path.relpath(full_path, base_dir).split(os.sep)[0]
+            set_ready_count(os.path.join(MANAGERS_DIR, manager), category, rebuild_ads_manifest(os.path.join(base_dir, category)))
+            refresh_path(os.path.join(base_dir, category))
+        refresh_path(os.path.dirname(full_path))
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -361,6 +502,8 @@ def create_folder_structure():
             pos_path = os.path.join(category_path, pos)
             os.makedirs(pos_path, exist_ok=True)
             created_folders.append(pos)
+        refresh_path(cache_dir)
+        refresh_path(category_path)
         log_message(f"📁 Создана структура папок для менеджера '{manager}', категории '{category}': {', '.join(created_folders)}")
         return jsonify({'success': True, 'created': created_folders})
     except Exception as e:
@@ -399,6 +542,9 @@ def upload_files():
             filename = file.filename
             file.save(os.path.join(base_path, filename))
             uploaded.append(filename)
+    # Parents may be new, the position gets new or overwritten files / Родители могут быть новыми, позиция получает новые или перезаписанные файлы
+    for path in (os.path.dirname(os.path.dirname(base_path)), os.path.dirname(base_path), base_path):
+        refresh_path(path)
     log_message(f"📥 Загружено {len(uploaded)} файлов для менеджера '{manager}' в {category}/{position}: {', '.join(uploaded)}")
     return jsonify({'success': True, 'uploaded': uploaded})
 
@@ -410,14 +556,158 @@ def uniquify():
     folder_name = data.get('folder_name')
     count = data.get('count')
     use_rotation = data.get('use_rotation', True)
-    if not manager or not folder_name or not count:
+    incremental = data.get('incremental', False)
+    trim = data.get('trim', False)
+    resume = data.get('resume', False)
+    lazy = data.get('lazy', False)
+    if not manager or not folder_name or count is None:
         return jsonify({'error': 'Manager, folder_name and count required'}), 400
     try:
-        results = process_and_generate(folder_name, count, use_rotation, manager)
-        return jsonify({'success': True, 'results': results})
+        # JSON may carry count as a string; fractions and booleans are refused
+        # JSON может передать count строкой; дробные и логические значения отклоняются
+        if isinstance(count, bool) or (isinstance(count, float) and not count.is_integer()):
+            raise ValueError(count)
+        count = int(count)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Count must be an integer'}), 400
+    if count < 1:
+        return jsonify({'error': 'Count must be at least 1'}), 400
+    try:
+        # Jobs that can't be satisfied are refused before queueing / Невыполнимые задачи отклоняются до постановки в очередь
+        capacity = category_capacity(manager, folder_name)
+        if capacity is None:
+            return jsonify({'error': 'Category not found'}), 404
+        if count > capacity['max_ads']:
+            return jsonify({'error': f"Категория даёт не более {capacity['max_ads']} различных объявлений", 'capacity': capacity}), 400
+        # Synchronous mode for old clients, still goes through the scheduler
+        # Синхронный режим для старых клиентов, всё равно идёт через планировщик
+        if data.get('wait'):
+            job_id = submit_job(manager, folder_name, count, use_rotation, wait=True, incremental=incremental, trim=trim, resume=resume, lazy=lazy)
+            return jsonify({'success': True, 'job_id': job_id, 'results': get_job_results(job_id)})
+        job_id = submit_job(manager, folder_name, count, use_rotation, incremental=incremental, trim=trim, resume=resume, lazy=lazy)
+        # Streaming mode: ads are sent as soon as they are ready / Потоковый режим: объявления отправляются сразу по готовности
+        if data.get('stream'):
+            return job_stream_response(job_id, data.get('stream') == 'sse')
+        return jsonify({'success': True, 'job_id': job_id}), 202
+    except QueueFull as e:
+        response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/capacity', methods=['GET'])
+@require_auth
+def capacity():
+    """
+    Get maximum number of distinct ads of a category / Получить максимальное число различных объявлений категории
+    
+    Query params:
+        manager: Manager name / Имя менеджера
+        category: Category name / Имя категории
+    
+    Returns:
+        JSON: Capacity report (max_ads, feasible, files per position) / Отчёт о ёмкости (max_ads, feasible, файлы по позициям)
+    """
+    manager = request.args.get('manager')
+    category = request.args.get('category')
+    if not manager or not category:
+        return jsonify({'error': 'Manager and category required'}), 400
+    try:
+        report = category_capacity(manager, category)
+        if report is None:
+            return jsonify({'error': 'Category not found'}), 404
+        return jsonify({'success': True, 'capacity': report})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/scheduler/metrics', methods=['GET'])
+@require_auth
+def scheduler_metrics():
+    """
+    Get job scheduler metrics for monitoring / Получить метрики планировщика задач для мониторинга
+    
+    Returns:
+        JSON: {'success': True, 'metrics': {...}} - running and queued jobs, limits, rejected jobs,
+              per-manager queued and running, oldest and recent wait times (sec) and current Retry-After
+              {'success': True, 'metrics': {...}} - выполняемые и ожидающие задачи, лимиты, отклонённые задачи,
+              ожидающие и выполняемые по менеджерам, самое долгое и недавнее время ожидания (сек) и текущий Retry-After
+    """
+    try:
+        return jsonify({'success': True, 'metrics': get_scheduler_metrics()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@require_auth
+def job_status(job_id):
+    try:
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'job': job})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+@require_auth
+def job_results(job_id):
+    try:
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'status': job['status'], 'results': get_job_results(job_id)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+@require_auth
+def job_stream(job_id):
+    """
+    Stream finished ads of a job / Потоковая передача готовых объявлений задачи
+    
+    Query params:
+        format: 'sse' for Server-Sent Events, NDJSON by default (also chosen by Accept: text/event-stream)
+                'sse' для Server-Sent Events, по умолчанию NDJSON (также выбирается по Accept: text/event-stream)
+    
+    Returns:
+        Response: One event per line or SSE message / Одно событие на строку или сообщение SSE
+    """
+    try:
+        if get_job(job_id) is None:
+            return jsonify({'error': 'Job not found'}), 404
+        sse = request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+        return job_stream_response(job_id, sse)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def job_stream_response(job_id, sse=False):
+    """
+    Build streaming response for a job / Построить потоковый ответ для задачи
+    
+    Args:
+        job_id (str): Job id / Id задачи
+        sse (bool): Server-Sent Events instead of NDJSON / Server-Sent Events вместо NDJSON
+    
+    Returns:
+        Response: Streaming response, first event carries job_id / Потоковый ответ, первое событие содержит job_id
+    """
+    def generate():
+        events = itertools.chain([{'type': 'job', 'job_id': job_id}], stream_job(job_id))
+        for event in events:
+            line = json.dumps(event, ensure_ascii=False)
+            if sse:
+                yield f"event: {event['type']}\ndata: {line}\n\n"
+            else:
+                yield line + '\n'
+    
+    response = Response(stream_with_context(generate()),
+                        mimetype='text/event-stream' if sse else 'application/x-ndjson')
+    # Every event must reach the client right away / Каждое событие должно сразу дойти до клиента
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # ============================================================================
 # API ENDPOINTS ДЛЯ УПРАВЛЕНИЯ ПОЛЬЗОВАТЕЛЯМИ / USER MANAGEMENT API ENDPOINTS
 # ============================================================================
@@ -845,7 +1135,26 @@ def serve_photo_cache(manager, path):
 
 @app.route('/<manager>/ready_photos/<path:path>')
 def serve_ready_photos(manager, path):
-    return send_from_directory(os.path.join(MANAGERS_DIR, manager, 'ready_photos'), path)
+    # Old URLs are served from replaced generations during the grace period / Старые URL раздаются из заменённых поколений в течение периода ожидания
+    manager_dir = os.path.join(MANAGERS_DIR, manager)
+    directory, path = resolve_ready_dir(manager_dir, path, exists=lambda p: os.path.isfile(p) or is_lazy_photo(p))
+    # Recipe ads are rendered on first request / Объявления по рецепту отрисовываются при первом запросе
+    photo_path = os.path.normpath(os.path.join(directory, path))
+    if photo_path.startswith(directory + os.sep) and not os.path.isfile(photo_path) and is_lazy_photo(photo_path):
+        try:
+            cached = render_lazy_photo(manager_dir, photo_path)
+        except TimeoutError as e:
+            # Render pool is busy, the photo is still being rendered / Пул отрисовки занят, фото ещё отрисовывается
+            log_message(f"⚠️ {e}")
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        except Exception as e:
+            log_message(f"❌ Ошибка отрисовки {manager}/{path}: {e}")
+            return jsonify({'error': str(e)}), 500
+        if cached:
+            return send_from_directory(os.path.dirname(cached), os.path.basename(cached), mimetype='image/jpeg')
+    return send_from_directory(directory, path)
 
 @app.route('/')
 def index():
@@ -881,6 +1190,9 @@ def cleanup_sessions_periodically():
             removed_count = cleanup_expired_sessions()
             if removed_count > 0:
                 log_message(f"🧹 Очищено {removed_count} истекших сессий")
+            removed_generations = collect_all_generations(MANAGERS_DIR)
+            if removed_generations > 0:
+                log_message(f"🧹 Удалено {removed_generations} устаревших поколений готовых фото")
         except Exception as e:
             log_message(f"❌ Ошибка очистки сессий: {e}")
 
@@ -897,6 +1209,15 @@ if __name__ == "__main__":
         log_message("🔧 Установите Redis: sudo apt install redis-server && sudo systemctl start redis-server")
         exit(1)
     
+    # Продолжаем задачи, прерванные перезапуском / Resume jobs interrupted by restart
+    try:
+        resume_interrupted_jobs()
+    except Exception as e:
+        log_message(f"❌ Ошибка продолжения прерванных задач: {e}")
+    
+    # Наблюдатель изменений файлов в обход сервера (опционально) / Watcher of out-of-band file changes (optional)
+    start_fs_watcher()
+    
     # Запускаем фоновую задачу очистки сессий / Start background session cleanup task
     cleanup_thread = threading.Thread(target=cleanup_sessions_periodically, daemon=True)
     cleanup_thread.start()
@@ -909,6 +1230,10 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         log_message("🛑 Получен сигнал остановки сервера")
     finally:
+        # Stop uniquification jobs and workers / Останавливаем задачи и рабочие процессы уникализации
+        shutdown_jobs()
+        shutdown_worker_pool()
+        
         # Shutdown Redis connection / Завершаем подключение к Redis
         shutdown_redis()
         log_message("🔌 Redis подключение закрыто")
\ No newline at end of file
@@ -0,0 +1,69 @@
+# filename="ad_combinations.py"
+# server/modules/ad_combinations.py
+# Published Ad Combinations Module / Модуль комбинаций опубликованных объявлений
+
+"""
+Published Ad Combinations Module / Модуль комбинаций опубликованных объявлений
+
+A generation keeps the source file of every position of its ads, so an incremental job can
+tell select_sources which combinations are already published and never build them again.
+Поколение хранит исходный файл каждой позиции своих объявлений, поэтому инкрементальная задача
+может сообщить select_sources, какие комбинации уже опубликованы, и никогда не собирать их снова.
+
+File (.ad_combinations.json in generation directory) / Файл (.ad_combinations.json в директории поколения):
+- files: source paths relative to the manager directory / пути исходников относительно директории менеджера
+- ads: [ad number, index into files per position], sorted by number / [номер объявления, индекс в files на позицию], по номеру
+
+Paths are relative, so combinations survive a manager rename.
+Пути относительные, поэтому комбинации переживают переименование менеджера.
+"""
+
+import os
+import json
+import threading
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+AD_COMBINATIONS_NAME = '.ad_combinations.json'  # Combinations file in generation directory / Файл комбинаций в директории поколения
+AD_COMBINATIONS_VERSION = 1  # Bumped when file format changes / Увеличивается при изменении формата файла
+
+def write_ad_combinations(generation_dir, manager_dir, combinations):
+    """
+    Save source combinations of a generation's ads atomically / Атомарно сохранить комбинации исходников объявлений поколения
+
+    Args:
+        generation_dir (str): Generation directory / Директория поколения
+        manager_dir (str): Manager directory / Директория менеджера
+        combinations (dict): Ad number -> source file per position / Номер объявления -> исходный файл на позицию
+    """
+    file_index = {}
+    ads = []
+    for number, sources in sorted(combinations.items()):
+        ads.append([number, [file_index.setdefault(os.path.relpath(f, manager_dir), len(file_index)) for f in sources]])
+    data = {'version': AD_COMBINATIONS_VERSION, 'files': list(file_index), 'ads': ads}
+    path = os.path.join(generation_dir, AD_COMBINATIONS_NAME)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def load_ad_combinations(generation_dir, manager_dir):
+    """
+    Load source combinations of a generation's ads / Загрузить комбинации исходников объявлений поколения
+
+    Args:
+        generation_dir (str): Generation (or published category) directory / Директория поколения (или опубликованной категории)
+        manager_dir (str): Manager directory / Директория менеджера
+
+    Returns:
+        dict: Ad number -> source file per position, empty if missing or unreadable
+              Номер объявления -> исходный файл на позицию, пустой если отсутствует или не читается
+    """
+    try:
+        with open(os.path.join(os.path.realpath(generation_dir), AD_COMBINATIONS_NAME), encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != AD_COMBINATIONS_VERSION:
+            return {}
+        files = [os.path.join(manager_dir, f) for f in data['files']]
+        return {number: [files[k] for k in indices] for number, indices in data['ads']}
+    except (OSError, ValueError, KeyError, IndexError, TypeError):
+        return {}
@@ -6,14 +6,43 @@ Ad Processing Module / Модуль обработки объявлений
 
 This module handles the processing and generation of unique advertisements with watermarked images.
 Данный модуль обрабатывает и генерирует уникальные объявления с водяными знаками на изображениях.
+
+Ads are planned in the parent process, photos are rendered by the pool in small chunks
+and ads are reassembled as their photos finish, so one slow ad doesn't hold a worker.
+Объявления планируются в родительском процессе, фотографии отрисовываются пулом небольшими
+пачками, а объявления собираются по мере готовности фотографий, поэтому одно медленное
+объявление не занимает рабочего целиком.
+
+Only a bounded window of tasks is in flight and finished ads go straight to a result sink,
+so parent memory doesn't grow with the number of ads.
+В работе находится только ограниченное окно задач, а готовые объявления сразу уходят
+в приёмник результатов, поэтому память родителя не растёт с числом объявлений.
 """
 
 import time
 import random
 import os
+import re
 import shutil
+import uuid
+import itertools
 import concurrent.futures
-from modules.image_processing import load_logo, uniquify_image
+from modules.worker_pool import get_worker_pool, get_worker_pool_size
+from modules.image_processing import uniquify_image, MAX_WORKING_SIZE
+from modules.logo_bank import ensure_logo_bank, load_logo_bank
+from modules.source_cache import SourceCache, open_source, USE_SOURCE_CACHE
+from modules.job_context import JobContext, use_job_context
+from modules.result_sinks import ListSink
+from modules.render_queue import QueueJob, USE_RENDER_QUEUE, QUEUE_WORKERS_HINT
+from modules.generations import current_generation, begin_generation, publish_generation, discard_generation, CategoryLock
+from modules.job_checkpoint import write_manifest, find_checkpoint, clear_checkpoint, CompletedLog
+from modules.lazy_render import write_recipe, load_recipe, RECIPE_NAME
+from modules.capacity_planner import plan_capacity
+from modules.ad_selection import select_sources, selection_stats
+from modules.ads_manifest import write_ads_manifest, load_ads_manifest
+from modules.ad_combinations import write_ad_combinations, load_ad_combinations
+from modules.ready_counts import save_ready_counts, set_ready_count
+from modules.fs_index import children, refresh_path
 from modules.utils import log_message
 
 # ===== SETTINGS / НАСТРОЙКИ =====
@@ -22,68 +51,418 @@ MAX_ROWS = 5000  # Maximum number of rows in output / Максимальное 
 ALLOWED_EXTENSIONS = ("jpg", "jpeg", "png")  # Allowed image formats / Разрешённые форматы изображений
 BASE_SERVER_URL = "http://109.172.39.225:5000/"  # Base URL for serving images / Базовый URL для раздачи изображений
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # Base directory of the project / Базовая директория проекта
+MAX_PHOTOS_PER_TASK = PHOTOS_PER_AD  # Upper bound of photos in one pool task / Верхняя граница фотографий в одной задаче пула
+TASKS_PER_WORKER = 4  # Target number of tasks per worker for load balancing / Целевое число задач на рабочего для балансировки
+AD_DIR_PATTERN = re.compile(r'^ready_ad_(\d+)_(\d+)$')  # Ad directory name: number and stamp / Имя директории объявления: номер и метка
+TASKS_IN_FLIGHT_PER_WORKER = 2  # Submitted but unfinished tasks per worker / Отправленных, но не завершённых задач на рабочего
 
-def process_ad(i, position_sources, logo, folder_name, local_ready_base, use_rotation, manager):
+def ad_seed(job_seed, i):
     """
-    Process a single advertisement / Обрабатывает одно объявление
+    Get seed of one advertisement within a job / Получить зерно одного объявления в задаче
     
     Args:
+        job_seed: Seed of the whole job / Зерно всей задачи
         i: Advertisement index / Индекс объявления
-        position_sources: List of available files for each position / Список доступных файлов для каждой позиции
-        logo: Logo image for watermarking / Логотип для водяного знака
-        folder_name: Source folder name / Имя исходной папки
-        local_ready_base: Base directory for ready ads / Базовая директория для готовых объявлений
-        use_rotation: Whether to use rotation for uniquification / Использовать ли поворот для уникализации
+    
+    Returns:
+        Integer seed / Целочисленное зерно
+    """
+    return job_seed + i
+
+def build_position_sources(local_folder):
+    """
+    Build list of source files for each photo position / Строит список исходных файлов для каждой позиции фото
+    
+    Args:
+        local_folder: Category folder in photo cache / Папка категории в кэше фотографий
+    
+    Returns:
+        List of PHOTOS_PER_AD lists of file paths / Список из PHOTOS_PER_AD списков путей файлов
+    """
+    # Scan folder structure from the metadata index / Сканируем структуру папок по индексу метаданных
+    # Get all subfolders in sorted order / Получаем все подпапки в отсортированном порядке
+    entries = children(local_folder)
+    subfolders = [path for _, path, is_dir in entries if is_dir]
+    num_subfolders = len(subfolders)
+    
+    # Get files from root folder / Получаем файлы из корневой папки
+    root_files = [path for name, path, is_dir in entries if not is_dir and name.lower().endswith(ALLOWED_EXTENSIONS)]
+    
+    # Build list of files for each folder (root + subfolders) / Строим список файлов для каждой папки (корень + подпапки)
+    folder_files = [root_files]
+    for subfolder_path in subfolders:
+        files = [path for name, path, is_dir in children(subfolder_path) if not is_dir and name.lower().endswith(ALLOWED_EXTENSIONS)]
+        folder_files.append(files)
+    # Assign source files to each photo position in the ad / Назначаем исходные файлы для каждой позиции фото в объявлении
+    position_sources = []
+    has_root = bool(root_files)
+    
+    for pos in range(PHOTOS_PER_AD):
+        if has_root:
+            # If root folder has files / Если в корневой папке есть файлы
+            if pos == 0:
+                # First position uses only root files / Первая позиция использует только файлы из корня
+                position_sources.append(folder_files[0])
+            else:
+                # Other positions combine root + corresponding subfolder / Остальные позиции объединяют корень + соответствующую подпапку
+                idx = min(pos, num_subfolders)
+                combined = folder_files[0] + folder_files[idx]
+                position_sources.append(combined)
+        else:
+            # If no root files, use only subfolders / Если нет файлов в корне, используем только подпапки
+            if num_subfolders == 0:
+                position_sources.append([])
+            else:
+                # Distribute positions cyclically across subfolders / Распределяем позиции циклически по подпапкам
+                idx = (pos % num_subfolders) + 1
+                position_sources.append(folder_files[idx])
+    
+    return position_sources
+
+def category_capacity(manager, folder_name):
+    """
+    Get capacity report of a category before starting a job / Получить отчёт о ёмкости категории до запуска задачи
+    
+    Args:
         manager: Manager name / Имя менеджера
+        folder_name: Category folder name / Имя папки категории
     
     Returns:
-        List with ad number and URLs or None if failed / Список с номером объявления и URL или None при ошибке
-    """
-    # Create unique directory for this ad / Создаём уникальную директорию для данного объявления
-    ad_dir_name = f"ready_ad_{i+1}_{int(time.time())}"
-    ad_dir = os.path.join(local_ready_base, ad_dir_name)
-    os.makedirs(ad_dir, exist_ok=True)
-    
-    # Track used files to ensure uniqueness within one ad / Отслеживаем использованные файлы для уникальности в одном объявлении
-    used_files = set()
-    selected_files = []
-    
-    # Select unique file for each position / Выбираем уникальный файл для каждой позиции
-    for pos_idx, sources in enumerate(position_sources):
-        # Filter out already used files / Фильтруем уже использованные файлы
-        available = [f for f in sources if f not in used_files]
-        if not available:
-            log_message(f"⚠️ Нет доступных уникальных файлов для позиции {pos_idx+1} в объявлении {i+1}")
-            return None
-        # Randomly select a file from available ones / Случайно выбираем файл из доступных
-        file = random.choice(available)
-        selected_files.append(file)
-        used_files.add(file)
-    
-    # Validate that we collected all required photos / Проверяем, что собрали все необходимые фотографии
-    if len(selected_files) != PHOTOS_PER_AD:
-        log_message(f"⚠️ Не удалось собрать полное объявление {i+1}")
+        Dict from plan_capacity or None if the category doesn't exist / Словарь из plan_capacity или None если категории не существует
+    """
+    local_folder = os.path.join(BASE_DIR, 'data', 'managers', manager, 'photo_cache', folder_name)
+    if not os.path.isdir(local_folder):
         return None
+    return plan_capacity(build_position_sources(local_folder))
+
+def ad_files(context, i):
+    """
+    Get source files of one advertisement from the job selection / Получить исходные файлы одного объявления из выбора задачи
     
-    # Process each selected file and generate URLs / Обрабатываем каждый выбранный файл и генерируем URL
-    ad_links = []
-    for j, orig_file in enumerate(selected_files):
-        file_name = f"{j+1}.jpg"
-        output_file = os.path.join(ad_dir, file_name)
-        # Apply watermark and uniquification / Применяем водяной знак и уникализацию
-        uniquify_image(orig_file, output_file, logo, use_rotation)
-        # Generate public URL for the image / Генерируем публичный URL для изображения
-        rel_path = os.path.join(folder_name, ad_dir_name, file_name)
-        url = f"{BASE_SERVER_URL}{manager}/ready_photos/{rel_path}"
-        ad_links.append(url)
-    
-    # Return result if all links were generated / Возвращаем результат, если все ссылки сгенерированы
-    if len(ad_links) == PHOTOS_PER_AD:
-        return [i + 1, "\n".join(ad_links)]
-    else:
-        return None
+    Args:
+        context: Job context with position_sources and selections / Контекст задачи с position_sources и selections
+        i: Advertisement index / Индекс объявления
+    
+    Returns:
+        List of files (one per position) / Список файлов (по одному на позицию)
+    """
+    return [files[k] for files, k in zip(context['position_sources'], context['selections'][i])]
+
+def ad_dir_name(i, stamp):
+    """Get directory name of an ad / Получить имя директории объявления"""
+    return f"ready_ad_{i+1}_{stamp}"
+
+def render_photos(job_id, photos):
+    """
+    Render a chunk of photos (runs in worker process) / Отрисовывает пачку фотографий (выполняется в рабочем процессе)
+    
+    Args:
+        job_id: Job id of the shared job context / Id задачи общего контекста задачи
+        photos: List of (ad index, ad seed, position) / Список (индекс объявления, зерно объявления, позиция)
+    
+    Returns:
+        Tuple of (list of (ad index, position, success), source cache events)
+        Кортеж (список (индекс объявления, позиция, успех), события кэша исходников)
+    """
+    # Sources, logo bank and options come once per worker, not with every task
+    # Исходники, банк логотипа и опции приходят один раз на рабочего, а не с каждой задачей
+    with use_job_context(job_id) as context:
+        return render_photos_with_context(context, photos, job_id if context['source_cache'] else None)
+
+def render_photos_with_context(context, photos, cache_job_id=None):
+    """
+    Render a chunk of photos with explicit job context / Отрисовывает пачку фотографий с явным контекстом задачи
+    
+    Args:
+        context: Job context (position_sources, selections, logo_bank_path, use_rotation, local_ready_base, stamp)
+                 Контекст задачи (position_sources, selections, logo_bank_path, use_rotation, local_ready_base, stamp)
+        photos: List of (ad index, ad seed, position) / Список (индекс объявления, зерно объявления, позиция)
+        cache_job_id: Job id for shared source cache, None to decode from disk / Id задачи для общего кэша исходников, None для декодирования с диска
+    
+    Returns:
+        Tuple of (list of (ad index, position, success), source cache events)
+        Кортеж (список (индекс объявления, позиция, успех), события кэша исходников)
+    """
+    cache_events = []
+    done = []
+    
+    # Logo variants are loaded once per worker process / Варианты логотипа загружаются один раз на рабочий процесс
+    logo_variants = load_logo_bank(context['logo_bank_path'])
+    
+    for i, seed, j in photos:
+        # Selection was made by the parent for the whole job / Выбор сделан родителем для всей задачи
+        orig_file = context['position_sources'][j][context['selections'][i][j]]
+        output_file = os.path.join(context['local_ready_base'], ad_dir_name(i, context['stamp']), f"{j+1}.jpg")
+        try:
+            # Per-photo seed makes the rendered result reproducible / Зерно фотографии делает результат воспроизводимым
+            random.seed(seed * PHOTOS_PER_AD + j)
+            # Apply watermark and uniquification to shared decoded source / Применяем водяной знак и уникализацию к общему декодированному исходнику
+            with open_source(cache_job_id, orig_file, MAX_WORKING_SIZE, cache_events) as source:
+                try:
+                    uniquify_image(orig_file, output_file, None, context['use_rotation'], logo_variants=logo_variants, source=source)
+                finally:
+                    # Drop the reference so the shared mapping can be closed, also on error
+                    # Сбрасываем ссылку, чтобы общее отображение можно было закрыть, и при ошибке
+                    source = None
+            done.append((i, j, True))
+        except Exception as e:
+            # One broken source fails only its ad / Один сломанный исходник проваливает только своё объявление
+            log_message(f"❌ Ошибка обработки {orig_file} для объявления {i+1}: {e}")
+            done.append((i, j, False))
+    
+    return done, cache_events
+
+def write_recipes(context, manager_dir, photos):
+    """
+    Write ad recipes instead of rendering photos (lazy mode) / Записать рецепты объявлений вместо отрисовки фотографий (отложенный режим)
+    
+    Args:
+        context: Job context, same as for render_photos_with_context / Контекст задачи, как для render_photos_with_context
+        manager_dir: Manager directory / Директория менеджера
+        photos: List of (ad index, ad seed, position) / Список (индекс объявления, зерно объявления, позиция)
+    
+    Returns:
+        Tuple of (list of (ad index, position, success), empty cache events)
+        Кортеж (список (индекс объявления, позиция, успех), пустые события кэша)
+    """
+    done = []
+    for i, seed, j in photos:
+        # Whole ad is recorded with its first photo / Всё объявление записывается вместе с его первой фотографией
+        if j == 0:
+            try:
+                write_recipe(
+                    os.path.join(context['local_ready_base'], ad_dir_name(i, context['stamp'])),
+                    manager_dir,
+                    ad_files(context, i),
+                    [seed * PHOTOS_PER_AD + k for k in range(PHOTOS_PER_AD)],
+                    context['use_rotation'],
+                    context['logo_bank_path'],
+                )
+            except Exception as e:
+                log_message(f"❌ Ошибка записи рецепта объявления {i+1}: {e}")
+                done.append((i, j, False))
+                continue
+        done.append((i, j, True))
+    return done, []
 
-def process_and_generate(folder_name, count, use_rotation, manager):
+def photo_chunk_size(total_photos, workers):
+    """
+    Get number of photos per task for load balancing / Получить число фотографий на задачу для балансировки нагрузки
+    
+    Args:
+        total_photos: Number of photos in the job / Количество фотографий в задаче
+        workers: Number of worker processes / Количество рабочих процессов
+    
+    Returns:
+        Chunk size between 1 and MAX_PHOTOS_PER_TASK / Размер пачки от 1 до MAX_PHOTOS_PER_TASK
+    """
+    # Enough chunks that every worker gets several, small jobs go photo by photo
+    # Достаточно пачек, чтобы каждому рабочему досталось несколько, маленькие задачи идут по одной фотографии
+    return max(1, min(MAX_PHOTOS_PER_TASK, total_photos // (workers * TASKS_PER_WORKER)))
+
+def ad_links(manager, folder_name, ad_dir_name):
+    """
+    Build public URLs of ad photos / Строит публичные URL фотографий объявления
+    
+    Args:
+        manager: Manager name / Имя менеджера
+        folder_name: Category folder name / Имя папки категории
+        ad_dir_name: Ad directory name / Имя директории объявления
+    
+    Returns:
+        List of PHOTOS_PER_AD URLs / Список из PHOTOS_PER_AD URL
+    """
+    links = []
+    for j in range(PHOTOS_PER_AD):
+        rel_path = os.path.join(folder_name, ad_dir_name, f"{j+1}.jpg")
+        links.append(f"{BASE_SERVER_URL}{manager}/ready_photos/{rel_path}")
+    return links
+
+def is_complete_ad(ad_path):
+    """
+    Check that ad directory has all photos / Проверить, что в директории объявления есть все фотографии
+    
+    Args:
+        ad_path: Ad directory path / Путь к директории объявления
+    
+    Returns:
+        True if every photo exists and is not empty or ad has a recipe / True если каждая фотография существует и не пуста или у объявления есть рецепт
+    """
+    if os.path.isfile(os.path.join(ad_path, RECIPE_NAME)):
+        return True
+    sizes = {}
+    with os.scandir(ad_path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                sizes[entry.name] = entry.stat().st_size
+    return all(sizes.get(f"{j+1}.jpg", 0) > 0 for j in range(PHOTOS_PER_AD))
+
+def is_intact_ad(ad_path):
+    """
+    Check that ad photos are complete and not cut off / Проверить, что фотографии объявления полные и не обрезаны
+    
+    Slower than is_complete_ad, used for ads of an interrupted job.
+    Медленнее is_complete_ad, используется для объявлений прерванной задачи.
+    
+    Args:
+        ad_path: Ad directory path / Путь к директории объявления
+    
+    Returns:
+        True if every photo ends with JPEG end marker / True если каждая фотография заканчивается маркером конца JPEG
+    """
+    if not os.path.isdir(ad_path) or not is_complete_ad(ad_path):
+        return False
+    if os.path.isfile(os.path.join(ad_path, RECIPE_NAME)):
+        return load_recipe(ad_path) is not None
+    for j in range(PHOTOS_PER_AD):
+        with open(os.path.join(ad_path, f"{j+1}.jpg"), 'rb') as f:
+            f.seek(-2, os.SEEK_END)
+            if f.read(2) != b'\xff\xd9':
+                return False
+    return True
+
+def can_resume(manifest, count, use_rotation):
+    """
+    Check that interrupted job can be continued with these parameters / Проверить, что прерванную задачу можно продолжить с этими параметрами
+    
+    Args:
+        manifest: Manifest of the interrupted job / Манифест прерванной задачи
+        count: Requested number of ads / Запрошенное количество объявлений
+        use_rotation: Use rotation / Использовать поворот
+    
+    Returns:
+        True if parameters match and all planned sources still exist / True если параметры совпадают и все запланированные исходники существуют
+    """
+    if manifest.get('count') != count or manifest.get('use_rotation') != use_rotation:
+        return False
+    return all(os.path.isfile(f) for files in manifest['position_sources'] for f in set(files))
+
+def index_ready_ads(ready_dir):
+    """
+    Find complete ads of a category directory by number / Найти полные объявления директории категории по номеру
+    
+    Args:
+        ready_dir: Category directory / Директория категории
+    
+    Returns:
+        Tuple of (dict ad number -> directory name, number of dropped directories)
+        Кортеж (словарь номер объявления -> имя директории, число отброшенных директорий)
+    """
+    # Newest directory of a number wins / Побеждает самая новая директория номера
+    ad_dirs = []
+    for name in os.listdir(ready_dir):
+        match = AD_DIR_PATTERN.match(name)
+        if match and os.path.isdir(os.path.join(ready_dir, name)):
+            ad_dirs.append((int(match.group(1)), int(match.group(2)), name))
+    ad_dirs.sort(reverse=True)
+    
+    ads = {}
+    dropped = 0
+    for number, _, name in ad_dirs:
+        # Incomplete and duplicate directories are skipped / Неполные и дублирующиеся директории пропускаются
+        if number in ads or not is_complete_ad(os.path.join(ready_dir, name)):
+            dropped += 1
+            continue
+        ads[number] = name
+    return ads, dropped
+
+def complete_ad_files():
+    """Get file names of a complete ad / Получить имена файлов полного объявления"""
+    return [f"{j+1}.jpg" for j in range(PHOTOS_PER_AD)]
+
+def rebuild_ads_manifest(ready_dir):
+    """
+    Write ads manifest of a category from its directories / Записать манифест объявлений категории по её директориям
+    
+    Used for categories published before manifests and after ads were deleted by hand.
+    Используется для категорий, опубликованных до манифестов, и после ручного удаления объявлений.
+    
+    Args:
+        ready_dir: Published category directory / Опубликованная директория категории
+    
+    Returns:
+        Number of ready ads / Число готовых объявлений
+    """
+    ads, _ = index_ready_ads(ready_dir)
+    write_ads_manifest(ready_dir, {number: (name, complete_ad_files()) for number, name in ads.items()})
+    return len(ads)
+
+def rebuild_ready_counts(manager_dir, trust_manifests=False):
+    """
+    Rebuild ready ads counters of a manager from disk / Перестроить счётчики готовых объявлений менеджера с диска
+    
+    Ad directories are rescanned and ads manifests rewritten, so a stale or broken manifest is repaired too.
+    Директории объявлений перечитываются, а манифесты объявлений перезаписываются, поэтому устаревший
+    или испорченный манифест тоже исправляется.
+    
+    Args:
+        manager_dir: Manager directory / Директория менеджера
+        trust_manifests: Count from existing ads manifests, rescan only categories without one
+                         Считать по существующим манифестам объявлений, перечитывать только категории без него
+    
+    Returns:
+        Dict category -> number of ready ads / Словарь категория -> число готовых объявлений
+    """
+    counts = {}
+    ready_base = os.path.join(manager_dir, 'ready_photos')
+    if os.path.isdir(ready_base):
+        for folder_name in os.listdir(ready_base):
+            ready_dir = os.path.join(ready_base, folder_name)
+            if not os.path.isdir(ready_dir):
+                continue
+            loaded = load_ads_manifest(ready_dir) if trust_manifests else None
+            counts[folder_name] = len(loaded[0]['ads']) if loaded else rebuild_ads_manifest(ready_dir)
+    save_ready_counts(manager_dir, counts)
+    return counts
+
+def select_ready_ads(ready_dir, count):
+    """
+    Select complete ads of the published generation for incremental generation
+    Выбрать полные объявления опубликованного поколения для инкрементальной генерации
+    
+    Args:
+        ready_dir: Published category directory or None / Опубликованная директория категории или None
+        count: Requested number of ads / Запрошенное количество объявлений
+    
+    Returns:
+        Tuple of (dict ad index -> directory name up to count, list of complete directory names above count)
+        Кортеж (словарь индекс объявления -> имя директории до count, список имён полных директорий сверх count)
+    """
+    kept = {}
+    surplus = []
+    if not ready_dir or not os.path.isdir(ready_dir):
+        return kept, surplus
+    
+    ads, dropped = index_ready_ads(ready_dir)
+    for number, name in ads.items():
+        if number > count:
+            surplus.append(name)
+        else:
+            kept[number - 1] = name
+    
+    if dropped:
+        log_message(f"🗑️ Пропущено {dropped} неполных или дублирующихся объявлений")
+    return kept, surplus
+
+def link_ad(src_dir, dst_dir):
+    """
+    Carry ad over to a new generation with hard links / Перенести объявление в новое поколение жёсткими ссылками
+    
+    Args:
+        src_dir: Ad directory in published generation / Директория объявления в опубликованном поколении
+        dst_dir: Ad directory in staging generation / Директория объявления в промежуточном поколении
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+    for name in os.listdir(src_dir):
+        src = os.path.join(src_dir, name)
+        dst = os.path.join(dst_dir, name)
+        try:
+            os.link(src, dst)
+        except OSError:
+            # Filesystem without hard links / Файловая система без жёстких ссылок
+            shutil.copy2(src, dst)
+
+def process_and_generate(folder_name, count, use_rotation, manager, sink=None, progress=None, incremental=False, trim=False, resume=False, lazy=False):
     """
     Process and generate advertisements with unique images / Обрабатывает и генерирует объявления с уникальными изображениями
     
@@ -92,11 +471,26 @@ def process_and_generate(folder_name, count, use_rotation, manager):
         count: Number of advertisements to generate / Количество объявлений для генерации
         use_rotation: Whether to use image rotation for uniquification / Использовать ли поворот изображений для уникализации
         manager: Manager name / Имя менеджера
+        sink: Receiver of finished ads, None keeps them in a list / Приёмник готовых объявлений, None хранит их в списке
+        progress: Called as progress(done, created) after each ad / Вызывается как progress(done, created) после каждого объявления
+        incremental: Keep complete ads and render only missing numbers / Сохранить полные объявления и отрисовать только недостающие номера
+        trim: In incremental mode drop ads numbered above count / В инкрементальном режиме убрать объявления с номером больше count
+        resume: Continue the interrupted job of this category if there is one / Продолжить прерванную задачу этой категории, если она есть
+        lazy: Write recipes only, photos are rendered on first request / Записать только рецепты, фотографии отрисовываются при первом запросе
     
     Returns:
-        List of generated ads with their URLs / Список сгенерированных объявлений с их URL
+        sink.result(), by default list of generated ads with their URLs (empty list on error)
+        sink.result(), по умолчанию список сгенерированных объявлений с их URL (пустой список при ошибке)
+    
+    The sink is closed on every path, errors are reported through sink.fail.
+    Приёмник закрывается на любом пути, ошибки передаются через sink.fail.
     """
     start_time = time.time()
+    if sink is None:
+        sink = ListSink()
+    staging = None
+    checkpointed = False
+    category_lock = None
     try:
         # Build path to photo cache directory / Строим путь к директории кэша фотографий
         cache_dir = os.path.join(BASE_DIR, 'data', 'managers', manager, 'photo_cache')
@@ -106,112 +500,303 @@ def process_and_generate(folder_name, count, use_rotation, manager):
         if not os.path.exists(local_folder):
             error_msg = f"❌ Папка {local_folder} не существует. Загрузите фото через клиент."
             log_message(error_msg)
-            return []
+            sink.fail(error_msg)
+            return sink.result()
         
         log_message(f"📂 использование локальных фото из {local_folder}")
         
-        # Scan folder structure / Сканируем структуру папок
-        # Get all subfolders in sorted order / Получаем все подпапки в отсортированном порядке
-        subfolders = sorted([d for d in os.listdir(local_folder) if os.path.isdir(os.path.join(local_folder, d))])
-        num_subfolders = len(subfolders)
-        
-        # Get files from root folder / Получаем файлы из корневой папки
-        root_files = [os.path.join(local_folder, f) for f in os.listdir(local_folder) 
-                      if os.path.isfile(os.path.join(local_folder, f)) and f.lower().endswith(ALLOWED_EXTENSIONS)]
-        
-        # Build list of files for each folder (root + subfolders) / Строим список файлов для каждой папки (корень + подпапки)
-        folder_files = [root_files]
-        for sub_idx in range(num_subfolders):
-            subfolder_path = os.path.join(local_folder, subfolders[sub_idx])
-            files = [os.path.join(subfolder_path, f) for f in os.listdir(subfolder_path) 
-                    if os.path.isfile(os.path.join(subfolder_path, f)) and f.lower().endswith(ALLOWED_EXTENSIONS)]
-            folder_files.append(files)
-        # Assign source files to each photo position in the ad / Назначаем исходные файлы для каждой позиции фото в объявлении
-        position_sources = []
-        has_root = bool(root_files)
-        
-        for pos in range(PHOTOS_PER_AD):
-            if has_root:
-                # If root folder has files / Если в корневой папке есть файлы
-                if pos == 0:
-                    # First position uses only root files / Первая позиция использует только файлы из корня
-                    position_sources.append(folder_files[0])
-                else:
-                    # Other positions combine root + corresponding subfolder / Остальные позиции объединяют корень + соответствующую подпапку
-                    idx = min(pos, num_subfolders)
-                    combined = folder_files[0] + folder_files[idx]
-                    position_sources.append(combined)
-            else:
-                # If no root files, use only subfolders / Если нет файлов в корне, используем только подпапки
-                if num_subfolders == 0:
-                    position_sources.append([])
-                else:
-                    # Distribute positions cyclically across subfolders / Распределяем позиции циклически по подпапкам
-                    idx = (pos % num_subfolders) + 1
-                    position_sources.append(folder_files[idx])
+        position_sources = build_position_sources(local_folder)
         
         # Validate that all positions have files / Проверяем, что все позиции имеют файлы
         if any(not files for files in position_sources):
             error_msg = f"❌ В некоторых позициях нет файлов"
             log_message(error_msg)
-            return []
+            sink.fail(error_msg)
+            return sink.result()
         
-        # Load logo for watermarking / Загружаем логотип для водяного знака
+        # Fail before any work if the category can't give that many distinct ads
+        # Проваливаемся до начала работы, если категория не может дать столько различных объявлений
+        capacity = plan_capacity(position_sources)
+        if count > capacity['max_ads']:
+            error_msg = f"❌ Категория {folder_name} даёт не более {capacity['max_ads']} различных объявлений, запрошено {count}"
+            log_message(error_msg)
+            sink.fail(error_msg)
+            return sink.result()
+        
+        # Prepare logo variant bank for watermarking / Подготавливаем банк вариантов логотипа для водяного знака
         logo_path = os.path.join(BASE_DIR, 'data', 'managers', manager, 'img', 'Logo.png')
-        logo = load_logo(logo_path)
-        
-        # Prepare output directory / Подготавливаем выходную директорию
-        local_ready_base = os.path.join(BASE_DIR, 'data', 'managers', manager, 'ready_photos', folder_name)
-        if os.path.exists(local_ready_base):
-            log_message(f"🗑️ удаление старой папки")
-            shutil.rmtree(local_ready_base)
-        os.makedirs(local_ready_base, exist_ok=True)
-        log_message(f"Удаление/создание папки завершено")
+        logo_bank_path = ensure_logo_bank(logo_path)
+        
+        # Render into a new generation, the published one stays served until the swap
+        # Отрисовываем в новое поколение, опубликованное продолжает раздаваться до переключения
+        manager_dir = os.path.join(BASE_DIR, 'data', 'managers', manager)
+        # One job builds a category at a time, its staging must not look like a checkpoint to another
+        # Категорию собирает одна задача, её промежуточное поколение не должно выглядеть для другой как контрольная точка
+        lock = CategoryLock(manager_dir, folder_name)
+        lock.acquire()
+        category_lock = lock
+        checkpoint = find_checkpoint(manager_dir, folder_name) if resume else None
+        if checkpoint and not can_resume(checkpoint[1], count, use_rotation):
+            log_message(f"⚠️ Прерванная задача не подходит для продолжения (другие параметры или исходники), начинаем заново")
+            checkpoint = None
+        
+        kept = {}
+        surplus = []
+        carried = {}
+        if checkpoint:
+            # Same seed and stamp give the same plan and directory names / То же зерно и метка дают тот же план и имена директорий
+            staging, manifest, completed = checkpoint
+            local_ready_base = staging
+            position_sources = manifest['position_sources']
+            selections = manifest['selections']
+            stamp = manifest['stamp']
+            job_seed = manifest['job_seed']
+            kept = {int(i): name for i, name in manifest['kept'].items() if is_complete_ad(os.path.join(staging, name))}
+            # Finished ads are trusted only after their files are checked / Готовым объявлениям доверяем только после проверки файлов
+            for i in completed:
+                if i < count and i not in kept and is_intact_ad(os.path.join(staging, ad_dir_name(i, stamp))):
+                    kept[i] = ad_dir_name(i, stamp)
+            surplus = [name for name in manifest['surplus'] if is_complete_ad(os.path.join(staging, name))]
+            log_message(f"⏯️ Продолжение прерванной задачи: готово {len(kept)} из {count} объявлений")
+        else:
+            published = current_generation(manager_dir, folder_name)
+            local_ready_base = staging = begin_generation(manager_dir, folder_name)
+            if incremental:
+                # Existing ads keep their numbers and URLs / Существующие объявления сохраняют номера и URL
+                kept, surplus = select_ready_ads(published, count)
+                if trim:
+                    surplus = []
+                for name in list(kept.values()) + surplus:
+                    link_ad(os.path.join(published, name), os.path.join(staging, name))
+                # Sources of carried ads, new ads must not repeat them / Исходники перенесённых объявлений, новые объявления не должны их повторять
+                numbers = {int(AD_DIR_PATTERN.match(name).group(1)) for name in list(kept.values()) + surplus}
+                carried = {number: sources for number, sources in load_ad_combinations(published, manager_dir).items()
+                           if number in numbers} if published else {}
+                write_ad_combinations(staging, manager_dir, carried)
+                log_message(f"♻️ Сохранено {len(kept)} готовых объявлений, будет создано {count - len(kept)}")
+            
+            # Photos are dispatched lazily as the window advances / Фотографии отправляются лениво по мере продвижения окна
+            stamp = int(time.time())
+            job_seed = random.getrandbits(48)
+            # Whole job is selected up front: balanced usage and distinct ads / Вся задача выбирается заранее: равномерное использование и различные объявления
+            # Only missing numbers are selected, kept ads get a row of -1 / Выбираются только недостающие номера, сохранённые объявления получают строку из -1
+            missing = [i for i in range(count) if i not in kept]
+            rows = select_sources(position_sources, len(missing), job_seed, exclude=carried.values())
+            stats = selection_stats(position_sources, rows)
+            log_message(f"🎲 Выбор исходников: {stats['ads']} объявлений, {stats['files_used']} файлов, использований файла {stats['min_uses']}-{stats['max_uses']}")
+            selections = [[-1] * len(position_sources) for _ in range(count)]
+            for i, row in zip(missing, rows.tolist()):
+                selections[i] = row
+            write_manifest(staging, {
+                'folder_name': folder_name,
+                'count': count,
+                'use_rotation': use_rotation,
+                'stamp': stamp,
+                'job_seed': job_seed,
+                'position_sources': position_sources,
+                'selections': selections,
+                'kept': kept,
+                'surplus': surplus,
+            })
+        checkpointed = True
+        completed_log = CompletedLog(staging)
+        log_message(f"Подготовка нового поколения завершена")
         log_message(f"начал уникализировать фотографии")
         
-        # Initialize results tracking / Инициализируем отслеживание результатов
-        results = [None] * count
+        # Initialize progress tracking / Инициализируем отслеживание прогресса
         completed_count = 0
+        created_count = 0
         batch_start = time.time()
         
-        # Process ads in parallel using multiprocessing / Обрабатываем объявления параллельно с помощью мультипроцессинга
-        with concurrent.futures.ProcessPoolExecutor(max_workers=10) as executor:
-            # Submit all tasks to the executor / Отправляем все задачи в исполнитель
-            futures = [executor.submit(process_ad, i, position_sources, logo, folder_name, local_ready_base, use_rotation, manager) 
-                      for i in range(count)]
+        # Kept ads go to the sink first / Сохранённые объявления первыми идут в приёмник
+        for i in sorted(kept):
+            sink.write([i + 1, "\n".join(ad_links(manager, folder_name, kept[i]))])
+            completed_count += 1
+            created_count += 1
+        if kept and progress:
+            progress(completed_count, created_count)
+        
+        # Photos left per ad and ads with failed photos, only ads in flight are kept
+        # Оставшиеся фотографии по объявлениям и объявления с ошибками, хранятся только объявления в работе
+        remaining = {}
+        failed = set()
+        skipped = []
+        created = []
+        
+        def photo_tasks():
+            """Walk ads one by one and yield their photos / Проходит объявления по одному и выдаёт их фотографии"""
+            for i in range(count):
+                if i in kept:
+                    continue
+                seed = ad_seed(job_seed, i)
+                if selections[i][0] < 0:
+                    skipped.append(i)
+                    continue
+                # Create unique directory for this ad / Создаём уникальную директорию для данного объявления
+                os.makedirs(os.path.join(local_ready_base, ad_dir_name(i, stamp)), exist_ok=True)
+                remaining[i] = PHOTOS_PER_AD
+                # Tasks carry only indices and seeds / Задачи несут только индексы и зёрна
+                for j in range(PHOTOS_PER_AD):
+                    yield (i, seed, j)
+        
+        # Shared decoded sources for this job (one node only) / Общие декодированные исходники для этой задачи (только один узел)
+        job_id = uuid.uuid4().hex[:8]
+        source_cache = None
+        if USE_SOURCE_CACHE and not USE_RENDER_QUEUE and not lazy:
+            all_sources = {f for files in position_sources for f in files}
+            source_cache = SourceCache(job_id, all_sources)
+        
+        # Job parameters are published once, workers read them by job id
+        # Параметры задачи публикуются один раз, рабочие читают их по id задачи
+        context = {
+            'position_sources': position_sources,
+            'selections': selections,
+            'logo_bank_path': logo_bank_path,
+            'use_rotation': use_rotation,
+            'local_ready_base': local_ready_base,
+            'stamp': stamp,
+            'source_cache': source_cache is not None,
+        }
+        
+        # Render photos in parallel using multiprocessing / Отрисовываем фотографии параллельно с помощью мультипроцессинга
+        in_flight = set()
+        job_context = None
+        try:
+            if lazy:
+                # Only recipes are written, photos are rendered on first request / Пишутся только рецепты, фотографии отрисовываются при первом запросе
+                def submit(photos):
+                    future = concurrent.futures.Future()
+                    future.set_result(write_recipes(context, manager_dir, photos))
+                    return future
+                workers = 1
+            elif USE_RENDER_QUEUE:
+                # Tasks go to the Redis queue, any node can render them / Задачи идут в очередь Redis, их может отрисовать любой узел
+                job_context = QueueJob(job_id, context)
+                submit = job_context.submit
+                workers = QUEUE_WORKERS_HINT
+            else:
+                # Long-lived shared pool, not shut down after the job / Долгоживущий общий пул, не останавливается после задачи
+                job_context = JobContext(job_id, **context)
+                executor = get_worker_pool()
+                submit = lambda photos: executor.submit(render_photos, job_id, photos)
+                workers = get_worker_pool_size()
+            chunk = photo_chunk_size(count * PHOTOS_PER_AD, workers)
+            window = workers * TASKS_IN_FLIGHT_PER_WORKER
+            tasks = photo_tasks()
             
-            # Process completed tasks as they finish / Обрабатываем завершённые задачи по мере их выполнения
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result:
-                    # Store result at correct index / Сохраняем результат по правильному индексу
-                    idx = result[0] - 1
-                    results[idx] = result
+            while True:
+                # Top up the window / Пополняем окно
+                while len(in_flight) < window:
+                    photos = list(itertools.islice(tasks, chunk))
+                    if not photos:
+                        break
+                    in_flight.add(submit(photos))
                 
-                completed_count += 1
+                # Ads that failed planning count as processed / Объявления, не прошедшие планирование, считаются обработанными
+                if skipped:
+                    completed_count += len(skipped)
+                    skipped.clear()
+                    if progress:
+                        progress(completed_count, created_count)
                 
-                # Log progress every 10 ads / Логируем прогресс каждые 10 объявлений
-                if completed_count % 10 == 0:
-                    log_message(f"Обработка {completed_count} объявлений завершена (время на последние 10: {time.time() - batch_start:.2f} сек)")
-                    batch_start = time.time()
+                if not in_flight:
+                    break
                 
-                # Log milestone every 100 ads / Логируем контрольную точку каждые 100 объявлений
-                if completed_count % 100 == 0:
-                    log_message(f"{completed_count} объявлений создано")
+                finished, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    done, cache_events = future.result()
+                    if source_cache:
+                        source_cache.record(cache_events)
+                    
+                    # Reassemble ads as their photos finish / Собираем объявления по мере готовности их фотографий
+                    for i, j, ok in done:
+                        if not ok:
+                            failed.add(i)
+                        remaining[i] -= 1
+                        if remaining[i]:
+                            continue
+                        
+                        # Ad is complete, stream it to the sink / Объявление готово, отправляем его в приёмник
+                        del remaining[i]
+                        if i in failed:
+                            failed.discard(i)
+                        else:
+                            sink.write([i + 1, "\n".join(ad_links(manager, folder_name, ad_dir_name(i, stamp)))])
+                            completed_log.add(i)
+                            created.append(i)
+                            created_count += 1
+                        
+                        completed_count += 1
+                        if progress:
+                            progress(completed_count, created_count)
+                        
+                        # Log progress every 10 ads / Логируем прогресс каждые 10 объявлений
+                        if completed_count % 10 == 0:
+                            log_message(f"Обработка {completed_count} объявлений завершена (время на последние 10: {time.time() - batch_start:.2f} сек)")
+                            batch_start = time.time()
+                        
+                        # Log milestone every 100 ads / Логируем контрольную точку каждые 100 объявлений
+                        if completed_count % 100 == 0:
+                            log_message(f"{completed_count} объявлений создано")
+        finally:
+            # Drop queued tasks and release shared sources even if the job fails
+            # Отменяем задачи в очереди и освобождаем общие исходники даже при ошибке задачи
+            for future in in_flight:
+                future.cancel()
+            if job_context:
+                job_context.close()
+            if source_cache:
+                source_cache.close()
+            completed_log.close()
+        
+        # Swap published category to the new generation / Переключаем опубликованную категорию на новое поколение
+        if created_count or not count:
+            clear_checkpoint(staging)
+            # Links are served from the manifest, not by scanning ad directories / Ссылки отдаются из манифеста, а не сканированием директорий объявлений
+            ads = {i + 1: kept[i] for i in kept}
+            ads.update((i + 1, ad_dir_name(i, stamp)) for i in created)
+            ads.update((int(AD_DIR_PATTERN.match(name).group(1)), name) for name in surplus)
+            write_ads_manifest(staging, {number: (name, complete_ad_files()) for number, name in ads.items()})
+            # Carried combinations were saved before rendering, so a resumed job has them too
+            # Перенесённые комбинации сохранены до отрисовки, поэтому они есть и у продолженной задачи
+            combinations = {number: sources for number, sources in load_ad_combinations(staging, manager_dir).items()
+                            if number in ads}
+            # Ads of this plan: created now or finished before a restart / Объявления этого плана: созданные сейчас или готовые до перезапуска
+            combinations.update((i + 1, ad_files(context, i)) for i in kept
+                                if kept[i] == ad_dir_name(i, stamp) and selections[i][0] >= 0)
+            combinations.update((i + 1, ad_files(context, i)) for i in created)
+            write_ad_combinations(staging, manager_dir, combinations)
+            publish_generation(manager_dir, folder_name, staging)
+            # Counter follows the live generation / Счётчик следует за опубликованным поколением
+            set_ready_count(manager_dir, folder_name, len(ads))
+            refresh_path(os.path.join(manager_dir, 'ready_photos'))
+            refresh_path(os.path.join(manager_dir, 'ready_photos', folder_name))
+        else:
+            log_message(f"⚠️ Ни одного объявления не создано, прежнее поколение остаётся опубликованным")
+            discard_generation(staging)
+        staging = None
         
         # Final summary / Итоговая сводка
         log_message(f"Уникализация завершена (общее время: {time.time() - start_time:.2f} сек)")
         
-        # Filter out failed ads / Фильтруем неудачные объявления
-        results = [r for r in results if r]
-        
         # Warn if some ads failed / Предупреждаем, если некоторые объявления не удались
-        if len(results) < count:
-            log_message(f"⚠️ Создано только {len(results)} объявлений из {count}")
+        if created_count < count:
+            log_message(f"⚠️ Создано только {created_count} объявлений из {count}")
         
-        return results
+        return sink.result()
     
     except Exception as e:
         # Handle any errors during processing / Обрабатываем любые ошибки во время обработки
         log_message(f"❌ Ошибка: {str(e)}")
-        return []
\ No newline at end of file
+        # Unfinished generation is never published, with a manifest it can be resumed
+        # Незавершённое поколение никогда не публикуется, с манифестом его можно продолжить
+        if staging and checkpointed:
+            log_message(f"💾 Прогресс задачи сохранён, её можно продолжить с resume")
+        elif staging:
+            discard_generation(staging)
+        sink.fail(f"Ошибка уникализации: {e}")
+        return sink.result()
+    finally:
+        sink.close()
+        if category_lock:
+            category_lock.release()
\ No newline at end of file
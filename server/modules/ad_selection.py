@@ -0,0 +1,234 @@
+# filename="ad_selection.py"
+# server/modules/ad_selection.py
+# Ad Source Selection Module / Модуль выбора исходников объявлений
+
+"""
+Ad Source Selection Module / Модуль выбора исходников объявлений
+
+This module picks a source file for every position of every ad of a job at once, in the
+parent process before any task is dispatched.
+Данный модуль выбирает исходный файл для каждой позиции каждого объявления задачи сразу,
+в родительском процессе до отправки задач.
+
+Files are grouped into classes by the set of positions they can fill (root files, one subfolder...).
+Файлы группируются в классы по набору позиций, которые они могут занять (файлы корня, одна подпапка...).
+
+1. Balanced usage: slots of each position are split between its classes so that the most used
+   file is used as little as possible, then each class hands out files from concatenated shuffled
+   permutations, so files of a class are used evenly
+   Равномерное использование: слоты каждой позиции делятся между её классами так, чтобы самый
+   используемый файл использовался как можно меньше, затем каждый класс выдаёт файлы из склеенных
+   перемешанных перестановок, поэтому файлы класса используются равномерно
+2. No repeats within an ad: an ad takes consecutive files of a permutation, the few rows that
+   straddle two permutations are repaired
+   Без повторов в объявлении: объявление берёт подряд идущие файлы перестановки, немногие строки
+   на стыке двух перестановок исправляются
+3. Distinct ads: a hashed index of combinations (file per position) guarantees that no two ads
+   of a job get the same photos; an incremental job puts the combinations of its kept ads into
+   the index first
+   Различные объявления: хэш-индекс комбинаций (файл на позицию) гарантирует, что два объявления
+   задачи не получат одни и те же фото; инкрементальная задача сначала помещает в индекс
+   комбинации сохранённых объявлений
+
+Everything except the repaired rows is vectorized with numpy.
+Всё, кроме исправляемых строк, векторизовано через numpy.
+"""
+
+import random
+import numpy as np
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+BALANCE_STEPS = 64  # Parts a position's slots are split into between classes / Частей, на которые слоты позиции делятся между классами
+MAX_REPAIR_ATTEMPTS = 50  # Changes tried per row before the ad is dropped / Попыток изменения строки до отказа от объявления
+REPAIR_SAMPLE = 8  # Free files compared by usage when repairing a position / Свободных файлов, сравниваемых по использованию при исправлении позиции
+
+def select_sources(position_sources, count, seed, exclude=()):
+    """
+    Select source files for all ads of a job / Выбрать исходные файлы для всех объявлений задачи
+
+    Args:
+        position_sources (list): Files for each position / Файлы для каждой позиции
+        count (int): Number of ads / Количество объявлений
+        seed (int): Job seed, same seed and sources give same selection / Зерно задачи, одно зерно и исходники дают один выбор
+        exclude (iterable): Combinations (file per position) of kept ads that new ads must not repeat
+                            Комбинации (файл на позицию) сохранённых объявлений, которые новые объявления не должны повторять
+
+    Returns:
+        ndarray: (count, positions) int32 indices into position_sources[position], row of -1 for an ad that couldn't be built
+                 (count, позиции) int32 индексы в position_sources[позиция], строка из -1 для объявления, которое не удалось собрать
+    """
+    rng = np.random.default_rng(seed)
+    positions = len(position_sources)
+    count = max(count, 0)
+
+    # Global file ids let positions that share files be compared / Глобальные id файлов позволяют сравнивать позиции с общими файлами
+    file_ids = {}
+    position_ids = [list(dict.fromkeys(file_ids.setdefault(f, len(file_ids)) for f in files)) for files in position_sources]
+    if not count or any(not ids for ids in position_ids):
+        return np.full((count, positions), -1, dtype=np.int32)
+
+    # Classes of files by positions mask / Классы файлов по маске позиций
+    membership = np.zeros(len(file_ids), dtype=np.int64)
+    for p, ids in enumerate(position_ids):
+        membership[ids] |= 1 << p
+    masks, file_class = np.unique(membership, return_inverse=True)
+    class_files = [np.flatnonzero(file_class == c).astype(np.int32) for c in range(len(masks))]
+    sizes = np.array([len(files) for files in class_files], dtype=np.float64)
+    position_classes = [[c for c in range(len(masks)) if masks[c] >> p & 1] for p in range(positions)]
+
+    # 1. Split slots of each position between its classes, least loaded class first
+    # 1. Делим слоты каждой позиции между её классами, сначала наименее загруженный класс
+    slots = np.zeros((positions, len(masks)), dtype=np.int64)
+    load = np.zeros(len(masks))
+    parts = np.diff(np.linspace(0, count, min(count, BALANCE_STEPS) + 1).astype(np.int64))
+    order = sorted(range(positions), key=lambda p: len(position_classes[p]))
+    for part in parts:
+        for p in order:
+            classes = position_classes[p]
+            c = classes[int(np.argmin(load[classes] + part / sizes[classes]))]
+            slots[p, c] += part
+            load[c] += part / sizes[c]
+
+    # 2. Class of every ad position / Класс каждой позиции объявления
+    ad_class = np.empty((count, positions), dtype=np.int32)
+    for p in range(positions):
+        ads = rng.permutation(count)
+        bounds = np.concatenate([[0], np.cumsum(slots[p])])
+        for c in np.flatnonzero(slots[p]):
+            ad_class[ads[bounds[c]:bounds[c + 1]], p] = c
+
+    # 3. Files from per-class permutation streams, ads take consecutive files (row-major order)
+    # 3. Файлы из потоков перестановок по классам, объявления берут подряд идущие файлы (построчный порядок)
+    chosen = np.empty((count, positions), dtype=np.int32)
+    for c, files in enumerate(class_files):
+        rows, cols = np.nonzero(ad_class == c)
+        if not len(rows):
+            continue
+        cycles = -(-len(rows) // len(files))
+        # All permutations at once: argsort of random keys per cycle / Все перестановки сразу: argsort случайных ключей на цикл
+        permutations = rng.random((cycles, len(files))).argsort(axis=1)
+        chosen[rows, cols] = files[permutations].ravel()[:len(rows)]
+
+    # Rows with a repeated file have equal neighbours when sorted / В строках с повтором файла есть равные соседи после сортировки
+    sorted_rows = np.sort(chosen, axis=1)
+    bad = (sorted_rows[:, 1:] == sorted_rows[:, :-1]).any(axis=1)
+
+    # Hash of every combination, later equal hashes count as duplicates (never lets a duplicate through)
+    # Хэш каждой комбинации, последующие равные хэши считаются дубликатами (дубликат никогда не проходит)
+    multipliers = rng.integers(1, 2 ** 63, size=positions, dtype=np.uint64) | np.uint64(1)
+    hashes = (chosen.astype(np.uint64) * multipliers).sum(axis=1, dtype=np.uint64)
+    _, first = np.unique(hashes, return_index=True)
+    duplicate = np.ones(count, dtype=bool)
+    duplicate[first] = False
+    bad |= duplicate
+
+    # Kept ads are in the index before any new row / Сохранённые объявления попадают в индекс раньше новых строк
+    # A combination with a file that is no longer a source can't be repeated and is skipped
+    # Комбинация с файлом, который больше не исходник, не может повториться и пропускается
+    mults = multipliers.tolist()
+    excluded = {_row_hash([file_ids[f] for f in row], mults) for row in exclude
+                if len(row) == positions and all(f in file_ids for f in row)}
+    if excluded:
+        bad |= np.isin(hashes, np.fromiter(excluded, dtype=np.uint64, count=len(excluded)))
+    seen = set(hashes[~bad].tolist()) | excluded
+
+    # Repair the few bad rows one by one / Исправляем немногие плохие строки по одной
+    usage = np.bincount(chosen[~bad].ravel(), minlength=len(file_ids))
+    allowed = [set(ids) for ids in position_ids]
+    repair_rng = random.Random(seed)
+    failed = []
+    for i in np.flatnonzero(bad).tolist():
+        row = _repair_row(chosen[i].tolist(), position_ids, allowed, usage, seen, mults, repair_rng)
+        if row is None:
+            failed.append(i)
+            continue
+        chosen[i] = row
+        usage[row] += 1
+
+    # Global ids back to indices within each position / Глобальные id обратно в индексы внутри каждой позиции
+    selections = np.empty((count, positions), dtype=np.int32)
+    for p, files in enumerate(position_sources):
+        # First occurrence, a file may be listed twice (root joined with itself) / Первое вхождение, файл может быть указан дважды (корень, объединённый с собой)
+        ids, first = np.unique([file_ids[f] for f in files], return_index=True)
+        local = np.full(len(file_ids), -1, dtype=np.int32)
+        local[ids] = first
+        selections[:, p] = local[chosen[:, p]]
+    if failed:
+        selections[failed] = -1
+        log_message(f"⚠️ Не удалось подобрать различные файлы для {len(failed)} объявлений")
+    return selections
+
+def _row_hash(row, mults):
+    """Combination hash, same as the vectorized one / Хэш комбинации, такой же как векторизованный"""
+    return sum(f * m for f, m in zip(row, mults)) % 2 ** 64
+
+def _repair_row(row, position_ids, allowed, usage, seen, mults, rng):
+    """
+    Make row free of repeats and unseen / Сделать строку без повторов и новой
+
+    A repeated position gets the least used of a few free files, or swaps its file with
+    another position when no file is free.
+    Повторная позиция получает наименее использованный из нескольких свободных файлов или
+    меняется файлом с другой позицией, если свободных файлов нет.
+
+    Returns:
+        list or None: Global file ids of the row or None if no distinct row was found
+                      Глобальные id файлов строки или None если различная строка не найдена
+    """
+    positions = len(row)
+    for _ in range(MAX_REPAIR_ATTEMPTS):
+        used = set()
+        repeated = []
+        for p, f in enumerate(row):
+            if f in used:
+                repeated.append(p)
+            used.add(f)
+        if not repeated:
+            h = _row_hash(row, mults)
+            if h not in seen:
+                seen.add(h)
+                return row
+            # Same combination as another ad: change one random position / Та же комбинация, что у другого объявления: меняем одну случайную позицию
+            repeated = [rng.randrange(positions)]
+
+        for p in repeated:
+            ids = position_ids[p]
+            sample = [ids[rng.randrange(len(ids))] for _ in range(REPAIR_SAMPLE)]
+            free = [f for f in sample if f not in used]
+            if len(free) < len(sample) and len(ids) <= 4 * REPAIR_SAMPLE:
+                # Small pool: look at every file / Маленький пул: смотрим все файлы
+                free = [f for f in ids if f not in used]
+            if free:
+                f = min(free, key=lambda f: usage[f])
+                used.add(f)
+                row[p] = f
+                continue
+            # No free file: swap with a position that accepts this one / Нет свободного файла: обмен с позицией, принимающей этот
+            q = rng.randrange(positions)
+            if q != p and row[q] in allowed[p] and row[p] in allowed[q]:
+                row[p], row[q] = row[q], row[p]
+    return None
+
+def selection_stats(position_sources, selections):
+    """
+    Get usage spread of a selection / Получить разброс использования выбора
+
+    Args:
+        position_sources (list): Files for each position / Файлы для каждой позиции
+        selections (ndarray): Result of select_sources / Результат select_sources
+
+    Returns:
+        dict: Built ads, distinct files used, min and max uses of a file / Собранные объявления, использованные файлы, мин. и макс. использований файла
+    """
+    built = selections[(selections >= 0).all(axis=1)]
+    counts = {}
+    for p, files in enumerate(position_sources):
+        for k in built[:, p].tolist():
+            counts[files[k]] = counts.get(files[k], 0) + 1
+    return {
+        'ads': len(built),
+        'files_used': len(counts),
+        'min_uses': min(counts.values(), default=0),
+        'max_uses': max(counts.values(), default=0),
+    }
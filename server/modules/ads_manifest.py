@@ -0,0 +1,89 @@
+# filename="ads_manifest.py"
+# server/modules/ads_manifest.py
+# Category Ads Manifest Module / Модуль манифеста объявлений категории
+
+"""
+Category Ads Manifest Module / Модуль манифеста объявлений категории
+
+A job writes a compact list of its finished ads into the generation directory right before
+it is published, so links of a category are served without scanning ad directories.
+Задача записывает компактный список готовых объявлений в директорию поколения прямо перед
+публикацией, поэтому ссылки категории отдаются без сканирования директорий объявлений.
+
+Manifest (.ads.json in generation directory) / Манифест (.ads.json в директории поколения):
+- generation: generation directory name / имя директории поколения
+- ads: [ad number, directory name, file names], sorted by number / [номер объявления, имя директории, имена файлов], по номеру
+
+Published generations don't change, so parsed manifests are kept in memory by path and mtime.
+Опубликованные поколения не меняются, поэтому разобранные манифесты хранятся в памяти по пути и mtime.
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+ADS_MANIFEST_NAME = '.ads.json'  # Manifest file in generation directory / Файл манифеста в директории поколения
+ADS_MANIFEST_VERSION = 1  # Bumped when manifest format changes / Увеличивается при изменении формата манифеста
+ADS_MANIFEST_CACHE_SIZE = 64  # Parsed manifests kept in memory / Разобранных манифестов в памяти
+
+_manifest_cache = OrderedDict()
+_manifest_lock = threading.Lock()
+
+def write_ads_manifest(generation_dir, ads):
+    """
+    Save ads manifest of a generation atomically / Атомарно сохранить манифест объявлений поколения
+
+    Args:
+        generation_dir (str): Generation (or plain category) directory / Директория поколения (или обычной категории)
+        ads (dict): Ad number -> (directory name, file names) / Номер объявления -> (имя директории, имена файлов)
+    """
+    manifest = {
+        'version': ADS_MANIFEST_VERSION,
+        'generation': os.path.basename(os.path.realpath(generation_dir)),
+        'ads': [[number, name, list(files)] for number, (name, files) in sorted(ads.items())],
+    }
+    path = os.path.join(generation_dir, ADS_MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def load_ads_manifest(category_dir):
+    """
+    Load ads manifest of a published category / Загрузить манифест объявлений опубликованной категории
+
+    Args:
+        category_dir (str): ready_photos/<folder> path / Путь ready_photos/<folder>
+
+    Returns:
+        tuple or None: (manifest, version tag for ETag) or None if missing or unreadable
+                       (манифест, метка версии для ETag) или None если отсутствует или не читается
+    """
+    path = os.path.join(os.path.realpath(category_dir), ADS_MANIFEST_NAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    key = (path, mtime)
+    with _manifest_lock:
+        if key in _manifest_cache:
+            _manifest_cache.move_to_end(key)
+            return _manifest_cache[key]
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != ADS_MANIFEST_VERSION:
+        return None
+
+    loaded = (manifest, f"{manifest['generation']}-{mtime}")
+    with _manifest_lock:
+        _manifest_cache[key] = loaded
+        while len(_manifest_cache) > ADS_MANIFEST_CACHE_SIZE:
+            _manifest_cache.popitem(last=False)
+    return loaded
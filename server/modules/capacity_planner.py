@@ -0,0 +1,112 @@
+# filename="capacity_planner.py"
+# server/modules/capacity_planner.py
+# Ad Capacity Planner Module / Модуль планирования ёмкости объявлений
+
+"""
+Ad Capacity Planner Module / Модуль планирования ёмкости объявлений
+
+This module checks before rendering how many distinct ads a category can give under the
+rule that one ad never repeats a file. Jobs asking for more fail before any work is done.
+Данный модуль до отрисовки проверяет, сколько различных объявлений может дать категория
+при правиле, что одно объявление никогда не повторяет файл. Задачи, запрашивающие больше,
+проваливаются до начала работы.
+
+- Feasibility: bipartite matching of positions to files, an ad exists only if every position is matched
+  Выполнимость: двудольное паросочетание позиций и файлов, объявление существует только если сопоставлена каждая позиция
+- Capacity: exact number of distinct ads (file per position, no repeats), counted over groups
+  of files that belong to the same positions
+  Ёмкость: точное число различных объявлений (файл на позицию, без повторов), считается по группам
+  файлов, принадлежащих одним и тем же позициям
+"""
+
+from collections import Counter
+
+def max_matching(position_sources):
+    """
+    Match positions to distinct files / Сопоставить позициям различные файлы
+
+    Args:
+        position_sources (list): Files for each position / Файлы для каждой позиции
+
+    Returns:
+        tuple: (number of matched positions, list of unmatched position indices)
+               (число сопоставленных позиций, список индексов несопоставленных позиций)
+    """
+    owner = {}  # file -> position / файл -> позиция
+
+    def augment(pos, seen):
+        """Find augmenting path from position (Kuhn) / Найти увеличивающий путь от позиции (Кун)"""
+        for f in position_sources[pos]:
+            if f in seen:
+                continue
+            seen.add(f)
+            if f not in owner or augment(owner[f], seen):
+                owner[f] = pos
+                return True
+        return False
+
+    unmatched = [pos for pos in range(len(position_sources)) if not augment(pos, set())]
+    return len(position_sources) - len(unmatched), unmatched
+
+def count_distinct_ads(position_sources):
+    """
+    Count distinct ads with one file per position and no repeated files
+    Посчитать различные объявления с одним файлом на позицию и без повторов файлов
+
+    Files are grouped by the set of positions they can fill. For each group the DP over filled
+    position masks chooses which positions it fills, in n * (n-1) * ... ways.
+    Файлы группируются по набору позиций, которые они могут занять. Для каждой группы ДП по маскам
+    заполненных позиций выбирает, какие позиции она заполняет, n * (n-1) * ... способами.
+
+    Args:
+        position_sources (list): Files for each position / Файлы для каждой позиции
+
+    Returns:
+        int: Number of distinct ads / Число различных объявлений
+    """
+    membership = {}
+    for pos, files in enumerate(position_sources):
+        for f in set(files):
+            membership[f] = membership.get(f, 0) | (1 << pos)
+    groups = Counter(membership.values())  # positions mask -> number of files / маска позиций -> число файлов
+
+    full = (1 << len(position_sources)) - 1
+    ways = {0: 1}
+    for group_mask, n in groups.items():
+        next_ways = {}
+        for filled, w in ways.items():
+            free = group_mask & ~filled
+            # Every subset of free positions this group can take / Каждое подмножество свободных позиций, которые группа может занять
+            sub = free
+            while True:
+                k = bin(sub).count('1')
+                if k <= n:
+                    arrangements = 1
+                    for t in range(k):
+                        arrangements *= n - t
+                    next_ways[filled | sub] = next_ways.get(filled | sub, 0) + w * arrangements
+                if sub == 0:
+                    break
+                sub = (sub - 1) & free
+        ways = next_ways
+    return ways.get(full, 0)
+
+def plan_capacity(position_sources):
+    """
+    Get category capacity report / Получить отчёт о ёмкости категории
+
+    Args:
+        position_sources (list): Files for each position / Файлы для каждой позиции
+
+    Returns:
+        dict: max_ads, feasible, files per position and positions without a file of their own
+              max_ads, feasible, файлы по позициям и позиции без собственного файла
+    """
+    matched, unmatched = max_matching(position_sources)
+    return {
+        'max_ads': count_distinct_ads(position_sources) if not unmatched else 0,
+        'feasible': not unmatched,
+        'matched_positions': matched,
+        'unmatched_positions': [pos + 1 for pos in unmatched],
+        'position_files': [len(set(files)) for files in position_sources],
+    }
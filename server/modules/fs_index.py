@@ -0,0 +1,591 @@
+# filename="fs_index.py"
+# server/modules/fs_index.py
+# Filesystem Metadata Index Module / Модуль индекса метаданных файловой системы
+
+"""
+Filesystem Metadata Index Module / Модуль индекса метаданных файловой системы
+
+This module keeps managers, categories, positions and files of data/managers in SQLite, so
+listings are indexed queries instead of a listdir plus one stat per entry.
+Данный модуль хранит менеджеров, категории, позиции и файлы data/managers в SQLite, поэтому
+списки - это запросы по индексу вместо listdir и одного stat на запись.
+
+- A directory is indexed the first time it is listed, together with its mtime
+  Директория индексируется при первом обращении к ней вместе с её mtime
+- Write endpoints and publishing refresh the directories they change in one transaction
+  Записывающие эндпоинты и публикация обновляют изменённые директории одной транзакцией
+- A changed directory mtime (out-of-band add, remove or rename) makes the next listing rescan it,
+  one stat per listing instead of one per entry
+  Изменившийся mtime директории (добавление, удаление или переименование в обход сервера) заставляет
+  следующий запрос перечитать её, один stat на запрос вместо одного на запись
+- Optional inotify watcher (Linux) refreshes directories as soon as they change
+  Необязательный наблюдатель inotify (Linux) обновляет директории сразу после изменения
+- Image dimensions are read only when a listing asks for details, then kept until the file changes
+  Размеры изображений читаются только когда список запрошен с подробностями, затем хранятся до изменения файла
+
+Rows are keyed by (manager, dir, path): dir is photo_cache or ready_photos, path is relative with '/'.
+Managers themselves are rows of the ('', '', '') directory.
+Строки имеют ключ (manager, dir, path): dir - photo_cache или ready_photos, path - относительный через '/'.
+Сами менеджеры - строки директории ('', '', '').
+"""
+
+import os
+import json
+import time
+import base64
+import select
+import struct
+import ctypes
+import sqlite3
+import threading
+from PIL import Image
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # Base server directory / Базовая директория сервера
+MANAGERS_DIR = os.path.join(BASE_DIR, 'data', 'managers')  # Indexed tree / Индексируемое дерево
+FS_INDEX_PATH = os.path.join(BASE_DIR, 'data', 'fs_index.sqlite3')  # Index database / База индекса
+FS_INDEX_VERSION = 1  # Bumped when schema changes, index is rebuilt lazily / Увеличивается при изменении схемы, индекс перестраивается лениво
+INDEXED_DIRS = ('photo_cache', 'ready_photos')  # Indexed manager directories / Индексируемые директории менеджера
+DIMENSION_DIRS = ('photo_cache',)  # Directories whose images get width and height on detailed listings / Директории, для изображений которых подробный список читает ширину и высоту
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')  # Files to read dimensions of / Файлы, у которых читаются размеры
+MTIME_SETTLE_NS = 2 * 10 ** 9  # Directory changed this recently is rescanned (mtime granularity) / Недавно изменённая директория перечитывается (точность mtime)
+USE_FS_WATCHER = False  # Start inotify watcher with the server / Запускать наблюдатель inotify вместе с сервером
+WATCHER_DEBOUNCE = 1.0  # Seconds to gather events before refreshing / Секунд сбора событий перед обновлением
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS entries (
+    manager TEXT NOT NULL, dir TEXT NOT NULL, path TEXT NOT NULL, parent TEXT NOT NULL, name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL, size INTEGER, mtime_ns INTEGER, width INTEGER, height INTEGER,
+    PRIMARY KEY (manager, dir, path)
+);
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (manager, dir, parent, name);
+CREATE INDEX IF NOT EXISTS entries_parent_mtime ON entries (manager, dir, parent, mtime_ns, name);
+CREATE INDEX IF NOT EXISTS entries_parent_size ON entries (manager, dir, parent, size, name);
+CREATE TABLE IF NOT EXISTS scanned (
+    manager TEXT NOT NULL, dir TEXT NOT NULL, path TEXT NOT NULL, mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (manager, dir, path)
+);
+"""
+
+_local = threading.local()
+
+def _conn():
+    """Per-thread connection, schema is created on first use / Соединение на поток, схема создаётся при первом использовании"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(FS_INDEX_PATH), exist_ok=True)
+        conn = sqlite3.connect(FS_INDEX_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with conn:
+            conn.executescript(SCHEMA)
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or int(row['value']) != FS_INDEX_VERSION:
+                # Old schema or format: start over, directories are indexed again on demand
+                # Старая схема или формат: начинаем заново, директории индексируются снова по запросу
+                conn.execute('DELETE FROM entries')
+                conn.execute('DELETE FROM scanned')
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(FS_INDEX_VERSION),))
+        _local.conn = conn
+    return conn
+
+def _full_path(manager, dir_type, path):
+    """Filesystem path of an index directory / Путь файловой системы директории индекса"""
+    if not manager:
+        return MANAGERS_DIR
+    return os.path.join(MANAGERS_DIR, manager, dir_type, *[part for part in path.split('/') if part])
+
+def _child_path(parent, name):
+    """Relative path of a child / Относительный путь дочерней записи"""
+    return f"{parent}/{name}" if parent else name
+
+def _subtree_clause(path):
+    """SQL condition and arguments for path and everything below it / Условие SQL и аргументы для пути и всего под ним"""
+    if not path:
+        return '1', ()
+    # '0' follows '/' in byte order, so the range holds exactly path/... / '0' идёт за '/' по порядку байт, поэтому диапазон содержит ровно path/...
+    return '(path = ? OR (path >= ? AND path < ?))', (path, path + '/', path + '0')
+
+def image_size(file_path):
+    """
+    Read image dimensions from its header / Прочитать размеры изображения из заголовка
+
+    Args:
+        file_path (str): Image path / Путь изображения
+
+    Returns:
+        tuple: (width, height) or (None, None) if not readable / (ширина, высота) или (None, None) если не читается
+    """
+    try:
+        with Image.open(file_path) as im:
+            return im.size
+    except Exception:
+        return None, None
+
+def _scan(manager, dir_type, path, full_path, known):
+    """
+    Read children of a directory with scandir / Прочитать дочерние записи директории через scandir
+
+    Images are not opened here: known dimensions are kept while size and mtime are unchanged,
+    the rest are read on demand by _fill_dimensions.
+    Изображения здесь не открываются: известные размеры сохраняются, пока размер и mtime не изменились,
+    остальные читаются по запросу в _fill_dimensions.
+    """
+    rows = []
+    with os.scandir(full_path) as entries:
+        for entry in entries:
+            try:
+                # Follows symlinks: published categories are links to generations / Следует по ссылкам: опубликованные категории - ссылки на поколения
+                stat = entry.stat()
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            child = _child_path(path, entry.name)
+            width = height = None
+            old = known.get(entry.name)
+            if not is_dir and old and old['size'] == stat.st_size and old['mtime_ns'] == stat.st_mtime_ns:
+                width, height = old['width'], old['height']
+            rows.append((manager, dir_type, child, path, entry.name, int(is_dir),
+                         None if is_dir else stat.st_size, stat.st_mtime_ns, width, height))
+    return rows
+
+def _fill_dimensions(manager, dir_type, rows):
+    """
+    Read missing image dimensions of listed rows and store them / Прочитать недостающие размеры изображений выведенных строк и сохранить их
+
+    Only the rows of one page are opened, never the whole directory.
+    Открываются только строки одной страницы, а не вся директория.
+
+    Args:
+        manager (str): Manager name / Имя менеджера
+        dir_type (str): photo_cache or ready_photos / photo_cache или ready_photos
+        rows (list): Row dicts of query_dir, updated in place / Словари строк query_dir, обновляются на месте
+    """
+    if dir_type not in DIMENSION_DIRS:
+        return
+    updates = []
+    for row in rows:
+        if row['is_dir'] or row['width'] is not None or not row['name'].lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        row['width'], row['height'] = image_size(_full_path(manager, dir_type, row['path']))
+        if row['width'] is not None:
+            updates.append((row['width'], row['height'], manager, dir_type, row['path'], row['size'], row['mtime_ns']))
+    if updates:
+        conn = _conn()
+        with conn:
+            # A file rescanned meanwhile keeps NULL and is read again / Файл, перечитанный за это время, остаётся с NULL и читается снова
+            conn.executemany('UPDATE entries SET width = ?, height = ? '
+                             'WHERE manager = ? AND dir = ? AND path = ? AND size = ? AND mtime_ns = ?', updates)
+
+def refresh_dir(manager='', dir_type='', path='', recursive=False):
+    """
+    Re-read a directory into the index in one transaction / Перечитать директорию в индекс одной транзакцией
+
+    Children that disappeared are removed with everything below them.
+    Исчезнувшие дочерние записи удаляются вместе со всем, что под ними.
+
+    Args:
+        manager (str): Manager name, '' for the managers directory / Имя менеджера, '' для директории менеджеров
+        dir_type (str): photo_cache or ready_photos / photo_cache или ready_photos
+        path (str): Relative directory path / Относительный путь директории
+        recursive (bool): Also refresh subdirectories / Также обновить поддиректории
+    """
+    full_path = _full_path(manager, dir_type, path)
+    conn = _conn()
+    try:
+        dir_mtime = os.stat(full_path).st_mtime_ns
+        if not os.path.isdir(full_path):
+            raise NotADirectoryError(full_path)
+    except OSError:
+        remove_tree(manager, dir_type, path)
+        return
+
+    known = {row['name']: row for row in conn.execute(
+        'SELECT * FROM entries WHERE manager = ? AND dir = ? AND parent = ?', (manager, dir_type, path))}
+    rows = _scan(manager, dir_type, path, full_path, known)
+    with conn:
+        for name in set(known) - {row[4] for row in rows}:
+            _delete_subtree(conn, manager, dir_type, _child_path(path, name))
+        conn.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        conn.execute('INSERT OR REPLACE INTO scanned VALUES (?, ?, ?, ?)', (manager, dir_type, path, dir_mtime))
+
+    if recursive:
+        for row in rows:
+            if row[5]:
+                if manager:
+                    refresh_dir(manager, dir_type, row[2], recursive=True)
+                else:
+                    # Manager directory: its indexed directories / Директория менеджера: её индексируемые директории
+                    for sub in INDEXED_DIRS:
+                        refresh_dir(row[4], sub, '', recursive=True)
+
+def _delete_subtree(conn, manager, dir_type, path):
+    """Delete rows of path and below inside a transaction / Удалить строки пути и ниже внутри транзакции"""
+    clause, args = _subtree_clause(path)
+    if not manager:
+        # Manager row of the managers directory, then all of its data / Строка менеджера в директории менеджеров, затем все его данные
+        conn.execute("DELETE FROM entries WHERE manager = '' AND path = ?", (path,))
+        conn.execute('DELETE FROM entries WHERE manager = ?', (path,))
+        conn.execute('DELETE FROM scanned WHERE manager = ?', (path,))
+        return
+    conn.execute(f'DELETE FROM entries WHERE manager = ? AND dir = ? AND {clause}', (manager, dir_type) + args)
+    conn.execute(f'DELETE FROM scanned WHERE manager = ? AND dir = ? AND {clause}', (manager, dir_type) + args)
+
+def remove_tree(manager, dir_type, path):
+    """
+    Remove a deleted directory or file from the index / Удалить из индекса удалённую директорию или файл
+
+    Args:
+        manager (str): Manager name / Имя менеджера
+        dir_type (str): photo_cache or ready_photos / photo_cache или ready_photos
+        path (str): Relative path / Относительный путь
+    """
+    conn = _conn()
+    with conn:
+        if not manager and not path:
+            conn.execute('DELETE FROM entries')
+            conn.execute('DELETE FROM scanned')
+        else:
+            _delete_subtree(conn, manager, dir_type, path)
+
+def remove_indexed_manager(name):
+    """
+    Remove a deleted manager from the index / Удалить из индекса удалённого менеджера
+
+    Args:
+        name (str): Manager name / Имя менеджера
+    """
+    remove_tree('', '', name)
+    refresh_dir()
+
+def rename_indexed_manager(old_name, new_name):
+    """
+    Move index rows of a renamed manager / Перенести строки индекса переименованного менеджера
+
+    Args:
+        old_name (str): Old manager name / Старое имя менеджера
+        new_name (str): New manager name / Новое имя менеджера
+    """
+    conn = _conn()
+    with conn:
+        _delete_subtree(conn, '', '', new_name)
+        conn.execute('UPDATE entries SET manager = ? WHERE manager = ?', (new_name, old_name))
+        conn.execute('UPDATE scanned SET manager = ? WHERE manager = ?', (new_name, old_name))
+    refresh_dir()
+
+def _is_fresh(manager, dir_type, path):
+    """Directory was scanned and hasn't changed since / Директория прочитана и с тех пор не менялась"""
+    row = _conn().execute('SELECT mtime_ns FROM scanned WHERE manager = ? AND dir = ? AND path = ?',
+                          (manager, dir_type, path)).fetchone()
+    if row is None:
+        return False
+    try:
+        mtime = os.stat(_full_path(manager, dir_type, path)).st_mtime_ns
+    except OSError:
+        return False
+    return mtime == row['mtime_ns'] and time.time_ns() - mtime > MTIME_SETTLE_NS
+
+def list_dir(manager='', dir_type='', path=''):
+    """
+    List a directory from the index, scanning it first if needed / Получить содержимое директории из индекса, прочитав её при необходимости
+
+    Args:
+        manager (str): Manager name, '' for the managers directory / Имя менеджера, '' для директории менеджеров
+        dir_type (str): photo_cache or ready_photos / photo_cache или ready_photos
+        path (str): Relative directory path / Относительный путь директории
+
+    Returns:
+        list: Rows (name, path, is_dir, size, mtime_ns, width, height) ordered by name, width and height
+              are NULL until read by a detailed query_dir
+              Строки (name, path, is_dir, size, mtime_ns, width, height) по имени, width и height
+              равны NULL, пока их не прочитает подробный query_dir
+    """
+    if not _is_fresh(manager, dir_type, path):
+        refresh_dir(manager, dir_type, path)
+    return [dict(row) for row in _conn().execute(
+        'SELECT name, path, is_dir, size, mtime_ns, width, height FROM entries '
+        'WHERE manager = ? AND dir = ? AND parent = ? ORDER BY name', (manager, dir_type, path))]
+
+# Sort keys of query_dir: directories have no size and sort first by size
+# Ключи сортировки query_dir: у директорий нет размера, по размеру они идут первыми
+SORT_KEYS = {'name': 'name', 'mtime': 'mtime_ns', 'size': 'COALESCE(size, -1)'}
+
+def query_dir(manager, dir_type, path, sort='name', descending=False, kind=None, after=None, limit=None,
+              dimensions=False):
+    """
+    Get one page of a directory listing from the index / Получить одну страницу содержимого директории из индекса
+
+    Keyset pagination: a page starts right after the (sort value, name) of the previous page's last row,
+    so pages stay consistent while the directory changes and cost does not grow with the page number.
+    Постраничность по ключу: страница начинается сразу после (значение сортировки, имя) последней строки
+    предыдущей страницы, поэтому страницы согласованы при изменении директории, а цена не растёт с номером страницы.
+    Hidden service files (.ads.json...) are not listed. / Скрытые служебные файлы (.ads.json...) не выводятся.
+
+    Args:
+        manager (str): Manager name / Имя менеджера
+        dir_type (str): photo_cache or ready_photos / photo_cache или ready_photos
+        path (str): Relative directory path / Относительный путь директории
+        sort (str): name, mtime or size / name, mtime или size
+        descending (bool): Reverse order / Обратный порядок
+        kind (str): 'dir', 'file' or None for both / 'dir', 'file' или None для обоих
+        after (list): [sort value, name] of the last row of the previous page / [значение сортировки, имя] последней строки предыдущей страницы
+        limit (int): Page size, None for all / Размер страницы, None для всех
+        dimensions (bool): Read missing image dimensions of the page / Прочитать недостающие размеры изображений страницы
+
+    Returns:
+        tuple: (rows, total rows, [sort value, name] to continue after or None)
+               (строки, всего строк, [значение сортировки, имя] для продолжения или None)
+    """
+    if not _is_fresh(manager, dir_type, path):
+        refresh_dir(manager, dir_type, path)
+    key = SORT_KEYS[sort]
+    where = "manager = ? AND dir = ? AND parent = ? AND name NOT LIKE '.%'"
+    args = [manager, dir_type, path]
+    if kind is not None:
+        where += ' AND is_dir = ?'
+        args.append(int(kind == 'dir'))
+    total = _conn().execute(f'SELECT COUNT(*) FROM entries WHERE {where}', args).fetchone()[0]
+
+    if after is not None:
+        op = '<' if descending else '>'
+        where += f' AND ({key} {op} ? OR ({key} = ? AND name {op} ?))'
+        args += [after[0], after[0], after[1]]
+    direction = 'DESC' if descending else 'ASC'
+    sql = (f'SELECT name, path, is_dir, size, mtime_ns, width, height, {key} AS sort_value FROM entries '
+           f'WHERE {where} ORDER BY {key} {direction}, name {direction}')
+    if limit is not None:
+        # One extra row tells whether there is a next page / Одна лишняя строка показывает, есть ли следующая страница
+        sql += ' LIMIT ?'
+        args.append(limit + 1)
+    rows = [dict(row) for row in _conn().execute(sql, args)]
+
+    next_after = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_after = [rows[-1]['sort_value'], rows[-1]['name']]
+    for row in rows:
+        del row['sort_value']
+    if dimensions:
+        _fill_dimensions(manager, dir_type, rows)
+    return rows, total, next_after
+
+def encode_cursor(after):
+    """Opaque cursor string of a query_dir position / Непрозрачная строка курсора позиции query_dir"""
+    return base64.urlsafe_b64encode(json.dumps(after, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Decode cursor string / Декодировать строку курсора
+
+    Raises:
+        ValueError: Malformed cursor / Некорректный курсор
+    """
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(after, list) or len(after) != 2 or not isinstance(after[1], str):
+        raise ValueError('Invalid cursor')
+    return after
+
+def indexed_managers():
+    """
+    Get manager names from the index / Получить имена менеджеров из индекса
+
+    Returns:
+        list: Manager names / Имена менеджеров
+    """
+    return [row['name'] for row in list_dir() if row['is_dir']]
+
+def index_key(full_path):
+    """
+    Get index key of a path inside data/managers / Получить ключ индекса пути внутри data/managers
+
+    Args:
+        full_path (str): Filesystem path / Путь файловой системы
+
+    Returns:
+        tuple or None: (manager, dir, path) or None if the path isn't indexed / (manager, dir, path) или None если путь не индексируется
+    """
+    rel = os.path.relpath(os.path.abspath(full_path), os.path.abspath(MANAGERS_DIR))
+    parts = [] if rel == '.' else rel.split(os.sep)
+    if not parts:
+        return '', '', ''
+    if parts[0] == '..' or len(parts) < 2 or parts[1] not in INDEXED_DIRS:
+        return None
+    return parts[0], parts[1], '/'.join(parts[2:])
+
+def refresh_path(full_path, recursive=False):
+    """
+    Refresh a directory by filesystem path, nothing if it isn't indexed / Обновить директорию по пути файловой системы, ничего если она не индексируется
+
+    Args:
+        full_path (str): Directory path / Путь директории
+        recursive (bool): Also refresh subdirectories / Также обновить поддиректории
+    """
+    key = index_key(full_path)
+    if key is not None:
+        refresh_dir(*key, recursive=recursive)
+
+def children(full_path):
+    """
+    List a directory by filesystem path, from the index when it is inside data/managers
+    Получить содержимое директории по пути файловой системы, из индекса если она внутри data/managers
+
+    Args:
+        full_path (str): Directory path / Путь директории
+
+    Returns:
+        list: (name, full path, is_dir) ordered by name / (имя, полный путь, is_dir) по имени
+    """
+    key = index_key(full_path)
+    if key is not None:
+        return [(row['name'], os.path.join(full_path, row['name']), bool(row['is_dir'])) for row in list_dir(*key)]
+    with os.scandir(full_path) as entries:
+        return sorted((entry.name, entry.path, entry.is_dir()) for entry in entries)
+
+def rebuild_fs_index():
+    """
+    Re-read the whole data/managers tree into the index / Перечитать всё дерево data/managers в индекс
+
+    Returns:
+        int: Number of indexed entries / Число записей в индексе
+    """
+    start = time.time()
+    remove_tree('', '', '')
+    refresh_dir(recursive=True)
+    total = _conn().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+    log_message(f"🗂️ Индекс файлов перестроен: {total} записей за {time.time() - start:.1f} сек")
+    return total
+
+# ===== INOTIFY WATCHER / НАБЛЮДАТЕЛЬ INOTIFY =====
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length / wd, маска, cookie, длина имени
+
+class FsWatcher:
+    """
+    inotify watcher that refreshes changed directories / Наблюдатель inotify, обновляющий изменённые директории
+
+    Watches the managers directory, manager directories, photo_cache trees and ready_photos roots.
+    Ads inside generations are not watched: they change only by publishing, which refreshes the index.
+    Наблюдает директорию менеджеров, директории менеджеров, деревья photo_cache и корни ready_photos.
+    Объявления внутри поколений не наблюдаются: они меняются только публикацией, которая обновляет индекс.
+    """
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}  # wd -> (manager, dir, path) / wd -> (manager, dir, path)
+        self.thread = None
+
+    def _add_watch(self, key, recursive):
+        """Watch one directory, and its subdirectories if recursive / Наблюдать одну директорию и её поддиректории при recursive"""
+        full_path = _full_path(*key) if key[0] or not key[1] else os.path.join(MANAGERS_DIR, key[2])
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(full_path), WATCH_MASK)
+        if wd < 0:
+            log_message(f"⚠️ Не удалось наблюдать {full_path}: {os.strerror(ctypes.get_errno())}")
+            return
+        self.watches[wd] = key
+        if not recursive:
+            return
+        for name, child_path, is_dir in children(full_path) if key[0] else ():
+            if is_dir:
+                self._add_watch((key[0], key[1], _child_path(key[2], name)), True)
+
+    def _watch_manager(self, name):
+        """Watch a manager directory and its indexed trees / Наблюдать директорию менеджера и её индексируемые деревья"""
+        # ('', 'manager', name) marks the manager directory itself / ('', 'manager', name) обозначает саму директорию менеджера
+        self._add_watch(('', 'manager', name), False)
+        self._add_watch((name, 'photo_cache', ''), True)
+        self._add_watch((name, 'ready_photos', ''), False)
+
+    def start(self):
+        """Add watches and start reading events / Добавить наблюдения и начать чтение событий"""
+        self._add_watch(('', '', ''), False)
+        for name in indexed_managers():
+            self._watch_manager(name)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        log_message(f"👀 Наблюдатель файлов запущен: {len(self.watches)} директорий")
+
+    def _run(self):
+        """Read events, refresh changed directories after a short pause / Читать события, обновлять изменённые директории после короткой паузы"""
+        while True:
+            try:
+                changed = self._read_events()
+                # Gather the burst of an upload or a copy / Собираем пачку событий загрузки или копирования
+                time.sleep(WATCHER_DEBOUNCE)
+                changed |= self._read_events(block=False)
+                for key in changed:
+                    refresh_dir(*key)
+            except Exception as e:
+                log_message(f"⚠️ Ошибка наблюдателя файлов: {e}")
+                time.sleep(WATCHER_DEBOUNCE)
+
+    def _read_events(self, block=True):
+        """Read pending events, return keys of changed directories / Прочитать события, вернуть ключи изменённых директорий"""
+        if not block:
+            if not select.select([self.fd], [], [], 0)[0]:
+                return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += EVENT_HEADER.size + length
+            key = self.watches.get(wd)
+            if key is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            created_dir = mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO)
+            if key[1] == 'manager':
+                # Only new indexed directories matter inside a manager / Внутри менеджера важны только новые индексируемые директории
+                if created_dir and name in INDEXED_DIRS:
+                    self._add_watch((key[2], name, ''), name == 'photo_cache')
+                    changed.add((key[2], name, ''))
+                continue
+            changed.add(key)
+            if created_dir:
+                if key == ('', '', ''):
+                    self._watch_manager(name)
+                elif key[1] == 'photo_cache':
+                    self._add_watch((key[0], key[1], _child_path(key[2], name)), True)
+        return changed
+
+def start_fs_watcher():
+    """
+    Start inotify watcher if enabled and supported / Запустить наблюдатель inotify, если он включён и поддерживается
+
+    Returns:
+        FsWatcher or None: Running watcher / Запущенный наблюдатель
+    """
+    if not USE_FS_WATCHER:
+        return None
+    try:
+        watcher = FsWatcher()
+        watcher.start()
+        return watcher
+    except (OSError, AttributeError) as e:
+        # No inotify outside Linux: directory mtimes still catch out-of-band changes
+        # Нет inotify вне Linux: mtime директорий всё равно ловят изменения в обход сервера
+        log_message(f"⚠️ Наблюдатель файлов недоступен: {e}")
+        return None
@@ -0,0 +1,349 @@
+# filename="generations.py"
+# server/modules/generations.py
+# Ready Photos Generations Module / Модуль поколений готовых фотографий
+
+"""
+Ready Photos Generations Module / Модуль поколений готовых фотографий
+
+This module publishes regenerated categories atomically. A job renders into a new generation
+directory, and ready_photos/<folder> is a symlink that is swapped to it only when the job is done.
+Данный модуль атомарно публикует перегенерированные категории. Задача отрисовывает в новую
+директорию поколения, а ready_photos/<folder> - это символическая ссылка, которая переключается
+на неё только после завершения задачи.
+
+Layout / Структура:
+- <manager>/ready_generations/<folder>/<generation> - generation directories / директории поколений
+- <manager>/ready_photos/<folder> -> ../ready_generations/<folder>/<generation> - relative symlink / относительная ссылка
+
+Replaced generations keep being served for old URLs for GRACE_PERIOD seconds, then are removed.
+Заменённые поколения продолжают раздаваться по старым URL GRACE_PERIOD секунд, затем удаляются.
+Unpublished generations of interrupted jobs are kept STAGING_TTL seconds for resume.
+Неопубликованные поколения прерванных задач хранятся STAGING_TTL секунд для продолжения.
+Only one job builds a category at a time (CategoryLock).
+Категорию одновременно собирает только одна задача (CategoryLock).
+"""
+
+import os
+import shutil
+import time
+import threading
+from modules.utils import log_message
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: lock only within the process / Windows: блокировка только внутри процесса
+    fcntl = None
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+GENERATIONS_DIR_NAME = 'ready_generations'  # Generations directory next to ready_photos / Директория поколений рядом с ready_photos
+GRACE_PERIOD = 60 * 60  # Seconds a replaced generation is kept / Секунд хранения заменённого поколения
+STAGING_TTL = 24 * 60 * 60  # Seconds an unpublished generation is kept for resume / Секунд хранения неопубликованного поколения для продолжения
+LOCK_FILE_NAME = '.lock'  # Build lock file in generations directory / Файл блокировки сборки в директории поколений
+PUBLISHED_MARKER = '.published'  # File in a generation, its mtime is the publish time / Файл в поколении, его mtime - время публикации
+
+# Per-category locks of this process / Блокировки категорий этого процесса
+_category_locks = {}
+_category_locks_guard = threading.Lock()
+
+def generations_dir(manager_dir, folder_name):
+    """Get directory with generations of a category / Получить директорию поколений категории"""
+    return os.path.join(manager_dir, GENERATIONS_DIR_NAME, folder_name)
+
+def category_link(manager_dir, folder_name):
+    """Get published path of a category / Получить публикуемый путь категории"""
+    return os.path.join(manager_dir, 'ready_photos', folder_name)
+
+def current_generation(manager_dir, folder_name):
+    """
+    Get directory of published generation / Получить директорию опубликованного поколения
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        folder_name (str): Category folder name / Имя папки категории
+
+    Returns:
+        str or None: Real directory path or None if category isn't published / Реальный путь директории или None если категория не опубликована
+    """
+    link = category_link(manager_dir, folder_name)
+    if not os.path.isdir(link):
+        return None
+    return os.path.realpath(link)
+
+def _list_generations(manager_dir, folder_name):
+    """Generation names, oldest first / Имена поколений, старые первыми"""
+    gens_dir = generations_dir(manager_dir, folder_name)
+    if not os.path.isdir(gens_dir):
+        return []
+    return sorted((name for name in os.listdir(gens_dir) if name.isdigit()), key=int)
+
+def pending_generations(manager_dir, folder_name):
+    """
+    Get unpublished generations, newest first / Получить неопубликованные поколения, новые первыми
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        folder_name (str): Category folder name / Имя папки категории
+
+    Returns:
+        list: Directories of generations newer than the published one / Директории поколений новее опубликованного
+    """
+    current = current_generation(manager_dir, folder_name)
+    current_name = os.path.basename(current) if current else None
+    names = _list_generations(manager_dir, folder_name)
+    if current_name in names:
+        names = names[names.index(current_name) + 1:]
+    return [os.path.join(generations_dir(manager_dir, folder_name), name) for name in reversed(names)]
+
+class CategoryLock:
+    """
+    Lock held by the job that builds a category / Блокировка, которую держит задача, собирающая категорию
+
+    A thread lock serializes jobs of this process, a flock on a file in the generations
+    directory serializes the server with other processes.
+    Блокировка потоков упорядочивает задачи этого процесса, flock на файле в директории
+    поколений упорядочивает сервер с другими процессами.
+    """
+
+    def __init__(self, manager_dir, folder_name):
+        """
+        Args:
+            manager_dir (str): Manager directory / Директория менеджера
+            folder_name (str): Category folder name / Имя папки категории
+        """
+        self.folder_name = folder_name
+        self.path = os.path.join(generations_dir(manager_dir, folder_name), LOCK_FILE_NAME)
+        key = os.path.realpath(self.path)
+        with _category_locks_guard:
+            self.thread_lock = _category_locks.setdefault(key, threading.Lock())
+        self.file = None
+
+    def acquire(self):
+        """Wait until no other job builds the category / Дождаться, пока категорию не собирает другая задача"""
+        if not self.thread_lock.acquire(blocking=False):
+            log_message(f"⏳ Категория {self.folder_name} уже собирается другой задачей, ожидание")
+            self.thread_lock.acquire()
+        if fcntl is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, 'a')
+            try:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                log_message(f"⏳ Категория {self.folder_name} уже собирается другим процессом, ожидание")
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+        except Exception:
+            self.release()
+            raise
+
+    def release(self):
+        """Let the next job build the category / Позволить следующей задаче собирать категорию"""
+        if self.file is not None:
+            # Closing the file drops the flock / Закрытие файла снимает flock
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+def begin_generation(manager_dir, folder_name):
+    """
+    Create staging directory for a new generation / Создать промежуточную директорию для нового поколения
+
+    The caller holds CategoryLock of the category until the generation is published or discarded.
+    Вызывающий держит CategoryLock категории, пока поколение не опубликовано или не удалено.
+
+    A category in the old layout (plain directory) is first moved into generations.
+    Категория в старой структуре (обычная директория) сначала переносится в поколения.
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        folder_name (str): Category folder name / Имя папки категории
+
+    Returns:
+        str: Staging directory path / Путь промежуточной директории
+    """
+    gens_dir = generations_dir(manager_dir, folder_name)
+    os.makedirs(gens_dir, exist_ok=True)
+
+    link = category_link(manager_dir, folder_name)
+    if os.path.isdir(link) and not os.path.islink(link):
+        # Old layout: turn the directory into the first generation / Старая структура: превращаем директорию в первое поколение
+        legacy = os.path.join(gens_dir, str(time.time_ns()))
+        os.rename(link, legacy)
+        _swap_link(link, legacy)
+        log_message(f"📦 Категория {folder_name} переведена на поколения")
+
+    staging = os.path.join(gens_dir, str(time.time_ns()))
+    os.makedirs(staging)
+    return staging
+
+def _swap_link(link, target):
+    """Atomically point link to target / Атомарно направить ссылку на цель"""
+    os.makedirs(os.path.dirname(link), exist_ok=True)
+    # Relative target keeps the tree movable (manager rename, shared storage) / Относительная цель оставляет дерево переносимым (переименование менеджера, общее хранилище)
+    relative = os.path.relpath(target, os.path.dirname(link))
+    tmp_link = os.path.join(os.path.dirname(target), f".link-{os.getpid()}-{time.time_ns()}")
+    os.symlink(relative, tmp_link)
+    try:
+        # rename over an existing symlink is atomic / rename поверх существующей ссылки атомарен
+        os.replace(tmp_link, link)
+    except OSError:
+        os.remove(tmp_link)
+        raise
+
+def publish_generation(manager_dir, folder_name, staging):
+    """
+    Publish staging directory as the current generation / Опубликовать промежуточную директорию как текущее поколение
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        folder_name (str): Category folder name / Имя папки категории
+        staging (str): Directory from begin_generation / Директория из begin_generation
+    """
+    # The grace period of the replaced generation counts from now / Период ожидания заменяемого поколения отсчитывается от этого момента
+    with open(os.path.join(staging, PUBLISHED_MARKER), 'w'):
+        pass
+    _swap_link(category_link(manager_dir, folder_name), staging)
+    log_message(f"🔀 Опубликовано новое поколение категории {folder_name}")
+    collect_generations(manager_dir, folder_name)
+
+def discard_generation(staging):
+    """
+    Remove unpublished staging directory / Удалить неопубликованную промежуточную директорию
+
+    Args:
+        staging (str): Directory from begin_generation / Директория из begin_generation
+    """
+    shutil.rmtree(staging, ignore_errors=True)
+
+def collect_generations(manager_dir, folder_name, grace_period=GRACE_PERIOD):
+    """
+    Remove replaced generations older than the grace period / Удалить заменённые поколения старше периода ожидания
+
+    A generation is replaced when the next one is published, so its age counts from the publish
+    time of the next one (the name, when it was published without a marker).
+    Unpublished generations are removed after STAGING_TTL.
+    Поколение заменено, когда опубликовано следующее, поэтому его возраст считается от времени
+    публикации следующего (от имени, если оно опубликовано без отметки).
+    Неопубликованные поколения удаляются через STAGING_TTL.
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        folder_name (str): Category folder name / Имя папки категории
+        grace_period (int): Seconds to keep replaced generations / Секунд хранения заменённых поколений
+
+    Returns:
+        int: Number of removed generations / Число удалённых поколений
+    """
+    now_ns = time.time_ns()
+    removed = 0
+    gens_dir = generations_dir(manager_dir, folder_name)
+
+    # Unpublished generations left by interrupted jobs / Неопубликованные поколения прерванных задач
+    for staging in pending_generations(manager_dir, folder_name):
+        if (now_ns - int(os.path.basename(staging))) / 1e9 > STAGING_TTL:
+            shutil.rmtree(staging, ignore_errors=True)
+            removed += 1
+
+    current = current_generation(manager_dir, folder_name)
+    if current is None:
+        return removed
+    current_name = os.path.basename(current)
+    names = _list_generations(manager_dir, folder_name)
+    if current_name not in names:
+        return removed
+
+    # Only generations before the current one; newer ones may be staging of a running job
+    # Только поколения до текущего; более новые могут быть промежуточными директориями выполняемой задачи
+    older = names[:names.index(current_name)]
+    for name, next_name in zip(older, older[1:] + [current_name]):
+        if (now_ns - _published_ns(gens_dir, next_name)) / 1e9 > grace_period:
+            shutil.rmtree(os.path.join(gens_dir, name), ignore_errors=True)
+            removed += 1
+    return removed
+
+def _published_ns(gens_dir, name):
+    """Publish time of a generation, its creation time without a marker / Время публикации поколения, время создания без отметки"""
+    try:
+        return os.stat(os.path.join(gens_dir, name, PUBLISHED_MARKER)).st_mtime_ns
+    except OSError:
+        return int(name)
+
+def collect_all_generations(managers_dir):
+    """
+    Run garbage collection for all managers and categories / Выполнить сборку мусора для всех менеджеров и категорий
+
+    Args:
+        managers_dir (str): data/managers directory / Директория data/managers
+
+    Returns:
+        int: Number of removed generations / Число удалённых поколений
+    """
+    removed = 0
+    if not os.path.isdir(managers_dir):
+        return removed
+    for manager in os.listdir(managers_dir):
+        manager_dir = os.path.join(managers_dir, manager)
+        gens_root = os.path.join(manager_dir, GENERATIONS_DIR_NAME)
+        if not os.path.isdir(gens_root):
+            continue
+        for folder_name in os.listdir(gens_root):
+            removed += collect_generations(manager_dir, folder_name)
+    return removed
+
+def resolve_ready_dir(manager_dir, path, exists=os.path.isfile):
+    """
+    Find directory that serves a ready_photos path, including replaced generations
+    Найти директорию, раздающую путь ready_photos, включая заменённые поколения
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        path (str): Path under ready_photos (<folder>/<ad>/<file>) / Путь внутри ready_photos (<folder>/<ad>/<file>)
+        exists (callable): Check that a generation serves the file / Проверка, что поколение раздаёт файл
+
+    Returns:
+        tuple: (base directory, path under it) for send_from_directory / (базовая директория, путь внутри неё) для send_from_directory
+    """
+    ready_dir = os.path.join(manager_dir, 'ready_photos')
+    parts = path.split('/', 1)
+    if exists(os.path.join(ready_dir, path)) or len(parts) < 2:
+        return ready_dir, path
+
+    # Old URL of a replaced generation within grace period / Старый URL заменённого поколения в пределах периода ожидания
+    folder_name, rest = parts
+    if folder_name in ('', '.', '..'):
+        return ready_dir, path
+    current = current_generation(manager_dir, folder_name)
+    names = _list_generations(manager_dir, folder_name)
+    if current is None or os.path.basename(current) not in names:
+        return ready_dir, path
+    # Newer generations are staging of a running job and are never served
+    # Более новые поколения - промежуточные директории выполняемой задачи и никогда не раздаются
+    names = names[:names.index(os.path.basename(current)) + 1]
+    for name in reversed(names):
+        gen_dir = os.path.join(generations_dir(manager_dir, folder_name), name)
+        if exists(os.path.join(gen_dir, rest)):
+            return gen_dir, rest
+    return ready_dir, path
+
+def delete_category(manager_dir, folder_name):
+    """
+    Remove published category with all its generations / Удалить опубликованную категорию со всеми её поколениями
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        folder_name (str): Category folder name / Имя папки категории
+    """
+    link = category_link(manager_dir, folder_name)
+    if os.path.islink(link):
+        os.remove(link)
+    elif os.path.isdir(link):
+        shutil.rmtree(link)
+    shutil.rmtree(generations_dir(manager_dir, folder_name), ignore_errors=True)
@@ -22,6 +22,15 @@ ALTERNATIVE_CROP_SCALE_RANGE = (0.9, 1.0)  # Alternative crop scale when rotatio
 BRIGHTNESS_RANGE = (0.9, 1.1)  # Image brightness variation range / Диапазон изменения яркости изображения
 CONTRAST_RANGE = (0.9, 1.1)  # Image contrast variation range / Диапазон изменения контраста изображения
 SATURATION_RANGE = (0.9, 1.1)  # Image saturation variation range / Диапазон изменения насыщенности изображения
+ROTATION_SAFETY_SCALE = 0.95  # Extra crop after rotation to hide borders / Дополнительная обрезка после поворота для скрытия границ
+
+# ===== GEOMETRY ENGINE SETTINGS / НАСТРОЙКИ ГЕОМЕТРИЧЕСКОГО ДВИЖКА =====
+USE_FUSED_TRANSFORM = True  # Single affine resample instead of crop/rotate/resize chain / Одна аффинная передискретизация вместо цепочки обрезка/поворот/масштаб
+FUSED_RESAMPLE = Image.BICUBIC  # Resampling filter for fused transform / Фильтр передискретизации для объединённого преобразования
+
+# ===== COLOR ENGINE SETTINGS / НАСТРОЙКИ ЦВЕТОВОГО ДВИЖКА =====
+USE_COLOR_MATRIX = True  # LUT + color matrix instead of ImageEnhance/NumPy chain / LUT + цветовая матрица вместо цепочки ImageEnhance/NumPy
+USE_ROI_COMPOSITING = True  # Blend logo only inside its bounding box / Смешивать логотип только в его области
 
 # ===== LOGO UNIQUIFICATION PARAMETERS / ПАРАМЕТРЫ УНИКАЛИЗАЦИИ ЛОГОТИПА =====
 LOGO_BRIGHTNESS_RANGE = (0.97, 1.03)  # Logo brightness variation range / Диапазон изменения яркости логотипа
@@ -30,20 +39,57 @@ LOGO_SATURATION_RANGE = (0.97, 1.03)  # Logo saturation variation range / Диа
 LOGO_ALPHA_RANGE = (0.8, 1.0)  # Logo transparency variation range / Диапазон изменения прозрачности логотипа
 
 # ===== OUTPUT QUALITY SETTINGS / НАСТРОЙКИ КАЧЕСТВА ВЫВОДА =====
+MAX_WORKING_SIZE = None  # Max long side of working and output image in px, None keeps original size (e.g. 1600 to speed up large photos) / Максимальная длинная сторона рабочего и выходного изображения в px, None сохраняет исходный размер (например, 1600 для ускорения больших фото)
 JPEG_QUALITY = 80  # JPEG compression quality (0-100) / Качество JPEG сжатия (0-100)
 JPEG_SUBSAMPLING = 2  # JPEG chroma subsampling / Субдискретизация цветности JPEG
 
-def load_image(path):
+def working_size(size, max_size):
+    """
+    Get image size limited by max long side / Получить размер изображения с ограничением длинной стороны
+    
+    Args:
+        size (tuple): Image size (w, h) / Размер изображения (w, h)
+        max_size (int or None): Max long side in px / Максимальная длинная сторона в px
+    
+    Returns:
+        tuple: Size (w, h) with the same aspect ratio / Размер (w, h) с тем же соотношением сторон
+    """
+    w, h = size
+    if not max_size or max(w, h) <= max_size:
+        return w, h
+    scale = max_size / max(w, h)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+def load_image(path, max_size=None):
     """
     Load image and convert to RGB / Загрузить изображение и конвертировать в RGB
     
     Args:
         path (str): Path to image file / Путь к файлу изображения
+        max_size (int or None): Max long side of working size / Максимальная длинная сторона рабочего размера
     
     Returns:
         Image: PIL Image object in RGB mode / Объект изображения PIL в режиме RGB
+    
+    With max_size, JPEGs are decoded at the nearest DCT scale (Image.draft) and other
+    formats are shrunk with Image.reduce. The result is at least the working size and
+    less than twice it; the exact size is reached later in the pipeline.
+    С max_size JPEG декодируются в ближайшем масштабе DCT (Image.draft), а другие
+    форматы уменьшаются через Image.reduce. Результат не меньше рабочего размера и
+    меньше его удвоенного значения; точный размер достигается дальше в пайплайне.
     """
-    return Image.open(path).convert("RGB")
+    with Image.open(path) as src:
+        target = working_size(src.size, max_size)
+        if target != src.size:
+            # Decode JPEG at 1/2, 1/4 or 1/8 scale / Декодировать JPEG в масштабе 1/2, 1/4 или 1/8
+            src.draft("RGB", target)
+        im = src.convert("RGB")
+    
+    # Integer box reduction down to [target, 2 * target) / Целочисленное уменьшение до [target, 2 * target)
+    factor = min(im.size[0] // target[0], im.size[1] // target[1])
+    if factor > 1:
+        im = im.reduce(factor)
+    return im
 
 def load_logo(path):
     """
@@ -126,7 +172,7 @@ def random_rotate_no_borders(im, max_deg):
     new_h = int(h * cos_a - w * sin_a)
     
     # Apply safety scale factor / Применить коэффициент безопасности
-    scale_factor = 0.95
+    scale_factor = ROTATION_SAFETY_SCALE
     new_w = int(new_w * scale_factor)
     new_h = int(new_h * scale_factor)
     
@@ -138,6 +184,117 @@ def random_rotate_no_borders(im, max_deg):
     # Resize back to original size / Изменить размер обратно до исходного
     return cropped.resize((w, h), Image.LANCZOS)
 
+def crop_matrix(w, h, scale_min, scale_max):
+    """
+    Build affine matrix equivalent to random_crop / Построить аффинную матрицу, эквивалентную random_crop
+    
+    Args:
+        w (int): Image width / Ширина изображения
+        h (int): Image height / Высота изображения
+        scale_min (float): Minimum scale factor / Минимальный масштабный коэффициент
+        scale_max (float): Maximum scale factor / Максимальный масштабный коэффициент
+    
+    Returns:
+        ndarray: 3x3 matrix mapping output coordinates to input coordinates / Матрица 3x3, отображающая выходные координаты во входные
+    """
+    scale = random.uniform(scale_min, scale_max)
+    new_w = int(w * scale)
+    new_h = int(h * scale)
+    
+    # Same early exit as random_crop / Тот же ранний выход, что и в random_crop
+    if new_w == w and new_h == h:
+        return np.identity(3)
+    
+    left = random.randint(0, w - new_w)
+    top = random.randint(0, h - new_h)
+    
+    # Output pixel -> crop box coordinates / Выходной пиксель -> координаты области обрезки
+    return np.array([
+        [new_w / w, 0.0, left],
+        [0.0, new_h / h, top],
+        [0.0, 0.0, 1.0],
+    ])
+
+def rotation_matrix(w, h, max_deg):
+    """
+    Build affine matrix equivalent to random_rotate_no_borders / Построить аффинную матрицу, эквивалентную random_rotate_no_borders
+    
+    Args:
+        w (int): Image width / Ширина изображения
+        h (int): Image height / Высота изображения
+        max_deg (float): Maximum rotation angle in degrees / Максимальный угол поворота в градусах
+    
+    Returns:
+        ndarray: 3x3 matrix mapping output coordinates to input coordinates / Матрица 3x3, отображающая выходные координаты во входные
+    
+    Rotation, border-safe center crop and resize back to (w, h) are folded into one matrix.
+    Поворот, безопасная обрезка по центру и масштабирование обратно до (w, h) объединены в одну матрицу.
+    """
+    angle = random.uniform(-max_deg, max_deg)
+    
+    # Border-safe crop size, same formula as random_rotate_no_borders / Безопасный размер обрезки, та же формула что в random_rotate_no_borders
+    angle_rad = abs(angle) * math.pi / 180.0
+    cos_a = math.cos(angle_rad)
+    sin_a = math.sin(angle_rad)
+    crop_w = max(1, int(int(w * cos_a - h * sin_a) * ROTATION_SAFETY_SCALE))
+    crop_h = max(1, int(int(h * cos_a - w * sin_a) * ROTATION_SAFETY_SCALE))
+    
+    # Inverse rotation as used by Image.rotate / Обратный поворот, как в Image.rotate
+    t = -math.radians(angle)
+    cos_t = math.cos(t)
+    sin_t = math.sin(t)
+    
+    # Output -> centered crop -> rotated frame -> input / Выход -> центральная обрезка -> повёрнутый кадр -> вход
+    scale = np.array([
+        [crop_w / w, 0.0, -crop_w / 2],
+        [0.0, crop_h / h, -crop_h / 2],
+        [0.0, 0.0, 1.0],
+    ])
+    rotate = np.array([
+        [cos_t, sin_t, w / 2],
+        [-sin_t, cos_t, h / 2],
+        [0.0, 0.0, 1.0],
+    ])
+    return rotate @ scale
+
+def fused_crop_rotate(im, use_rotation, size=None):
+    """
+    Apply crop and rotation (or second crop) with a single resample / Применить обрезку и поворот (или вторую обрезку) одной передискретизацией
+    
+    Args:
+        im (Image): Input image / Входное изображение
+        use_rotation (bool): Whether to use rotation (if False, uses alternative crop) / Использовать ли поворот (если False, использует альтернативную обрезку)
+        size (tuple): Output size, defaults to input size / Выходной размер, по умолчанию размер входа
+    
+    Returns:
+        Image: Transformed image / Преобразованное изображение
+    
+    Equivalent to random_crop followed by random_rotate_no_borders or random_crop, but
+    the source is resampled once via Image.transform instead of up to three times.
+    Эквивалентно random_crop с последующим random_rotate_no_borders или random_crop, но
+    исходник передискретизируется один раз через Image.transform вместо трёх.
+    """
+    w, h = im.size
+    
+    # Compose stages: source <- first crop <- rotation or second crop <- output
+    # Компонуем этапы: исходник <- первая обрезка <- поворот или вторая обрезка <- выход
+    matrix = crop_matrix(w, h, *CROP_SCALE_RANGE)
+    if use_rotation:
+        matrix = matrix @ rotation_matrix(w, h, MAX_ROT_DEG)
+    else:
+        matrix = matrix @ crop_matrix(w, h, *ALTERNATIVE_CROP_SCALE_RANGE)
+    
+    # Scale to working size in the same resample / Масштабирование до рабочего размера в той же передискретизации
+    size = size or (w, h)
+    matrix = matrix @ np.diag([w / size[0], h / size[1], 1.0])
+    
+    # Nothing to resample / Нечего передискретизировать
+    if np.allclose(matrix, np.identity(3)):
+        return im
+    
+    data = tuple(matrix[:2].flatten())
+    return im.transform(size, Image.AFFINE, data, resample=FUSED_RESAMPLE, fillcolor=(255, 255, 255))
+
 def change_brightness_contrast_saturation(im, b_range, c_range, s_range):
     """
     Randomly adjust brightness, contrast, and saturation / Случайно настроить яркость, контраст и насыщенность
@@ -156,6 +313,9 @@ def change_brightness_contrast_saturation(im, b_range, c_range, s_range):
     c = random.uniform(*c_range)
     s = random.uniform(*s_range)
     
+    if USE_COLOR_MATRIX:
+        return apply_color_matrix(im, b, c, s)
+    
     # Apply brightness and contrast / Применить яркость и контраст
     im = ImageEnhance.Brightness(im).enhance(b)
     im = ImageEnhance.Contrast(im).enhance(c)
@@ -168,6 +328,57 @@ def change_brightness_contrast_saturation(im, b_range, c_range, s_range):
     
     return Image.fromarray(arr)
 
+def apply_color_matrix(im, b, c, s):
+    """
+    Apply brightness, contrast and saturation in two uint8 passes / Применить яркость, контраст и насыщенность за два прохода в uint8
+    
+    Args:
+        im (Image): Input image in RGB mode / Входное изображение в режиме RGB
+        b (float): Brightness factor / Коэффициент яркости
+        c (float): Contrast factor / Коэффициент контраста
+        s (float): Saturation factor / Коэффициент насыщенности
+    
+    Returns:
+        Image: Modified image / Модифицированное изображение
+    
+    Brightness and contrast become one per-channel LUT with the same truncation as the
+    ImageEnhance chain, saturation is a 3x3 color matrix that truncates like the NumPy step.
+    Output stays within 1 level per channel of the old chain (float rounding of the mean).
+    Яркость и контраст становятся одной поканальной LUT с тем же отбрасыванием дробной части,
+    что и цепочка ImageEnhance, насыщенность - матрица 3x3, отбрасывающая дробь как шаг NumPy.
+    Результат отличается от старой цепочки не более чем на 1 уровень на канал (округление среднего).
+    """
+    # Per-channel histograms, no pixel copy / Поканальные гистограммы без копирования пикселей
+    hist = im.histogram()
+    pixels = im.size[0] * im.size[1]
+    if pixels == 0:
+        return im
+    
+    # Brightness LUT, same rounding as ImageEnhance.Brightness / LUT яркости, то же округление что в ImageEnhance.Brightness
+    bright = [min(255, int(v * b)) for v in range(256)]
+    
+    # Luma mean of the brightened image, as ImageEnhance.Contrast computes it
+    # Средняя яркость осветлённого изображения, как её считает ImageEnhance.Contrast
+    channel_means = [
+        sum(hist[band * 256 + v] * bright[v] for v in range(256)) / pixels
+        for band in range(3)
+    ]
+    mean = int(channel_means[0] * 0.299 + channel_means[1] * 0.587 + channel_means[2] * 0.114 + 0.5)
+    
+    # Contrast on top of brightness, truncated and clipped like Image.blend
+    # Контраст поверх яркости, с отбрасыванием дроби и обрезкой как в Image.blend
+    lut = [max(0, min(255, int(mean + c * (bright[v] - mean)))) for v in range(256)]
+    im = im.point(lut * 3)
+    
+    # Saturation matrix: gray + (x - gray) * s with gray = (R + G + B) / 3
+    # Матрица насыщенности: gray + (x - gray) * s, где gray = (R + G + B) / 3
+    off = (1 - s) / 3
+    sat = [[s + off if i == j else off for j in range(3)] for i in range(3)]
+    # Image.convert rounds (adds 0.5), the offset turns it into truncation like astype(np.uint8)
+    # Image.convert округляет (прибавляет 0.5), смещение превращает это в отбрасывание дроби как astype(np.uint8)
+    matrix = tuple(v for row in sat for v in (row[0], row[1], row[2], -0.5))
+    return im.convert("RGB", matrix)
+
 def unique_logo(logo_rgba, b_range, c_range, s_range, alpha_range):
     """
     Create a unique variant of the logo / Создать уникальный вариант логотипа
@@ -201,6 +412,25 @@ def unique_logo(logo_rgba, b_range, c_range, s_range, alpha_range):
     # Merge back to RGBA / Объединить обратно в RGBA
     return Image.merge("RGBA", (*rgb.split(), alpha))
 
+def logo_variant(logo_rgba, b, c, s, alpha_factor):
+    """
+    Create a logo variant with given factors / Создать вариант логотипа с заданными коэффициентами
+    
+    Args:
+        logo_rgba (Image): Logo image in RGBA mode / Изображение логотипа в режиме RGBA
+        b (float): Brightness factor / Коэффициент яркости
+        c (float): Contrast factor / Коэффициент контраста
+        s (float): Saturation factor / Коэффициент насыщенности
+        alpha_factor (float): Transparency factor / Коэффициент прозрачности
+    
+    Returns:
+        Image: Logo variant in RGBA mode / Вариант логотипа в режиме RGBA
+    """
+    r, g, bl, alpha = logo_rgba.split()
+    rgb = apply_color_matrix(Image.merge("RGB", (r, g, bl)), b, c, s)
+    alpha = alpha.point(lambda v: min(255, int(v * alpha_factor)))
+    return Image.merge("RGBA", (*rgb.split(), alpha))
+
 def apply_logo_to_image(im_rgb, logo_rgba):
     """
     Apply logo watermark to image (bottom-right corner) / Применить водяной знак логотипа к изображению (правый нижний угол)
@@ -211,6 +441,9 @@ def apply_logo_to_image(im_rgb, logo_rgba):
     
     Returns:
         Image: Image with logo applied / Изображение с примененным логотипом
+    
+    With USE_ROI_COMPOSITING the logo is blended into im_rgb in place.
+    При USE_ROI_COMPOSITING логотип смешивается с im_rgb на месте.
     """
     if logo_rgba is None:
         return im_rgb
@@ -227,13 +460,41 @@ def apply_logo_to_image(im_rgb, logo_rgba):
     if pos_y < 0:
         pos_y = 0
     
+    # Premultiplied logos need straight alpha / Премультиплицированным логотипам нужна прямая альфа
+    if logo_rgba.mode == "RGBa":
+        logo_rgba = logo_rgba.convert("RGBA")
+    
+    if USE_ROI_COMPOSITING:
+        return composite_logo_roi(im_rgb, logo_rgba, pos_x, pos_y)
+    
     # Paste logo with alpha transparency / Вставить логотип с альфа-прозрачностью
     base = im_rgb.convert("RGBA")
     base.paste(logo_rgba, (pos_x, pos_y), logo_rgba)
     
     return base.convert("RGB")
 
-def uniquify_image(input_path, output_path, logo, use_rotation):
+def composite_logo_roi(im_rgb, logo, pos_x, pos_y):
+    """
+    Alpha-blend logo only inside its bounding box / Смешать логотип по альфе только в его области
+    
+    Args:
+        im_rgb (Image): Base image in RGB mode, modified in place / Базовое изображение в режиме RGB, изменяется на месте
+        logo (Image): Logo in RGBA mode / Логотип в режиме RGBA
+        pos_x (int): Left position of the logo / Левая позиция логотипа
+        pos_y (int): Top position of the logo / Верхняя позиция логотипа
+    
+    Returns:
+        Image: The same image with logo applied / То же изображение с примененным логотипом
+    
+    Image.paste with the logo alpha as mask touches only the logo box of the RGB frame,
+    so no full-frame RGBA copy is made.
+    Image.paste с альфой логотипа в качестве маски затрагивает только область логотипа
+    в RGB кадре, поэтому полная RGBA копия кадра не создаётся.
+    """
+    im_rgb.paste(logo, (pos_x, pos_y), logo)
+    return im_rgb
+
+def uniquify_image(input_path, output_path, logo, use_rotation, logo_variants=None, source=None):
     """
     Apply complete uniquification pipeline to an image / Применить полный пайплайн уникализации к изображению
     
@@ -242,6 +503,8 @@ def uniquify_image(input_path, output_path, logo, use_rotation):
         output_path (str): Path to save output image / Путь для сохранения выходного изображения
         logo (Image): Logo to apply as watermark / Логотип для применения в качестве водяного знака
         use_rotation (bool): Whether to use rotation (if False, uses alternative crop) / Использовать ли поворот (если False, использует альтернативную обрезку)
+        logo_variants (list): Pre-generated logo variants; if given, one is picked instead of calling unique_logo / Заранее созданные варианты логотипа; если заданы, выбирается один вместо вызова unique_logo
+        source (Image): Already decoded source at working size; if given, input_path is not read / Уже декодированный исходник рабочего размера; если задан, input_path не читается
     
     The uniquification process includes / Процесс уникализации включает:
     1. Random crop / Случайная обрезка
@@ -250,23 +513,34 @@ def uniquify_image(input_path, output_path, logo, use_rotation):
     4. Logo watermark with variations / Водяной знак логотипа с вариациями
     5. JPEG compression with quality settings / JPEG сжатие с настройками качества
     """
-    # Load original image / Загрузить исходное изображение
-    im = load_image(input_path)
-    
-    # Apply first crop / Применить первую обрезку
-    im2 = random_crop(im, *CROP_SCALE_RANGE)
+    # Load original image near working size / Загрузить исходное изображение близко к рабочему размеру
+    im = source if source is not None else load_image(input_path, MAX_WORKING_SIZE)
+    size = working_size(im.size, MAX_WORKING_SIZE)
     
-    # Apply rotation or additional crop / Применить поворот или дополнительную обрезку
-    if use_rotation:
-        im2 = random_rotate_no_borders(im2, MAX_ROT_DEG)
+    if USE_FUSED_TRANSFORM:
+        # Crop + rotation/crop + scale in one resample / Обрезка + поворот/обрезка + масштаб за одну передискретизацию
+        im2 = fused_crop_rotate(im, use_rotation, size)
     else:
-        im2 = random_crop(im2, *ALTERNATIVE_CROP_SCALE_RANGE)
+        if im.size != size:
+            im = im.resize(size, Image.LANCZOS)
+        
+        # Apply first crop / Применить первую обрезку
+        im2 = random_crop(im, *CROP_SCALE_RANGE)
+        
+        # Apply rotation or additional crop / Применить поворот или дополнительную обрезку
+        if use_rotation:
+            im2 = random_rotate_no_borders(im2, MAX_ROT_DEG)
+        else:
+            im2 = random_crop(im2, *ALTERNATIVE_CROP_SCALE_RANGE)
     
     # Apply color adjustments / Применить цветовые настройки
     im2 = change_brightness_contrast_saturation(im2, BRIGHTNESS_RANGE, CONTRAST_RANGE, SATURATION_RANGE)
     
-    # Create unique logo variant / Создать уникальный вариант логотипа
-    unique_logo_variant = unique_logo(logo, LOGO_BRIGHTNESS_RANGE, LOGO_CONTRAST_RANGE, LOGO_SATURATION_RANGE, LOGO_ALPHA_RANGE)
+    # Pick or create unique logo variant / Выбрать или создать уникальный вариант логотипа
+    if logo_variants:
+        unique_logo_variant = random.choice(logo_variants)
+    else:
+        unique_logo_variant = unique_logo(logo, LOGO_BRIGHTNESS_RANGE, LOGO_CONTRAST_RANGE, LOGO_SATURATION_RANGE, LOGO_ALPHA_RANGE)
     
     # Apply logo watermark / Применить водяной знак логотипа
     variant_with_logo = apply_logo_to_image(im2, unique_logo_variant)
@@ -0,0 +1,140 @@
+# filename="job_checkpoint.py"
+# server/modules/job_checkpoint.py
+# Uniquification Job Checkpoint Module / Модуль контрольных точек задач уникализации
+
+"""
+Uniquification Job Checkpoint Module / Модуль контрольных точек задач уникализации
+
+This module keeps a manifest of a running job in its staging generation, so a job
+interrupted by a server restart can be resumed instead of rendered from scratch.
+Данный модуль хранит манифест выполняемой задачи в её промежуточном поколении, чтобы
+задачу, прерванную перезапуском сервера, можно было продолжить, а не отрисовывать заново.
+
+Files in the staging directory / Файлы в промежуточной директории:
+- .job_manifest.json - job parameters, seed, stamp, sources and selected file of every ad position
+  параметры задачи, зерно, метка, исходники и выбранный файл каждой позиции объявления
+- .job_completed - indices of finished ads, one per line, appended as ads finish
+  индексы готовых объявлений, по одному на строку, дописываются по мере готовности
+"""
+
+import os
+import json
+from modules.generations import pending_generations
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+MANIFEST_NAME = '.job_manifest.json'  # Manifest file in staging directory / Файл манифеста в промежуточной директории
+COMPLETED_NAME = '.job_completed'  # Finished ad indices file / Файл индексов готовых объявлений
+MANIFEST_VERSION = 1  # Bumped when manifest format changes / Увеличивается при изменении формата манифеста
+FSYNC_EVERY = 50  # Finished ads between fsync of the completed file / Готовых объявлений между fsync файла готовых
+
+def write_manifest(staging, manifest):
+    """
+    Save job manifest atomically / Атомарно сохранить манифест задачи
+
+    Args:
+        staging (str): Staging generation directory / Промежуточная директория поколения
+        manifest (dict): Job parameters / Параметры задачи
+    """
+    path = os.path.join(staging, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(manifest, version=MANIFEST_VERSION), f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_manifest(staging):
+    """
+    Load job manifest and finished ad indices / Загрузить манифест задачи и индексы готовых объявлений
+
+    Args:
+        staging (str): Staging generation directory / Промежуточная директория поколения
+
+    Returns:
+        tuple or None: (manifest, set of finished indices) or None if missing or unreadable
+                       (манифест, множество готовых индексов) или None если отсутствует или не читается
+    """
+    try:
+        with open(os.path.join(staging, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+
+    completed = set()
+    try:
+        with open(os.path.join(staging, COMPLETED_NAME), encoding='utf-8') as f:
+            for line in f:
+                # Last line may be cut by a crash / Последняя строка может быть обрезана сбоем
+                if line.endswith('\n') and line.strip().isdigit():
+                    completed.add(int(line))
+    except OSError:
+        pass
+    return manifest, completed
+
+def find_checkpoint(manager_dir, folder_name):
+    """
+    Find the newest interrupted job of a category / Найти самую новую прерванную задачу категории
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        folder_name (str): Category folder name / Имя папки категории
+
+    Returns:
+        tuple or None: (staging directory, manifest, set of finished indices) or None
+                       (промежуточная директория, манифест, множество готовых индексов) или None
+    """
+    for staging in pending_generations(manager_dir, folder_name):
+        loaded = read_manifest(staging)
+        if loaded:
+            return (staging,) + loaded
+    return None
+
+def clear_checkpoint(staging):
+    """
+    Remove checkpoint files before the generation is published / Удалить файлы контрольной точки перед публикацией поколения
+
+    Args:
+        staging (str): Staging generation directory / Промежуточная директория поколения
+    """
+    for name in (MANIFEST_NAME, COMPLETED_NAME):
+        try:
+            os.remove(os.path.join(staging, name))
+        except FileNotFoundError:
+            pass
+
+class CompletedLog:
+    """Append-only log of finished ad indices / Журнал готовых индексов объявлений только на дозапись"""
+
+    def __init__(self, staging):
+        """
+        Args:
+            staging (str): Staging generation directory / Промежуточная директория поколения
+        """
+        self.file = open(os.path.join(staging, COMPLETED_NAME), 'a', encoding='utf-8')
+        self.unsynced = 0
+
+    def add(self, i):
+        """
+        Record finished ad / Записать готовое объявление
+
+        Args:
+            i (int): Ad index / Индекс объявления
+        """
+        # Flushed right away to survive a process restart, fsync only now and then
+        # Сбрасывается сразу, чтобы пережить перезапуск процесса, fsync - лишь время от времени
+        self.file.write(f"{i}\n")
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= FSYNC_EVERY:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        """Close log file / Закрыть файл журнала"""
+        try:
+            self.file.close()
+        except OSError as e:
+            log_message(f"⚠️ Ошибка закрытия журнала контрольной точки: {e}")
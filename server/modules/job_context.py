@@ -0,0 +1,126 @@
+# filename="job_context.py"
+# server/modules/job_context.py
+# Job Context Module / Модуль контекста задачи
+
+"""
+Job Context Module / Модуль контекста задачи
+
+This module publishes the per-job parameters of a uniquification job (source lists, logo bank,
+output directory, options) once in shared memory, so pool tasks carry only ad indices and seeds.
+Данный модуль публикует параметры задачи уникализации (списки исходников, банк логотипа,
+выходную директорию, опции) один раз в общей памяти, поэтому задачи пула несут только
+индексы объявлений и зёрна.
+
+The pool is long-lived and shared between jobs, so the context can't go through the worker
+initializer; instead each worker unpickles it on first use and keeps it cached by job id.
+Пул долгоживущий и общий для задач, поэтому контекст не может идти через инициализатор рабочих;
+вместо этого каждый рабочий распаковывает его при первом использовании и кэширует по id задачи.
+
+Several jobs run at once, so the worker cache is LRU by job id and never evicts a context
+that a task of this process is still using.
+Несколько задач выполняются одновременно, поэтому кэш рабочего - LRU по id задачи, и он никогда
+не вытесняет контекст, который ещё использует задача этого процесса.
+"""
+
+import pickle
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from modules.source_cache import untrack_segment, unlink_segment
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+JOB_SHM_PREFIX = 'avjob'  # Shared memory name prefix / Префикс имён общей памяти
+MAX_CACHED_CONTEXTS = 4  # Contexts kept in memory per worker / Контекстов в памяти на рабочего
+
+# Segment header: payload length / Заголовок сегмента: длина данных
+HEADER = struct.Struct('<Q')
+
+# Per-process LRU cache of job contexts: job id -> [context, tasks using it]
+# LRU кэш контекстов задач в процессе: id задачи -> [контекст, задач, использующих его]
+_contexts = OrderedDict()
+_contexts_lock = threading.Lock()
+
+def context_name(job_id):
+    """
+    Get shared memory segment name for a job context / Получить имя сегмента общей памяти для контекста задачи
+
+    Args:
+        job_id (str): Job id / Id задачи
+
+    Returns:
+        str: Segment name / Имя сегмента
+    """
+    return f"{JOB_SHM_PREFIX}_{job_id}"
+
+def _load_context(job_id):
+    """Unpickle context from its segment / Распаковать контекст из его сегмента"""
+    shm = shared_memory.SharedMemory(name=context_name(job_id))
+    untrack_segment(shm)
+    try:
+        (length,) = HEADER.unpack_from(shm.buf, 0)
+        return pickle.loads(shm.buf[HEADER.size:HEADER.size + length])
+    finally:
+        shm.close()
+
+@contextmanager
+def use_job_context(job_id):
+    """
+    Use job context (worker side, cached per process) / Использовать контекст задачи (сторона рабочего, с кэшем на процесс)
+
+    Args:
+        job_id (str): Job id / Id задачи
+
+    Yields:
+        dict: Job context, not evicted while in use / Контекст задачи, не вытесняется во время использования
+
+    Raises:
+        FileNotFoundError: Job context was already released / Контекст задачи уже освобождён
+    """
+    with _contexts_lock:
+        entry = _contexts.get(job_id)
+        if entry is not None:
+            _contexts.move_to_end(job_id)
+            entry[1] += 1
+    if entry is None:
+        context = _load_context(job_id)
+        with _contexts_lock:
+            # Another thread may have loaded it meanwhile / Другой поток мог загрузить его тем временем
+            entry = _contexts.setdefault(job_id, [context, 0])
+            _contexts.move_to_end(job_id)
+            entry[1] += 1
+            # Least recently used contexts go first, contexts in use stay
+            # Первыми уходят давно использованные контексты, используемые остаются
+            for old_id in [key for key, (_, users) in _contexts.items() if not users]:
+                if len(_contexts) <= MAX_CACHED_CONTEXTS:
+                    break
+                del _contexts[old_id]
+    try:
+        yield entry[0]
+    finally:
+        with _contexts_lock:
+            entry[1] -= 1
+
+class JobContext:
+    """Shared per-job parameters (parent side) / Общие параметры задачи (сторона родителя)"""
+
+    def __init__(self, job_id, **context):
+        """
+        Args:
+            job_id (str): Job id used in segment name / Id задачи в имени сегмента
+            **context: Picklable job parameters / Сериализуемые параметры задачи
+        """
+        self.job_id = job_id
+        self.name = context_name(job_id)
+        payload = pickle.dumps(context, protocol=pickle.HIGHEST_PROTOCOL)
+        shm = shared_memory.SharedMemory(name=self.name, create=True, size=HEADER.size + len(payload))
+        try:
+            shm.buf[HEADER.size:HEADER.size + len(payload)] = payload
+            HEADER.pack_into(shm.buf, 0, len(payload))
+        finally:
+            shm.close()
+
+    def close(self):
+        """Unlink context segment / Удалить сегмент контекста"""
+        unlink_segment(self.name)
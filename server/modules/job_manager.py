@@ -0,0 +1,319 @@
+# filename="job_manager.py"
+# server/modules/job_manager.py
+# Uniquification Job Manager Module / Модуль управления задачами уникализации
+
+"""
+Uniquification Job Manager Module / Модуль управления задачами уникализации
+
+This module runs uniquification jobs in the background so /api/uniquify returns a job id
+right away instead of holding the HTTP request for the whole job.
+Данный модуль выполняет задачи уникализации в фоне, чтобы /api/uniquify сразу возвращал
+id задачи, а не держал HTTP запрос всё время выполнения.
+
+Job state lives in Redis, so any server thread can answer progress requests:
+Состояние задач хранится в Redis, поэтому на запросы прогресса может ответить любой поток сервера:
+- avito:img:job:<id> - hash with status and counters / хэш со статусом и счётчиками
+- avito:temp:job:<id>:results - list of finished ads / список готовых объявлений
+
+Finished ads can also be streamed to the client as they appear (stream_job).
+Готовые объявления также можно передавать клиенту потоком по мере появления (stream_job).
+"""
+
+import json
+import time
+import uuid
+from modules.ad_processing import process_and_generate, PHOTOS_PER_AD
+from modules.redis_manager import redis_manager, REDIS_PREFIXES, CACHE_TTL
+from modules.result_sinks import RedisSink
+from modules.job_scheduler import JobScheduler, QueueFull
+from modules.utils import log_message, log_context
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+JOB_TTL = CACHE_TTL['image_processing']  # Job state and results lifetime in seconds / Время жизни состояния и результатов в секундах
+PROGRESS_UPDATE_INTERVAL = 0.5  # Min seconds between progress writes to Redis / Мин. секунд между записями прогресса в Redis
+STREAM_POLL_INTERVAL = 0.2  # Seconds between checks for new ads in a stream / Секунд между проверками новых объявлений в потоке
+STREAM_HEARTBEAT = 15  # Seconds of silence before a keep-alive event / Секунд тишины до события поддержания соединения
+
+# Fair-share scheduler of background jobs / Планировщик фоновых задач со справедливой долей
+scheduler = JobScheduler()
+
+def job_key(job_id):
+    """Get Redis key of job state / Получить ключ Redis состояния задачи"""
+    return f"{REDIS_PREFIXES['image_processing']}job:{job_id}"
+
+def results_key(job_id):
+    """Get results list key without prefix (for RedisSink) / Получить ключ списка результатов без префикса (для RedisSink)"""
+    return f"job:{job_id}:results"
+
+def _get_client():
+    """Get Redis client or raise / Получить клиент Redis или выбросить исключение"""
+    client = redis_manager.get_client()
+    if client is None:
+        raise RuntimeError("Redis недоступен")
+    return client
+
+def _update_job(job_id, **fields):
+    """
+    Update job state fields / Обновить поля состояния задачи
+
+    Args:
+        job_id (str): Job id / Id задачи
+        **fields: Fields to set / Поля для записи
+    """
+    client = _get_client()
+    key = job_key(job_id)
+    pipe = client.pipeline()
+    pipe.hset(key, mapping={k: str(v) for k, v in fields.items()})
+    pipe.expire(key, JOB_TTL)
+    pipe.execute()
+
+def run_job(job_id, manager, folder_name, count, use_rotation, incremental=False, trim=False, resume=False, lazy=False):
+    """
+    Run uniquification job and record its progress / Выполнить задачу уникализации и записывать её прогресс
+
+    Args:
+        job_id (str): Job id / Id задачи
+        manager (str): Manager name / Имя менеджера
+        folder_name (str): Category folder name / Имя папки категории
+        count (int): Number of ads / Количество объявлений
+        use_rotation (bool): Use rotation / Использовать поворот
+        incremental (bool): Keep complete ads, render only missing / Сохранить полные объявления, отрисовать только недостающие
+        trim (bool): Remove ads above count in incremental mode / Удалить объявления сверх count в инкрементальном режиме
+        resume (bool): Continue interrupted job of the category / Продолжить прерванную задачу категории
+        lazy (bool): Write recipes only, render photos on first request / Записать только рецепты, отрисовывать фото при первом запросе
+    """
+    # Lines logged by the job are tagged with its manager / Строки лога задачи помечаются её менеджером
+    with log_context(manager):
+        try:
+            _update_job(job_id, status='running', started_at=time.time())
+            last_update = [0.0]
+
+            def progress(done, created):
+                # Throttled, last update is written after the job / С ограничением частоты, последнее обновление пишется после задачи
+                now = time.time()
+                if now - last_update[0] >= PROGRESS_UPDATE_INTERVAL:
+                    last_update[0] = now
+                    _update_job(job_id, done=done, created=created)
+
+            sink = RedisSink(results_key(job_id), ttl=JOB_TTL)
+            result = process_and_generate(folder_name, count, use_rotation, manager, sink=sink, progress=progress,
+                                          incremental=incremental, trim=trim, resume=resume, lazy=lazy)
+
+            # Errors inside process_and_generate are logged there and reported by the sink
+            # Ошибки внутри process_and_generate логируются там и передаются приёмником
+            if result.get('error'):
+                _update_job(job_id, status='failed', finished_at=time.time(), error=result['error'])
+                return
+            _update_job(job_id, status='done', finished_at=time.time(), done=count, created=result['count'])
+            log_message(f"✅ Задача {job_id} завершена: {result['count']} из {count} объявлений")
+        except Exception as e:
+            log_message(f"❌ Ошибка задачи {job_id}: {e}")
+            try:
+                _update_job(job_id, status='failed', finished_at=time.time(), error=str(e))
+            except Exception:
+                pass
+
+def submit_job(manager, folder_name, count, use_rotation, wait=False, incremental=False, trim=False, resume=False, lazy=False, job_id=None):
+    """
+    Create job and queue it in the scheduler / Создать задачу и поставить её в очередь планировщика
+
+    Args:
+        manager (str): Manager name / Имя менеджера
+        folder_name (str): Category folder name / Имя папки категории
+        count (int): Number of ads / Количество объявлений
+        use_rotation (bool): Use rotation / Использовать поворот
+        wait (bool): Block until the job is finished / Блокировать до завершения задачи
+        incremental (bool): Keep complete ads, render only missing / Сохранить полные объявления, отрисовать только недостающие
+        trim (bool): Remove ads above count in incremental mode / Удалить объявления сверх count в инкрементальном режиме
+        resume (bool): Continue interrupted job of the category / Продолжить прерванную задачу категории
+        lazy (bool): Write recipes only, render photos on first request / Записать только рецепты, отрисовывать фото при первом запросе
+        job_id (str): Id to reuse, new one by default / Id для повторного использования, по умолчанию новый
+
+    Returns:
+        str: Job id / Id задачи
+
+    Raises:
+        QueueFull: Job queue is full / Очередь задач заполнена
+    """
+    job_id = job_id or uuid.uuid4().hex[:12]
+    # Parameters are kept so the job can be resumed after a restart / Параметры сохраняются, чтобы задачу можно было продолжить после перезапуска
+    _update_job(
+        job_id,
+        status='queued',
+        manager=manager,
+        folder_name=folder_name,
+        count=count,
+        use_rotation=int(bool(use_rotation)),
+        incremental=int(bool(incremental)),
+        trim=int(bool(trim)),
+        lazy=int(bool(lazy)),
+        done=0,
+        created=0,
+        created_at=time.time(),
+    )
+    try:
+        # One job per category at a time, the next one waits in the queue instead of on CategoryLock
+        # Одна задача на категорию за раз, следующая ждёт в очереди, а не на CategoryLock
+        future = scheduler.submit(manager, count, run_job, job_id, manager, folder_name, count, use_rotation, incremental, trim, resume, lazy,
+                                  key=(manager, folder_name))
+    except QueueFull:
+        _get_client().delete(job_key(job_id))
+        log_message(f"⏳ Очередь задач заполнена, задача для '{manager}/{folder_name}' отклонена")
+        raise
+    log_message(f"📋 Задача {job_id}: {count} объявлений для '{manager}/{folder_name}' поставлена в очередь")
+    if wait:
+        future.result()
+    return job_id
+
+def get_job(job_id):
+    """
+    Get job state with speed and ETA / Получить состояние задачи со скоростью и оценкой времени
+
+    Args:
+        job_id (str): Job id / Id задачи
+
+    Returns:
+        dict or None: Job state or None if unknown / Состояние задачи или None если неизвестна
+    """
+    state = _get_client().hgetall(job_key(job_id))
+    if not state:
+        return None
+
+    count = int(state.get('count', 0))
+    done = int(state.get('done', 0))
+    created = int(state.get('created', 0))
+    job = {
+        'job_id': job_id,
+        'status': state.get('status'),
+        'manager': state.get('manager'),
+        'folder_name': state.get('folder_name'),
+        'count': count,
+        'done': done,
+        'created': created,
+        'images_per_sec': 0.0,
+        'eta_sec': None,
+    }
+    if state.get('error'):
+        job['error'] = state['error']
+    if job['status'] == 'queued' and state.get('created_at'):
+        job['queued_sec'] = round(time.time() - float(state['created_at']), 1)
+
+    # Speed from ads finished so far / Скорость по уже готовым объявлениям
+    started_at = state.get('started_at')
+    if started_at:
+        elapsed = float(state.get('finished_at') or time.time()) - float(started_at)
+        job['elapsed_sec'] = round(elapsed, 1)
+        if elapsed > 0 and done:
+            job['images_per_sec'] = round(created * PHOTOS_PER_AD / elapsed, 2)
+            if job['status'] == 'running':
+                job['eta_sec'] = round((count - done) * elapsed / done, 1)
+    return job
+
+def get_job_results(job_id):
+    """
+    Get finished ads of a job / Получить готовые объявления задачи
+
+    Args:
+        job_id (str): Job id / Id задачи
+
+    Returns:
+        list: Rows [ad number, links] in ad order / Строки [номер объявления, ссылки] в порядке объявлений
+    """
+    rows = _get_client().lrange(f"{REDIS_PREFIXES['temp_data']}{results_key(job_id)}", 0, -1)
+    results = [json.loads(row) for row in rows]
+    results.sort(key=lambda row: row[0])
+    return results
+
+def stream_job(job_id):
+    """
+    Follow a job and yield its ads as they finish / Следить за задачей и выдавать её объявления по мере готовности
+
+    Ads come in completion order, not by number. Reading the results list by offset lets
+    several clients follow one job and a reconnected client get the ads it missed.
+    Объявления приходят в порядке готовности, а не по номеру. Чтение списка результатов по смещению
+    позволяет нескольким клиентам следить за одной задачей, а переподключившемуся - получить пропущенные.
+
+    Args:
+        job_id (str): Job id / Id задачи
+
+    Yields:
+        dict: Events / События:
+            {'type': 'ad', 'row': [ad number, links]} - finished ad / готовое объявление
+            {'type': 'progress', 'job': {...}} - job state changed / состояние задачи изменилось
+            {'type': 'heartbeat'} - nothing new for STREAM_HEARTBEAT seconds / ничего нового STREAM_HEARTBEAT секунд
+            {'type': 'end', 'job': {...}} - job is done or failed, last event / задача завершена или провалена, последнее событие
+    """
+    client = _get_client()
+    key = f"{REDIS_PREFIXES['temp_data']}{results_key(job_id)}"
+    offset = 0
+    last_state = None
+    last_event = time.time()
+
+    while True:
+        # State is read before results so nothing written before 'done' is missed
+        # Состояние читается до результатов, чтобы не пропустить записанное до 'done'
+        job = get_job(job_id)
+
+        rows = client.lrange(key, offset, -1)
+        offset += len(rows)
+        for row in rows:
+            yield {'type': 'ad', 'row': json.loads(row)}
+
+        if job is None or job['status'] in ('done', 'failed'):
+            yield {'type': 'end', 'job': job or {'job_id': job_id, 'status': 'failed', 'error': 'Задача не найдена'}}
+            return
+
+        state = (job['status'], job['done'], job['created'])
+        now = time.time()
+        if state != last_state:
+            last_state = state
+            last_event = now
+            yield {'type': 'progress', 'job': job}
+        elif rows:
+            last_event = now
+        elif now - last_event >= STREAM_HEARTBEAT:
+            # Keeps proxies from closing an idle connection / Не даёт прокси закрыть простаивающее соединение
+            last_event = now
+            yield {'type': 'heartbeat'}
+        time.sleep(STREAM_POLL_INTERVAL)
+
+def resume_interrupted_jobs():
+    """
+    Requeue jobs left unfinished by a server restart / Повторно поставить в очередь задачи, не завершённые из-за перезапуска сервера
+
+    Jobs keep their ids and continue from their checkpoints.
+    Задачи сохраняют свои id и продолжаются со своих контрольных точек.
+
+    Returns:
+        int: Number of requeued jobs / Число повторно поставленных задач
+    """
+    client = _get_client()
+    resumed = 0
+    for key in client.scan_iter(match=job_key('*')):
+        state = client.hgetall(key)
+        if state.get('status') not in ('queued', 'running') or not state.get('manager'):
+            continue
+        job_id = key[len(job_key('')):]
+        try:
+            submit_job(state['manager'], state['folder_name'], int(state['count']), state.get('use_rotation', '1') == '1',
+                       incremental=state.get('incremental') == '1', trim=state.get('trim') == '1', resume=True,
+                       lazy=state.get('lazy') == '1', job_id=job_id)
+            resumed += 1
+        except QueueFull:
+            _update_job(job_id, status='failed', finished_at=time.time(), error='Задача прервана перезапуском сервера')
+    if resumed:
+        log_message(f"⏯️ Продолжено {resumed} прерванных задач уникализации")
+    return resumed
+
+def get_scheduler_metrics():
+    """
+    Get job queue metrics / Получить метрики очереди задач
+
+    Returns:
+        dict: Queue depth, running jobs and wait times / Глубина очереди, выполняемые задачи и время ожидания
+    """
+    return scheduler.metrics()
+
+def shutdown_jobs():
+    """Cancel queued jobs and stop the scheduler / Отменить задачи в очереди и остановить планировщик"""
+    scheduler.shutdown()
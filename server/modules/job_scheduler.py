@@ -0,0 +1,246 @@
+# filename="job_scheduler.py"
+# server/modules/job_scheduler.py
+# Job Scheduler Module / Модуль планировщика задач
+
+"""
+Job Scheduler Module / Модуль планировщика задач
+
+This module decides which uniquification job runs next on the shared render pool.
+Данный модуль решает, какая задача уникализации выполняется следующей на общем пуле отрисовки.
+
+Rules / Правила:
+- Fair share: next slot goes to the manager with the fewest running jobs, then with the
+  fewest ads started in the last USAGE_WINDOW seconds
+  Справедливая доля: следующий слот получает менеджер с наименьшим числом выполняемых задач,
+  затем с наименьшим числом объявлений, запущенных за последние USAGE_WINDOW секунд
+- Priority: small jobs first, waiting time slowly raises a big job's priority
+  Приоритет: сначала маленькие задачи, время ожидания постепенно повышает приоритет большой задачи
+- Backpressure: over MAX_QUEUED_JOBS new jobs are refused with a retry estimate
+  Обратное давление: сверх MAX_QUEUED_JOBS новые задачи отклоняются с оценкой времени повтора
+- Exclusive keys: a job whose key (category) is running waits in the queue, not in a runner slot
+  Исключающие ключи: задача, чей ключ (категория) выполняется, ждёт в очереди, а не в слоте исполнителя
+
+Running jobs share the render pool through their bounded task windows.
+Выполняемые задачи делят пул отрисовки через свои ограниченные окна задач.
+"""
+
+import math
+import time
+import threading
+import concurrent.futures
+from collections import deque
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+MAX_RUNNING_JOBS = 2  # Jobs rendering at the same time / Одновременно выполняемых задач
+MAX_QUEUED_JOBS = 20  # Waiting jobs on the whole server / Ожидающих задач на весь сервер
+MAX_QUEUED_PER_MANAGER = 5  # Waiting jobs per manager / Ожидающих задач на менеджера
+USAGE_WINDOW = 600  # Seconds of history for fair share / Секунд истории для справедливой доли
+AGING_ADS_PER_SEC = 2  # Priority gain per second of waiting, in ads / Рост приоритета за секунду ожидания, в объявлениях
+RETRY_AFTER_DEFAULT = 30  # Retry-After without history, in seconds / Retry-After без истории, в секундах
+RETRY_AFTER_MAX = 600  # Upper bound of Retry-After in seconds / Верхняя граница Retry-After в секундах
+METRICS_SAMPLES = 100  # Recent jobs kept for wait and run time stats / Последних задач для статистики ожидания и выполнения
+
+class QueueFull(Exception):
+    """Job queue is over its depth / Очередь задач переполнена"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _Job:
+    """Queued job / Задача в очереди"""
+
+    def __init__(self, manager, size, fn, args, key=None):
+        self.manager = manager
+        self.size = size
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.queued_at = time.time()
+        self.future = concurrent.futures.Future()
+
+    def priority(self, now):
+        """Lower is sooner / Меньше - раньше"""
+        return self.size - (now - self.queued_at) * AGING_ADS_PER_SEC
+
+class JobScheduler:
+    """Fair-share job queue in front of the render pool / Очередь задач со справедливой долей перед пулом отрисовки"""
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, max_queued=MAX_QUEUED_JOBS, max_queued_per_manager=MAX_QUEUED_PER_MANAGER):
+        """
+        Args:
+            max_running (int): Jobs running at the same time / Одновременно выполняемых задач
+            max_queued (int): Waiting jobs on the server / Ожидающих задач на сервере
+            max_queued_per_manager (int): Waiting jobs per manager / Ожидающих задач на менеджера
+        """
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_queued_per_manager = max_queued_per_manager
+        self.queues = {}  # manager -> list of _Job / менеджер -> список _Job
+        self.running = {}  # manager -> number of running jobs / менеджер -> число выполняемых задач
+        self.started = deque()  # (time, manager, size) of recently started jobs / (время, менеджер, размер) недавно запущенных задач
+        self.busy_keys = set()  # Keys of running jobs / Ключи выполняемых задач
+        self.queued = 0
+        self.waits = deque(maxlen=METRICS_SAMPLES)
+        self.run_times = deque(maxlen=METRICS_SAMPLES)
+        self.rejected = 0
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.threads = []
+
+    def start(self):
+        """Start runner threads / Запустить потоки-исполнители"""
+        with self.condition:
+            if self.threads:
+                return
+            for n in range(self.max_running):
+                thread = threading.Thread(target=self._run, name=f'uniquify-job-{n}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def retry_after(self):
+        """
+        Estimate seconds until a queue slot frees up / Оценить секунды до освобождения места в очереди
+
+        Returns:
+            int: Seconds for Retry-After header / Секунды для заголовка Retry-After
+        """
+        if not self.run_times:
+            return RETRY_AFTER_DEFAULT
+        avg_run = sum(self.run_times) / len(self.run_times)
+        # One queued job leaves per avg_run / max_running seconds / Одна задача покидает очередь за avg_run / max_running секунд
+        return max(1, min(RETRY_AFTER_MAX, math.ceil(avg_run / self.max_running)))
+
+    def submit(self, manager, size, fn, *args, key=None):
+        """
+        Queue a job / Поставить задачу в очередь
+
+        Args:
+            manager (str): Manager name for fair share / Имя менеджера для справедливой доли
+            size (int): Job size in ads, smaller runs first / Размер задачи в объявлениях, меньшие идут первыми
+            fn (callable): Job function / Функция задачи
+            *args: Job function arguments / Аргументы функции задачи
+            key (hashable): Jobs with the same key never run at once (e.g. category) / Задачи с одним ключом не выполняются одновременно (например, категория)
+
+        Returns:
+            Future: Result of fn / Результат fn
+
+        Raises:
+            QueueFull: Server or manager queue is full / Очередь сервера или менеджера заполнена
+        """
+        self.start()
+        with self.condition:
+            queue = self.queues.setdefault(manager, [])
+            if self.queued >= self.max_queued or len(queue) >= self.max_queued_per_manager:
+                self.rejected += 1
+                raise QueueFull("Очередь задач заполнена, повторите позже", self.retry_after())
+            job = _Job(manager, size, fn, args, key)
+            queue.append(job)
+            self.queued += 1
+            self.condition.notify()
+        return job.future
+
+    def _pick(self):
+        """Take next job by fair share and priority (under lock) / Взять следующую задачу по справедливой доле и приоритету (под блокировкой)"""
+        now = time.time()
+
+        # Recent usage per manager / Недавнее использование по менеджерам
+        while self.started and self.started[0][0] < now - USAGE_WINDOW:
+            self.started.popleft()
+        usage = {}
+        for _, manager, size in self.started:
+            usage[manager] = usage.get(manager, 0) + size
+
+        best = None
+        for manager, queue in self.queues.items():
+            # A job of a category being built would only block its slot / Задача собираемой категории лишь заблокировала бы свой слот
+            ready = [j for j in queue if j.key is None or j.key not in self.busy_keys]
+            if not ready:
+                continue
+            job = min(ready, key=lambda j: j.priority(now))
+            key = (self.running.get(manager, 0), usage.get(manager, 0) + job.priority(now))
+            if best is None or key < best[0]:
+                best = (key, job)
+        if best is None:
+            return None
+        job = best[1]
+        self.queues[job.manager].remove(job)
+        self.queued -= 1
+        self.running[job.manager] = self.running.get(job.manager, 0) + 1
+        if job.key is not None:
+            self.busy_keys.add(job.key)
+        self.started.append((now, job.manager, job.size))
+        return job
+
+    def _run(self):
+        """Runner thread loop / Цикл потока-исполнителя"""
+        while True:
+            with self.condition:
+                job = self._pick()
+                while job is None and not self.stopped:
+                    self.condition.wait()
+                    job = self._pick()
+                if job is None:
+                    return
+                started = time.time()
+                self.waits.append(started - job.queued_at)
+
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn(*job.args))
+                except Exception as e:
+                    log_message(f"❌ Ошибка задачи менеджера '{job.manager}': {e}")
+                    job.future.set_exception(e)
+
+            with self.condition:
+                self.running[job.manager] -= 1
+                if not self.running[job.manager]:
+                    del self.running[job.manager]
+                if job.key is not None:
+                    # Waiting jobs of this key may run now / Ожидающие задачи этого ключа теперь могут выполняться
+                    self.busy_keys.discard(job.key)
+                    self.condition.notify_all()
+                self.run_times.append(time.time() - started)
+
+    def metrics(self):
+        """
+        Get queue depth and wait time stats / Получить глубину очереди и статистику ожидания
+
+        Returns:
+            dict: Scheduler metrics / Метрики планировщика
+        """
+        with self.condition:
+            now = time.time()
+            waiting = [job for queue in self.queues.values() for job in queue]
+            waits = sorted(self.waits)
+            return {
+                'running': sum(self.running.values()),
+                'queued': self.queued,
+                'max_running': self.max_running,
+                'max_queued': self.max_queued,
+                'rejected': self.rejected,
+                'managers': {
+                    manager: {'queued': len(self.queues.get(manager, [])), 'running': self.running.get(manager, 0)}
+                    for manager in set(self.queues) | set(self.running)
+                    if self.queues.get(manager) or self.running.get(manager)
+                },
+                'oldest_wait_sec': round(max((now - job.queued_at for job in waiting), default=0.0), 1),
+                'wait_sec': {
+                    'avg': round(sum(waits) / len(waits), 1) if waits else 0.0,
+                    'p95': round(waits[int(len(waits) * 0.95)], 1) if waits else 0.0,
+                    'max': round(waits[-1], 1) if waits else 0.0,
+                },
+                'retry_after': self.retry_after(),
+            }
+
+    def shutdown(self):
+        """Cancel queued jobs and stop runner threads after current jobs / Отменить задачи в очереди и остановить потоки после текущих задач"""
+        with self.condition:
+            self.stopped = True
+            for queue in self.queues.values():
+                for job in queue:
+                    job.future.cancel()
+                queue.clear()
+            self.queued = 0
+            self.condition.notify_all()
@@ -0,0 +1,296 @@
+# filename="lazy_render.py"
+# server/modules/lazy_render.py
+# Lazy Photo Rendering Module / Модуль отложенной отрисовки фотографий
+
+"""
+Lazy Photo Rendering Module / Модуль отложенной отрисовки фотографий
+
+In lazy mode a job writes only a recipe per ad instead of its JPEGs. A photo is rendered the
+first time its URL is requested and kept in a bounded on-disk LRU cache.
+В отложенном режиме задача записывает только рецепт объявления вместо его JPEG. Фотография
+отрисовывается при первом запросе её URL и хранится в ограниченном дисковом LRU кэше.
+
+Recipe (recipe.json in ad directory) / Рецепт (recipe.json в директории объявления):
+- photos: source path (relative to manager directory), its size and mtime, photo seed
+  photos: путь исходника (относительно директории менеджера), его размер и mtime, зерно фотографии
+- use_rotation, logo_bank: render options, logo_bank is null for a manager without a logo
+  опции отрисовки, logo_bank равен null у менеджера без логотипа
+
+Crop, rotation, color and logo variant are drawn from the photo seed exactly as in a full job,
+so a URL always gives the same bytes, even after the cache entry is evicted.
+Обрезка, поворот, цвет и вариант логотипа берутся из зерна фотографии так же, как в полной задаче,
+поэтому URL всегда отдаёт одни и те же байты, даже после вытеснения записи из кэша.
+"""
+
+import os
+import json
+import random
+import uuid
+import hashlib
+import concurrent.futures
+import threading
+from modules.image_processing import uniquify_image, MAX_WORKING_SIZE
+from modules.logo_bank import load_logo_bank, ensure_logo_bank
+from modules.source_cache import open_source
+from modules.worker_pool import get_lazy_pool
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+RECIPE_NAME = 'recipe.json'  # Recipe file in ad directory / Файл рецепта в директории объявления
+RECIPE_VERSION = 1  # Part of cache key, bump when rendering changes / Часть ключа кэша, увеличивается при изменении отрисовки
+RENDER_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'render_cache')  # Rendered photos cache / Кэш отрисованных фотографий
+RENDER_CACHE_MAX_BYTES = 2 * 1024 ** 3  # Cache size limit / Предел размера кэша
+RENDER_CACHE_LOW_WATERMARK = 0.9  # Eviction frees the cache down to this share of the limit / Вытеснение освобождает кэш до этой доли предела
+LAZY_RENDER_TIMEOUT = 30  # Seconds a request waits for its render / Секунд, которые запрос ждёт отрисовку
+
+# Approximate cache size, counted on first use / Примерный размер кэша, подсчитывается при первом использовании
+_cache_bytes = None
+_cache_lock = threading.Lock()
+
+def write_recipe(ad_path, manager_dir, sources, seeds, use_rotation, logo_bank_path):
+    """
+    Write ad recipe instead of rendering its photos / Записать рецепт объявления вместо отрисовки его фотографий
+
+    Args:
+        ad_path (str): Ad directory / Директория объявления
+        manager_dir (str): Manager directory, paths are stored relative to it / Директория менеджера, пути хранятся относительно неё
+        sources (list): Source file per photo / Исходный файл для каждой фотографии
+        seeds (list): Seed per photo / Зерно для каждой фотографии
+        use_rotation (bool): Use rotation / Использовать поворот
+        logo_bank_path (str): Logo bank file, None without a logo / Файл банка логотипа, None без логотипа
+    """
+    photos = []
+    for source, seed in zip(sources, seeds):
+        stat = os.stat(source)
+        photos.append({
+            'source': os.path.relpath(source, manager_dir),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'seed': seed,
+        })
+    recipe = {
+        'version': RECIPE_VERSION,
+        'use_rotation': bool(use_rotation),
+        'logo_bank': os.path.relpath(logo_bank_path, manager_dir) if logo_bank_path else None,
+        'photos': photos,
+    }
+    os.makedirs(ad_path, exist_ok=True)
+    tmp_path = os.path.join(ad_path, RECIPE_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(recipe, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(ad_path, RECIPE_NAME))
+
+def load_recipe(ad_path):
+    """
+    Load ad recipe / Загрузить рецепт объявления
+
+    Args:
+        ad_path (str): Ad directory / Директория объявления
+
+    Returns:
+        dict or None: Recipe or None if ad has no valid recipe / Рецепт или None если у объявления нет корректного рецепта
+    """
+    try:
+        with open(os.path.join(ad_path, RECIPE_NAME), encoding='utf-8') as f:
+            recipe = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if recipe.get('version') != RECIPE_VERSION:
+        return None
+    return recipe
+
+def is_lazy_photo(photo_path):
+    """
+    Check that photo can be rendered from a recipe / Проверить, что фотографию можно отрисовать по рецепту
+
+    Args:
+        photo_path (str): Path of <n>.jpg in ad directory / Путь <n>.jpg в директории объявления
+
+    Returns:
+        bool: Ad directory has a recipe with this photo / В директории объявления есть рецепт с этой фотографией
+    """
+    return _photo_index(photo_path) is not None and os.path.isfile(os.path.join(os.path.dirname(photo_path), RECIPE_NAME))
+
+def _photo_index(photo_path):
+    """Photo index from <n>.jpg name / Индекс фотографии из имени <n>.jpg"""
+    stem, ext = os.path.splitext(os.path.basename(photo_path))
+    if ext != '.jpg' or not stem.isdigit() or int(stem) < 1:
+        return None
+    return int(stem) - 1
+
+def cache_path(recipe, j):
+    """
+    Get cache file of a photo / Получить файл кэша фотографии
+
+    The key covers everything that affects the bytes, so identical photos share one entry.
+    Ключ покрывает всё, что влияет на байты, поэтому одинаковые фотографии делят одну запись.
+
+    Args:
+        recipe (dict): Ad recipe / Рецепт объявления
+        j (int): Photo index / Индекс фотографии
+
+    Returns:
+        str: Cache file path / Путь файла кэша
+    """
+    key = json.dumps([recipe['version'], recipe['use_rotation'], recipe['logo_bank'], recipe['photos'][j]], sort_keys=True)
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(RENDER_CACHE_DIR, digest[:2], f"{digest}.jpg")
+
+def render_recipe_photo(source, seed, use_rotation, logo_bank_path, output_path):
+    """
+    Render one photo from recipe (runs in worker process) / Отрисовать одну фотографию по рецепту (выполняется в рабочем процессе)
+
+    Args:
+        source (str): Source file path / Путь исходного файла
+        seed (int): Photo seed / Зерно фотографии
+        use_rotation (bool): Use rotation / Использовать поворот
+        logo_bank_path (str): Logo bank file, None to render without a logo / Файл банка логотипа, None для отрисовки без логотипа
+        output_path (str): Output JPEG path / Путь выходного JPEG
+    """
+    logo_variants = load_logo_bank(logo_bank_path)
+    # Same seeding and decoding as a full job render / То же зерно и декодирование, что и в полной задаче
+    random.seed(seed)
+    with open_source(None, source, MAX_WORKING_SIZE, []) as im:
+        uniquify_image(source, output_path, None, use_rotation, logo_variants=logo_variants, source=im)
+
+def render_lazy_photo(manager_dir, photo_path):
+    """
+    Get rendered photo of a recipe ad, rendering it on cache miss / Получить отрисованную фотографию объявления по рецепту, отрисовав её при промахе кэша
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        photo_path (str): Path of <n>.jpg in ad directory / Путь <n>.jpg в директории объявления
+
+    Returns:
+        str or None: Cached JPEG path or None if there is no such photo or its source was deleted
+                     Путь JPEG в кэше или None если такой фотографии нет или её исходник удалён
+
+    Raises:
+        TimeoutError: Render took longer than LAZY_RENDER_TIMEOUT / Отрисовка заняла больше LAZY_RENDER_TIMEOUT
+    """
+    j = _photo_index(photo_path)
+    recipe = load_recipe(os.path.dirname(photo_path))
+    if j is None or recipe is None or j >= len(recipe['photos']):
+        return None
+
+    path = cache_path(recipe, j)
+    if os.path.isfile(path):
+        # Access time for LRU, atime is often disabled / Время доступа для LRU, atime часто отключено
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+    photo = recipe['photos'][j]
+    source = os.path.join(manager_dir, photo['source'])
+    try:
+        stat = os.stat(source)
+    except FileNotFoundError:
+        log_message(f"⚠️ Исходник {photo['source']} удалён, фото {photo_path} не может быть отрисовано")
+        return None
+    if stat.st_size != photo['size'] or stat.st_mtime_ns != photo['mtime']:
+        log_message(f"⚠️ Исходник {photo['source']} изменён после записи рецепта, фото будет отличаться")
+
+    logo_bank_path = _recipe_logo_bank(manager_dir, recipe)
+
+    # Render in the lazy pool, not behind job tasks: workers are single-threaded, so seeding the global random is safe there
+    # Отрисовка в пуле отложенной отрисовки, а не за задачами: рабочие однопоточны, поэтому задание зерна глобального random там безопасно
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique name: a timed out render may still be writing its own temp file / Уникальное имя: отрисовка по таймауту может ещё писать свой временный файл
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    future = get_lazy_pool().submit(render_recipe_photo, source, photo['seed'], recipe['use_rotation'],
+                                    logo_bank_path, tmp_path)
+    try:
+        future.result(timeout=LAZY_RENDER_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        # Render keeps going, its temp file is removed when it ends / Отрисовка продолжается, её временный файл удаляется по окончании
+        if not future.cancel():
+            future.add_done_callback(lambda _: _remove(tmp_path))
+        raise TimeoutError(f"Отрисовка {photo_path} не уложилась в {LAZY_RENDER_TIMEOUT} сек")
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+    with _cache_lock:
+        # Concurrent requests may render the same photo, only the first file is counted
+        # Одновременные запросы могут отрисовать одну фотографию, учитывается только первый файл
+        created = not os.path.exists(path)
+        os.replace(tmp_path, path)
+    if created:
+        _account(os.path.getsize(path))
+    return path
+
+def _recipe_logo_bank(manager_dir, recipe):
+    """
+    Logo bank of a recipe, the current bank if the recipe's one was removed by a new logo
+    Банк логотипа рецепта, текущий банк если банк рецепта удалён из-за нового логотипа
+    """
+    if not recipe['logo_bank']:
+        return None
+    bank_path = os.path.join(manager_dir, recipe['logo_bank'])
+    if os.path.isfile(bank_path):
+        return bank_path
+    log_message(f"⚠️ Банк логотипа {recipe['logo_bank']} удалён, используется текущий логотип менеджера")
+    return ensure_logo_bank(os.path.join(manager_dir, 'img', 'Logo.png'))
+
+def _remove(path):
+    """Remove file if it exists / Удалить файл, если он существует"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _account(nbytes):
+    """Add new cache entry size and evict if over the limit / Учесть размер новой записи кэша и вытеснить при превышении предела"""
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _cache_entries())
+        else:
+            _cache_bytes += nbytes
+        if _cache_bytes > RENDER_CACHE_MAX_BYTES:
+            _cache_bytes = evict_render_cache(int(RENDER_CACHE_MAX_BYTES * RENDER_CACHE_LOW_WATERMARK))
+
+def _cache_entries():
+    """List (mtime, size, path) of cache files / Список (mtime, размер, путь) файлов кэша"""
+    entries = []
+    if not os.path.isdir(RENDER_CACHE_DIR):
+        return entries
+    for bucket in os.scandir(RENDER_CACHE_DIR):
+        if not bucket.is_dir():
+            continue
+        for entry in os.scandir(bucket.path):
+            if entry.name.endswith('.jpg'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+def evict_render_cache(target_bytes):
+    """
+    Remove least recently used photos until cache fits target size / Удалить давно не использованные фотографии, пока кэш не уложится в целевой размер
+
+    Args:
+        target_bytes (int): Target cache size / Целевой размер кэша
+
+    Returns:
+        int: Cache size after eviction / Размер кэша после вытеснения
+    """
+    entries = sorted(_cache_entries())
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        log_message(f"🧹 Кэш отрисовки: вытеснено {removed} фото, осталось {total / 1024 ** 2:.0f} МБ")
+    return total
@@ -0,0 +1,137 @@
+# filename="log_reader.py"
+# server/modules/log_reader.py
+# Log Reader Module / Модуль чтения лога
+
+"""
+Log Reader Module / Модуль чтения лога
+
+This module reads the end of the log file without loading it, so the cost of a log poll
+does not grow with the file.
+Данный модуль читает конец лог-файла, не загружая его целиком, поэтому цена опроса лога
+не растёт вместе с файлом.
+
+- Tail: blocks are read backwards from the end until enough lines are found
+  Хвост: блоки читаются назад от конца, пока не найдётся достаточно строк
+- Cursor: byte offset right after the last returned line, the next poll reads only what was appended
+  Курсор: смещение в байтах сразу после последней выданной строки, следующий опрос читает только дописанное
+- Manager filter: lines tagged by a manager's job or mentioning the manager by quoted name
+  Фильтр по менеджеру: строки, помеченные задачей менеджера или упоминающие менеджера по имени в кавычках
+
+A line still being written (no newline yet) is never returned and stays after the cursor.
+Строка, которая ещё пишется (без перевода строки), никогда не выдаётся и остаётся за курсором.
+"""
+
+import os
+from modules.utils import log_tag
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+LOG_TAIL_BLOCK = 8192  # Bytes read per step backwards / Байт, читаемых за шаг назад
+LOG_MAX_SCAN_BYTES = 4 * 1024 * 1024  # Filtered tail looks this far back at most / Отфильтрованный хвост смотрит назад не дальше этого
+LOG_MAX_READ_BYTES = 1024 * 1024  # Cursor this far behind jumps to the tail / Курсор, отставший дальше этого, переходит к хвосту
+
+def line_matches(line, manager):
+    """
+    Check that log line belongs to a manager / Проверить, что строка лога относится к менеджеру
+
+    Args:
+        line (str): Log line / Строка лога
+        manager (str or None): Manager name, None matches every line / Имя менеджера, None подходит под любую строку
+
+    Returns:
+        bool: Line is tagged with or mentions the manager / Строка помечена менеджером или упоминает его
+    """
+    return manager is None or log_tag(manager) in line or f"'{manager}'" in line
+
+def _complete_end(f, size):
+    """Offset right after the last newline / Смещение сразу после последнего перевода строки"""
+    pos = size
+    while pos > 0:
+        step = min(LOG_TAIL_BLOCK, pos)
+        pos -= step
+        f.seek(pos)
+        i = f.read(step).rfind(b'\n')
+        if i >= 0:
+            return pos + i + 1
+    return 0
+
+def _reverse_lines(f, end):
+    """Complete lines before end, newest first / Полные строки до end, новые первыми"""
+    pos = end
+    pending = b''
+    while pos > 0 and end - pos < LOG_MAX_SCAN_BYTES:
+        step = min(LOG_TAIL_BLOCK, pos)
+        pos -= step
+        f.seek(pos)
+        parts = (f.read(step) + pending).split(b'\n')
+        # First part may continue in the previous block / Первая часть может продолжаться в предыдущем блоке
+        pending = parts[0]
+        for raw in reversed(parts[1:]):
+            if raw:
+                yield raw
+    if pos == 0 and pending:
+        yield pending
+
+def _decode(raw):
+    """Bytes of a line to text / Байты строки в текст"""
+    return raw.decode('utf-8', errors='replace').rstrip('\r')
+
+def tail_lines(path, count, manager=None):
+    """
+    Read last lines of a log file / Прочитать последние строки лог-файла
+
+    Args:
+        path (str): Log file path / Путь лог-файла
+        count (int): Number of lines / Количество строк
+        manager (str or None): Only lines of this manager / Только строки этого менеджера
+
+    Returns:
+        tuple: (lines oldest first, cursor after the last complete line) / (строки, старые первыми, курсор после последней полной строки)
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return [], 0
+    with f:
+        end = _complete_end(f, f.seek(0, os.SEEK_END))
+        lines = []
+        for raw in _reverse_lines(f, end):
+            if len(lines) >= count:
+                break
+            line = _decode(raw)
+            if line_matches(line, manager):
+                lines.append(line)
+    lines.reverse()
+    return lines, end
+
+def read_since(path, cursor, count, manager=None):
+    """
+    Read lines appended after a cursor / Прочитать строки, дописанные после курсора
+
+    Args:
+        path (str): Log file path / Путь лог-файла
+        cursor (int): Cursor from a previous read / Курсор предыдущего чтения
+        count (int): Max number of lines, the newest are kept / Максимум строк, сохраняются самые новые
+        manager (str or None): Only lines of this manager / Только строки этого менеджера
+
+    Returns:
+        tuple: (lines oldest first, new cursor, True if the cursor was reset to the tail)
+               (строки, старые первыми, новый курсор, True если курсор сброшен на хвост)
+    """
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return [], 0, cursor != 0
+    if cursor > size or size - cursor > LOG_MAX_READ_BYTES:
+        # File was truncated or the client is far behind / Файл был усечён или клиент сильно отстал
+        lines, end = tail_lines(path, count, manager)
+        return lines, end, True
+
+    with open(path, 'rb') as f:
+        f.seek(cursor)
+        data = f.read(size - cursor)
+    cut = data.rfind(b'\n')
+    if cut < 0:
+        return [], cursor, False
+    lines = [_decode(raw) for raw in data[:cut].split(b'\n') if raw]
+    lines = [line for line in lines if line_matches(line, manager)]
+    return lines[-count:] if count else [], cursor + cut + 1, False
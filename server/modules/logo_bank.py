@@ -0,0 +1,172 @@
+# filename="logo_bank.py"
+# server/modules/logo_bank.py
+# Logo Variant Bank Module / Модуль банка вариантов логотипа
+
+"""
+Logo Variant Bank Module / Модуль банка вариантов логотипа
+
+This module pre-generates randomized logo variants once per manager logo instead of
+re-running the logo uniquification pipeline for every photo.
+Данный модуль заранее создаёт случайные варианты логотипа один раз на логотип менеджера
+вместо повторного запуска пайплайна уникализации логотипа для каждой фотографии.
+
+Variants are stored as RGBA in <manager>/img/logo_bank/<sha256>.rgba.npy, ready for masked
+paste, so any worker process can load a bank by path and a new Logo.png gets a new bank.
+Варианты хранятся в RGBA в <manager>/img/logo_bank/<sha256>.rgba.npy, готовыми для вставки по маске,
+поэтому любой рабочий процесс может загрузить банк по пути, а новый Logo.png получает новый банк.
+
+Straight, not premultiplied, alpha is stored on purpose: Image.paste with the alpha as mask already
+blends dst * (1 - a) + src * a in one C pass over the logo box only. A premultiplied variant would
+need dst * (1 - a) + src, which Pillow only offers as alpha_composite over a full RGBA copy of the
+frame, the copy ROI compositing avoids; it would also round low-alpha edges differently from the old path.
+Хранится прямая, а не премультиплицированная альфа намеренно: Image.paste с альфой в качестве маски
+уже смешивает dst * (1 - a) + src * a за один проход на C только по области логотипа.
+Премультиплицированному варианту нужно dst * (1 - a) + src, что Pillow даёт лишь как alpha_composite
+поверх полной RGBA копии кадра, которой ROI композитинг избегает; к тому же края с малой альфой
+округлялись бы иначе, чем в прежнем пути.
+"""
+
+import hashlib
+import os
+import random
+import threading
+import uuid
+import numpy as np
+from PIL import Image
+from modules.image_processing import (
+    load_logo, logo_variant,
+    LOGO_BRIGHTNESS_RANGE, LOGO_CONTRAST_RANGE, LOGO_SATURATION_RANGE, LOGO_ALPHA_RANGE
+)
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+LOGO_VARIANTS_COUNT = 32  # Number of variants per logo / Количество вариантов на логотип
+LOGO_BANK_DIR_NAME = 'logo_bank'  # Bank directory next to Logo.png / Директория банка рядом с Logo.png
+MAX_LOADED_BANKS = 8  # Banks kept in memory per process / Банков в памяти на процесс
+
+# Per-process cache of loaded banks / Кэш загруженных банков в процессе
+_loaded_banks = {}
+_build_lock = threading.Lock()
+
+def logo_file_hash(logo_path):
+    """
+    Get SHA-256 hash of logo file / Получить SHA-256 хэш файла логотипа
+
+    Args:
+        logo_path (str): Path to Logo.png / Путь к Logo.png
+
+    Returns:
+        str or None: Hex digest or None if file doesn't exist / Hex-дайджест или None если файл не существует
+    """
+    if not os.path.exists(logo_path):
+        return None
+    sha = hashlib.sha256()
+    with open(logo_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def build_logo_variants(logo_rgba, count, seed):
+    """
+    Build randomized logo variants / Построить случайные варианты логотипа
+
+    Args:
+        logo_rgba (Image): Logo in RGBA mode / Логотип в режиме RGBA
+        count (int): Number of variants / Количество вариантов
+        seed (int): Seed for variant factors / Зерно для коэффициентов вариантов
+
+    Returns:
+        ndarray: Array of shape (count, h, w, 4) in RGBA / Массив формы (count, h, w, 4) в RGBA
+    """
+    # Local generator keeps the bank reproducible for the same logo / Локальный генератор делает банк воспроизводимым для одного логотипа
+    rng = random.Random(seed)
+    variants = []
+    for _ in range(count):
+        variant = logo_variant(
+            logo_rgba,
+            rng.uniform(*LOGO_BRIGHTNESS_RANGE),
+            rng.uniform(*LOGO_CONTRAST_RANGE),
+            rng.uniform(*LOGO_SATURATION_RANGE),
+            rng.uniform(*LOGO_ALPHA_RANGE),
+        )
+        variants.append(np.asarray(variant))
+    return np.stack(variants)
+
+def ensure_logo_bank(logo_path, count=LOGO_VARIANTS_COUNT):
+    """
+    Build logo bank for current Logo.png if missing / Построить банк логотипа для текущего Logo.png если его нет
+
+    Args:
+        logo_path (str): Path to Logo.png / Путь к Logo.png
+        count (int): Number of variants / Количество вариантов
+
+    Returns:
+        str or None: Path to bank file or None if there is no logo / Путь к файлу банка или None если логотипа нет
+
+    Banks of previous logos in the same directory are removed.
+    Банки предыдущих логотипов в той же директории удаляются.
+    """
+    digest = logo_file_hash(logo_path)
+    if digest is None:
+        return None
+
+    bank_dir = os.path.join(os.path.dirname(logo_path), LOGO_BANK_DIR_NAME)
+    bank_path = os.path.join(bank_dir, f"{digest}.rgba.npy")
+
+    with _build_lock:
+        if os.path.exists(bank_path):
+            return bank_path
+
+        logo = load_logo(logo_path)
+        if logo is None:
+            return None
+
+        variants = build_logo_variants(logo, count, int(digest[:16], 16))
+        os.makedirs(bank_dir, exist_ok=True)
+
+        # Write to a temp file unique per process and rename so readers never see a partial bank;
+        # the lock guards only this process, server and workers may build the same bank at once
+        # Пишем в уникальный для процесса временный файл и переименовываем, чтобы читатели не видели
+        # частичный банк; блокировка защищает только этот процесс, сервер и воркеры могут строить банк одновременно
+        tmp_path = f"{bank_path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, variants)
+        os.replace(tmp_path, bank_path)
+
+        # Remove banks of previous logos, temp files of other processes are left alone
+        # Удаляем банки предыдущих логотипов, временные файлы других процессов не трогаем
+        for name in os.listdir(bank_dir):
+            if name.endswith('.rgba.npy') and name != os.path.basename(bank_path):
+                try:
+                    os.remove(os.path.join(bank_dir, name))
+                except OSError:
+                    pass
+
+    log_message(f"🎨 Создан банк из {count} вариантов логотипа ({digest[:8]})")
+    return bank_path
+
+def load_logo_bank(bank_path):
+    """
+    Load logo bank into memory (cached per process) / Загрузить банк логотипа в память (с кэшем на процесс)
+
+    Args:
+        bank_path (str): Path to bank file / Путь к файлу банка
+
+    Returns:
+        list or None: List of RGBA Image variants or None / Список вариантов Image в RGBA или None
+    """
+    if not bank_path:
+        return None
+
+    bank = _loaded_banks.get(bank_path)
+    if bank is None:
+        arr = np.load(bank_path)
+        h, w = arr.shape[1:3]
+        bank = [Image.frombuffer("RGBA", (w, h), variant.tobytes(), "raw", "RGBA", 0, 1) for variant in arr]
+
+        # Bank files are immutable (named by hash), simple size bound is enough
+        # Файлы банков неизменяемы (имя по хэшу), достаточно простого ограничения размера
+        if len(_loaded_banks) >= MAX_LOADED_BANKS:
+            _loaded_banks.clear()
+        _loaded_banks[bank_path] = bank
+    return bank
@@ -0,0 +1,92 @@
+# filename="ready_counts.py"
+# server/modules/ready_counts.py
+# Ready Ads Counters Module / Модуль счётчиков готовых объявлений
+
+"""
+Ready Ads Counters Module / Модуль счётчиков готовых объявлений
+
+Number of ready ads per category is kept in a small index in the manager directory, so the
+dashboard gets all counts with one file read instead of walking ready_photos.
+Число готовых объявлений по категориям хранится в небольшом индексе в директории менеджера,
+поэтому панель получает все счётчики одним чтением файла вместо обхода ready_photos.
+
+The index lives inside the manager directory, so it moves with a renamed manager and is
+removed with a deleted one. Publishing and deleting update it; a missing index is rebuilt
+from disk (see rebuild_ready_counts in ad_processing and server/rebuild_ready_counts.py).
+Индекс лежит внутри директории менеджера, поэтому переезжает при переименовании менеджера и
+удаляется вместе с ним. Публикация и удаление обновляют его; отсутствующий индекс
+перестраивается с диска (см. rebuild_ready_counts в ad_processing и server/rebuild_ready_counts.py).
+"""
+
+import os
+import json
+import threading
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+READY_COUNTS_NAME = 'ready_counts.json'  # Index file in manager directory / Файл индекса в директории менеджера
+
+_counts_lock = threading.Lock()
+
+def load_ready_counts(manager_dir):
+    """
+    Load ready ads counters of a manager / Загрузить счётчики готовых объявлений менеджера
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+
+    Returns:
+        dict or None: Category -> number of ready ads, None if index is missing or unreadable
+                      Категория -> число готовых объявлений, None если индекс отсутствует или не читается
+    """
+    try:
+        with open(os.path.join(manager_dir, READY_COUNTS_NAME), encoding='utf-8') as f:
+            counts = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return counts if isinstance(counts, dict) else None
+
+def save_ready_counts(manager_dir, counts):
+    """
+    Replace ready ads counters of a manager atomically / Атомарно заменить счётчики готовых объявлений менеджера
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        counts (dict): Category -> number of ready ads / Категория -> число готовых объявлений
+    """
+    path = os.path.join(manager_dir, READY_COUNTS_NAME)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(counts, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _update(manager_dir, change):
+    """Apply change to counters under lock / Применить изменение к счётчикам под блокировкой"""
+    with _counts_lock:
+        counts = load_ready_counts(manager_dir)
+        # No index yet: the first read rebuilds it with this category included
+        # Индекса ещё нет: первое чтение перестроит его вместе с этой категорией
+        if counts is None:
+            return
+        change(counts)
+        save_ready_counts(manager_dir, counts)
+
+def set_ready_count(manager_dir, folder_name, count):
+    """
+    Set number of ready ads of a category / Установить число готовых объявлений категории
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        folder_name (str): Category folder name / Имя папки категории
+        count (int): Number of ready ads / Число готовых объявлений
+    """
+    _update(manager_dir, lambda counts: counts.__setitem__(folder_name, count))
+
+def drop_ready_count(manager_dir, folder_name):
+    """
+    Remove counter of a deleted category / Удалить счётчик удалённой категории
+
+    Args:
+        manager_dir (str): Manager directory / Директория менеджера
+        folder_name (str): Category folder name / Имя папки категории
+    """
+    _update(manager_dir, lambda counts: counts.pop(folder_name, None))
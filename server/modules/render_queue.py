@@ -0,0 +1,399 @@
+# filename="render_queue.py"
+# server/modules/render_queue.py
+# Distributed Render Queue Module / Модуль распределённой очереди отрисовки
+
+"""
+Distributed Render Queue Module / Модуль распределённой очереди отрисовки
+
+This module lets several processes or nodes with access to the shared data/managers tree
+render one uniquification job through Redis.
+Данный модуль позволяет нескольким процессам или узлам с доступом к общему дереву
+data/managers отрисовывать одну задачу уникализации через Redis.
+
+Keys under avito:img:rq: / Ключи под avito:img:rq::
+- queue - sorted set task id -> time when the task becomes visible / сортированное множество id задачи -> время, когда задача становится видимой
+- tasks - hash task id -> payload / хэш id задачи -> данные
+- attempts - hash task id -> claim count / хэш id задачи -> число захватов
+- job:<job_id> - job context with paths relative to data/managers / контекст задачи с путями относительно data/managers
+- results:<job_id> - list of task results for the server process / список результатов задач для серверного процесса
+
+A claim moves the task's visibility time forward by VISIBILITY_TIMEOUT; an ack removes it.
+Захват сдвигает время видимости задачи на VISIBILITY_TIMEOUT вперёд; подтверждение удаляет её.
+Tasks of dead workers become visible again and are retried up to MAX_ATTEMPTS times.
+Задачи упавших рабочих снова становятся видимыми и повторяются до MAX_ATTEMPTS раз.
+Renders are seeded, so a retried or duplicated task writes the same files.
+Отрисовка детерминирована зерном, поэтому повторная или дублированная задача пишет те же файлы.
+The server keeps the job context alive while the job runs; a task whose context is gone is
+acked with all photos failed, so the server never waits for it forever.
+Сервер продлевает контекст задачи, пока она выполняется; задача без контекста подтверждается
+со всеми фотографиями неудачными, поэтому сервер никогда не ждёт её бесконечно.
+"""
+
+import json
+import os
+import time
+import threading
+import concurrent.futures
+import redis
+from modules.redis_manager import redis_manager, REDIS_PREFIXES, CACHE_TTL
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+USE_RENDER_QUEUE = False  # Render through Redis queue instead of local pool / Отрисовывать через очередь Redis вместо локального пула
+QUEUE_WORKERS_HINT = 16  # Expected workers on all nodes, sizes chunks and window / Ожидаемое число рабочих на всех узлах, задаёт пачки и окно
+VISIBILITY_TIMEOUT = 120  # Seconds before an unacked task is retried / Секунд до повтора неподтверждённой задачи
+MAX_ATTEMPTS = 3  # Claims before a task is failed / Захватов до признания задачи неудачной
+POLL_INTERVAL = 0.5  # Idle worker sleep in seconds / Пауза простаивающего рабочего в секундах
+CLAIM_RETRIES = 5  # Optimistic claim retries under contention / Повторы оптимистичного захвата при конкуренции
+QUEUE_PREFIX = f"{REDIS_PREFIXES['image_processing']}rq:"  # Key prefix / Префикс ключей
+QUEUE_TTL = CACHE_TTL['image_processing']  # Lifetime of job context and results / Время жизни контекста и результатов задачи
+CONTEXT_REFRESH_INTERVAL = 60  # Seconds between TTL refreshes of a running job / Секунд между продлениями TTL выполняемой задачи
+
+QUEUE_KEY = f"{QUEUE_PREFIX}queue"
+TASKS_KEY = f"{QUEUE_PREFIX}tasks"
+ATTEMPTS_KEY = f"{QUEUE_PREFIX}attempts"
+
+# Per-process cache of job contexts / Кэш контекстов задач в процессе
+_contexts = {}
+MAX_CACHED_CONTEXTS = 4
+
+def context_key(job_id):
+    """Get Redis key of job context / Получить ключ Redis контекста задачи"""
+    return f"{QUEUE_PREFIX}job:{job_id}"
+
+def results_key(job_id):
+    """Get Redis key of job results list / Получить ключ Redis списка результатов задачи"""
+    return f"{QUEUE_PREFIX}results:{job_id}"
+
+def _get_client(client=None):
+    """Get given client or shared Redis client / Получить переданный клиент или общий клиент Redis"""
+    if client is not None:
+        return client
+    client = redis_manager.get_client()
+    if client is None:
+        raise RuntimeError("Redis недоступен")
+    return client
+
+def managers_root():
+    """Get local data/managers directory / Получить локальную директорию data/managers"""
+    from modules.ad_processing import BASE_DIR
+    return os.path.join(BASE_DIR, 'data', 'managers')
+
+def _relative(path, root):
+    """Path relative to managers root, None stays None / Путь относительно корня менеджеров, None остаётся None"""
+    return os.path.relpath(path, root) if path else path
+
+def _absolute(path, root):
+    """Path under local managers root, None stays None / Путь под локальным корнем менеджеров, None остаётся None"""
+    return os.path.join(root, path) if path else path
+
+# ============================================================================
+# QUEUE OPERATIONS / ОПЕРАЦИИ ОЧЕРЕДИ
+# ============================================================================
+
+def enqueue(task_id, payload, client=None):
+    """
+    Add task to the queue / Добавить задачу в очередь
+
+    Args:
+        task_id (str): Task id, unique across jobs / Id задачи, уникальный среди задач
+        payload (dict): Task data / Данные задачи
+        client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+    """
+    client = _get_client(client)
+    pipe = client.pipeline()
+    pipe.hset(TASKS_KEY, task_id, json.dumps(payload))
+    # Score is enqueue time, so tasks are claimed in FIFO order / Оценка - время постановки, поэтому задачи захватываются по порядку
+    pipe.zadd(QUEUE_KEY, {task_id: time.time()})
+    pipe.execute()
+
+def claim(client=None, now=None):
+    """
+    Claim next visible task / Захватить следующую видимую задачу
+
+    Args:
+        client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+        now (float): Current time, for tests / Текущее время, для тестов
+
+    Returns:
+        tuple or None: (task id, attempt number, payload) or None if queue is empty
+                       (id задачи, номер попытки, данные) или None если очередь пуста
+    """
+    client = _get_client(client)
+    now = time.time() if now is None else now
+    for _ in range(CLAIM_RETRIES):
+        with client.pipeline() as pipe:
+            try:
+                # Optimistic transaction: fails if another worker touched the queue
+                # Оптимистичная транзакция: не проходит, если другой рабочий изменил очередь
+                pipe.watch(QUEUE_KEY)
+                ids = pipe.zrangebyscore(QUEUE_KEY, '-inf', now, start=0, num=1)
+                if not ids:
+                    pipe.unwatch()
+                    return None
+                task_id = ids[0]
+                pipe.multi()
+                pipe.zadd(QUEUE_KEY, {task_id: now + VISIBILITY_TIMEOUT})
+                pipe.hincrby(ATTEMPTS_KEY, task_id, 1)
+                pipe.hget(TASKS_KEY, task_id)
+                _, attempts, payload = pipe.execute()
+            except redis.WatchError:
+                continue
+        if payload is None:
+            # Task was acked between range and claim / Задача подтверждена между выборкой и захватом
+            client.zrem(QUEUE_KEY, task_id)
+            continue
+        return task_id, int(attempts), json.loads(payload)
+    return None
+
+def ack(task_id, job_id, result, client=None):
+    """
+    Remove finished task and publish its result / Удалить завершённую задачу и опубликовать её результат
+
+    Args:
+        task_id (str): Task id / Id задачи
+        job_id (str): Job id / Id задачи уникализации
+        result (dict): Task result / Результат задачи
+        client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+    """
+    client = _get_client(client)
+    pipe = client.pipeline()
+    pipe.zrem(QUEUE_KEY, task_id)
+    pipe.hdel(TASKS_KEY, task_id)
+    pipe.hdel(ATTEMPTS_KEY, task_id)
+    pipe.rpush(results_key(job_id), json.dumps(dict(result, task_id=task_id)))
+    pipe.expire(results_key(job_id), QUEUE_TTL)
+    pipe.execute()
+
+def remove_tasks(task_ids, client=None):
+    """
+    Drop tasks without results (cancelled job) / Удалить задачи без результатов (отменённая задача)
+
+    Args:
+        task_ids (iterable): Task ids / Id задач
+        client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+    """
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    client = _get_client(client)
+    pipe = client.pipeline()
+    pipe.zrem(QUEUE_KEY, *task_ids)
+    pipe.hdel(TASKS_KEY, *task_ids)
+    pipe.hdel(ATTEMPTS_KEY, *task_ids)
+    pipe.execute()
+
+def queue_depth(client=None):
+    """
+    Get number of queued and running tasks / Получить число задач в очереди и в работе
+
+    Args:
+        client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+
+    Returns:
+        int: Task count / Число задач
+    """
+    return _get_client(client).zcard(QUEUE_KEY)
+
+# ============================================================================
+# JOB CONTEXT / КОНТЕКСТ ЗАДАЧИ
+# ============================================================================
+
+def publish_context(job_id, context, client=None):
+    """
+    Publish job context with paths relative to data/managers / Опубликовать контекст задачи с путями относительно data/managers
+
+    Args:
+        job_id (str): Job id / Id задачи
+        context (dict): Job context as for render_photos_with_context / Контекст задачи как для render_photos_with_context
+        client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+    """
+    root = managers_root()
+    shared = dict(
+        context,
+        position_sources=[[_relative(f, root) for f in files] for files in context['position_sources']],
+        logo_bank_path=_relative(context['logo_bank_path'], root),
+        local_ready_base=_relative(context['local_ready_base'], root),
+        # Shared memory cache is local to one node / Кэш в общей памяти локален для одного узла
+        source_cache=False,
+    )
+    _get_client(client).set(context_key(job_id), json.dumps(shared), ex=QUEUE_TTL)
+
+def load_context(job_id, client=None):
+    """
+    Load job context with local paths (cached per process) / Загрузить контекст задачи с локальными путями (с кэшем на процесс)
+
+    Args:
+        job_id (str): Job id / Id задачи
+        client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+
+    Returns:
+        dict or None: Job context or None if job is gone / Контекст задачи или None если задачи больше нет
+    """
+    context = _contexts.get(job_id)
+    if context is None:
+        raw = _get_client(client).get(context_key(job_id))
+        if raw is None:
+            return None
+        root = managers_root()
+        context = json.loads(raw)
+        context['position_sources'] = [[_absolute(f, root) for f in files] for files in context['position_sources']]
+        context['logo_bank_path'] = _absolute(context['logo_bank_path'], root)
+        context['local_ready_base'] = _absolute(context['local_ready_base'], root)
+        if len(_contexts) >= MAX_CACHED_CONTEXTS:
+            _contexts.clear()
+        _contexts[job_id] = context
+    return context
+
+# ============================================================================
+# WORKER MODE / РЕЖИМ РАБОЧЕГО
+# ============================================================================
+
+def process_task(task_id, attempts, payload, client=None):
+    """
+    Render one claimed task and ack it / Отрисовать одну захваченную задачу и подтвердить её
+
+    Args:
+        task_id (str): Task id / Id задачи
+        attempts (int): Claim count including this one / Число захватов включая этот
+        payload (dict): Task data with job_id and photos / Данные задачи с job_id и photos
+        client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+    """
+    from modules.ad_processing import render_photos_with_context, ad_dir_name
+
+    job_id = payload['job_id']
+    photos = [tuple(photo) for photo in payload['photos']]
+    failed = [(i, j, False) for i, seed, j in photos]
+
+    # Task keeps failing (crashes the worker), give up on its ads / Задача продолжает падать (роняет рабочего), отказываемся от её объявлений
+    if attempts > MAX_ATTEMPTS:
+        log_message(f"❌ Задача очереди {task_id} не выполнена за {MAX_ATTEMPTS} попыток")
+        ack(task_id, job_id, {'done': failed}, client)
+        return
+
+    context = load_context(job_id, client)
+    if context is None:
+        # Job was finished, cancelled or its context expired: fail the photos so a waiting server is not stuck
+        # Задача завершена, отменена или её контекст истёк: проваливаем фотографии, чтобы ожидающий сервер не завис
+        log_message(f"⚠️ Контекст задачи {job_id} не найден, задача очереди {task_id} пропущена")
+        ack(task_id, job_id, {'done': failed}, client)
+        return
+
+    # Ad directories may not exist yet on this node / Директорий объявлений на этом узле может ещё не быть
+    for i in {photo[0] for photo in photos}:
+        os.makedirs(os.path.join(context['local_ready_base'], ad_dir_name(i, context['stamp'])), exist_ok=True)
+
+    done, _ = render_photos_with_context(context, photos)
+    ack(task_id, job_id, {'done': done}, client)
+
+def run_worker(client=None, stop_event=None, max_tasks=None):
+    """
+    Pull and render tasks until stopped / Забирать и отрисовывать задачи до остановки
+
+    Args:
+        client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+        stop_event (threading.Event): Stops the loop when set / Останавливает цикл при установке
+        max_tasks (int): Exit after this many tasks / Выйти после стольких задач
+
+    Returns:
+        int: Number of processed tasks / Число обработанных задач
+    """
+    processed = 0
+    while not (stop_event and stop_event.is_set()):
+        if max_tasks is not None and processed >= max_tasks:
+            break
+        try:
+            claimed = claim(client)
+        except redis.RedisError as e:
+            log_message(f"⚠️ Очередь отрисовки недоступна: {e}")
+            time.sleep(POLL_INTERVAL * 10)
+            continue
+        if claimed is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        process_task(*claimed, client=client)
+        processed += 1
+    return processed
+
+# ============================================================================
+# SERVER SIDE / СТОРОНА СЕРВЕРА
+# ============================================================================
+
+class QueueJob:
+    """Submit job tasks to the queue and collect results as futures / Отправка задач в очередь и сбор результатов как futures"""
+
+    def __init__(self, job_id, context, client=None):
+        """
+        Args:
+            job_id (str): Job id / Id задачи
+            context (dict): Job context with local paths / Контекст задачи с локальными путями
+            client: Redis client, None uses shared connection / Клиент Redis, None - общее подключение
+        """
+        self.job_id = job_id
+        self.client = _get_client(client)
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.closed = threading.Event()
+        publish_context(job_id, context, self.client)
+        self.pump = threading.Thread(target=self._pump_results, daemon=True)
+        self.pump.start()
+
+    def submit(self, photos):
+        """
+        Enqueue a chunk of photos / Поставить пачку фотографий в очередь
+
+        Args:
+            photos (list): List of (ad index, ad seed, position) / Список (индекс объявления, зерно объявления, позиция)
+
+        Returns:
+            Future: Resolves to the same value as render_photos / Разрешается тем же значением, что и render_photos
+        """
+        future = concurrent.futures.Future()
+        with self.lock:
+            task_id = f"{self.job_id}:{self.counter}"
+            self.counter += 1
+            self.futures[task_id] = future
+        enqueue(task_id, {'job_id': self.job_id, 'photos': photos}, self.client)
+        return future
+
+    def _refresh_ttl(self):
+        """Keep context and results alive while the job runs / Продлевать контекст и результаты, пока задача выполняется"""
+        pipe = self.client.pipeline()
+        pipe.expire(context_key(self.job_id), QUEUE_TTL)
+        pipe.expire(results_key(self.job_id), QUEUE_TTL)
+        pipe.execute()
+
+    def _pump_results(self):
+        """Move results from Redis to futures / Переносить результаты из Redis в futures"""
+        refreshed = time.time()
+        while not self.closed.is_set():
+            try:
+                if time.time() - refreshed >= CONTEXT_REFRESH_INTERVAL:
+                    self._refresh_ttl()
+                    refreshed = time.time()
+                item = self.client.blpop(results_key(self.job_id), timeout=1)
+            except redis.RedisError as e:
+                log_message(f"⚠️ Ошибка чтения результатов очереди: {e}")
+                time.sleep(POLL_INTERVAL)
+                continue
+            if item is None:
+                continue
+            result = json.loads(item[1])
+            # Retried task may report twice, first result wins / Повторённая задача может ответить дважды, побеждает первый результат
+            with self.lock:
+                future = self.futures.pop(result['task_id'], None)
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_result(([tuple(d) for d in result['done']], []))
+
+    def close(self):
+        """Stop collecting results and drop unfinished tasks / Прекратить сбор результатов и удалить незавершённые задачи"""
+        self.closed.set()
+        self.pump.join()
+        with self.lock:
+            pending = list(self.futures)
+            for future in self.futures.values():
+                future.cancel()
+            self.futures.clear()
+        remove_tasks(pending, self.client)
+        self.client.delete(context_key(self.job_id), results_key(self.job_id))
@@ -0,0 +1,167 @@
+# filename="result_sinks.py"
+# server/modules/result_sinks.py
+# Result Sinks Module / Модуль приёмников результатов
+
+"""
+Result Sinks Module / Модуль приёмников результатов
+
+This module receives finished ads from process_and_generate as soon as they are ready,
+so large jobs don't keep all rows in the server process.
+Данный модуль принимает готовые объявления из process_and_generate сразу по готовности,
+чтобы большие задачи не держали все строки в серверном процессе.
+
+Rows arrive in completion order as [ad number, links]; every sink has write(row), close(),
+fail(error) and result(). A failed job still closes its sink and returns result() with the error.
+Строки приходят в порядке готовности как [номер объявления, ссылки]; у каждого приёмника
+есть write(row), close(), fail(error) и result(). Проваленная задача всё равно закрывает приёмник
+и возвращает result() с ошибкой.
+"""
+
+import json
+import os
+import requests
+from modules.redis_manager import redis_manager, REDIS_PREFIXES, CACHE_TTL
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+HTTP_SINK_BATCH = 100  # Rows per HTTP request / Строк на HTTP запрос
+HTTP_SINK_TIMEOUT = 10  # HTTP request timeout in seconds / Таймаут HTTP запроса в секундах
+
+class ResultSink:
+    """Common part of result sinks / Общая часть приёмников результатов"""
+
+    error = None
+
+    def fail(self, error):
+        """
+        Mark the job as failed, result() reports it / Отметить задачу проваленной, result() сообщает об этом
+
+        Args:
+            error (str): Error message / Сообщение об ошибке
+        """
+        self.error = error
+
+    def close(self):
+        pass
+
+class ListSink(ResultSink):
+    """Keep rows in memory, result sorted by ad number / Хранить строки в памяти, результат отсортирован по номеру"""
+
+    def __init__(self):
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+
+    def result(self):
+        """
+        Returns:
+            list: Rows in ad order, empty if the job failed / Строки в порядке объявлений, пустой если задача провалилась
+        """
+        if self.error:
+            return []
+        self.rows.sort(key=lambda row: row[0])
+        return self.rows
+
+class FileSink(ResultSink):
+    """Append rows to a JSON Lines file / Дописывать строки в файл JSON Lines"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Output file, replaced atomically on close / Выходной файл, заменяется атомарно при закрытии
+        """
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(self.tmp_path, 'w', encoding='utf-8')
+
+    def write(self, row):
+        self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+            os.replace(self.tmp_path, self.path)
+
+    def result(self):
+        """
+        Returns:
+            dict: File path, row count and error / Путь к файлу, число строк и ошибка
+        """
+        return {'path': self.path, 'count': self.count, 'error': self.error}
+
+class RedisSink(ResultSink):
+    """Push rows to a Redis list under temp_data prefix / Добавлять строки в список Redis с префиксом temp_data"""
+
+    def __init__(self, key, ttl=None):
+        """
+        Args:
+            key (str): List key without prefix / Ключ списка без префикса
+            ttl (int): Time to live in seconds / Время жизни в секундах
+        """
+        self.key = f"{REDIS_PREFIXES['temp_data']}{key}"
+        self.ttl = ttl or CACHE_TTL['temp_data']
+        self.count = 0
+        self.client = redis_manager.get_client()
+        if self.client is None:
+            raise RuntimeError("Redis недоступен")
+        self.client.delete(self.key)
+
+    def write(self, row):
+        pipe = self.client.pipeline()
+        pipe.rpush(self.key, json.dumps(row, ensure_ascii=False))
+        pipe.expire(self.key, self.ttl)
+        pipe.execute()
+        self.count += 1
+
+    def result(self):
+        """
+        Returns:
+            dict: Redis key, row count and error / Ключ Redis, число строк и ошибка
+        """
+        return {'key': self.key, 'count': self.count, 'error': self.error}
+
+class HttpSink(ResultSink):
+    """POST rows in batches to a URL as JSON / Отправлять строки пачками на URL в формате JSON"""
+
+    def __init__(self, url, batch_size=HTTP_SINK_BATCH):
+        """
+        Args:
+            url (str): Receiver URL / URL получателя
+            batch_size (int): Rows per request / Строк на запрос
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.batch = []
+        self.count = 0
+
+    def write(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send buffered rows / Отправить накопленные строки"""
+        if not self.batch:
+            return
+        try:
+            response = requests.post(self.url, json={'rows': self.batch}, timeout=HTTP_SINK_TIMEOUT)
+            response.raise_for_status()
+            self.count += len(self.batch)
+        except requests.RequestException as e:
+            # Ads stay on disk, only the notification is lost / Объявления остаются на диске, теряется только уведомление
+            log_message(f"⚠️ Не удалось отправить {len(self.batch)} строк на {self.url}: {e}")
+        self.batch = []
+
+    def close(self):
+        self.flush()
+
+    def result(self):
+        """
+        Returns:
+            dict: URL, number of delivered rows and error / URL, число доставленных строк и ошибка
+        """
+        return {'url': self.url, 'count': self.count, 'error': self.error}
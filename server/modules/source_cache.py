@@ -0,0 +1,273 @@
+# filename="source_cache.py"
+# server/modules/source_cache.py
+# Decoded Source Cache Module / Модуль кэша декодированных исходников
+
+"""
+Decoded Source Cache Module / Модуль кэша декодированных исходников
+
+This module keeps source photos decoded at working size in shared memory for the duration
+of a uniquification job, so worker processes map them zero-copy instead of decoding the
+same JPEG for every ad.
+Данный модуль хранит исходные фотографии, декодированные в рабочем размере, в общей памяти
+на время задачи уникализации, чтобы рабочие процессы отображали их без копирования вместо
+повторного декодирования одного и того же JPEG для каждого объявления.
+
+Segment names are derived from job id and source path, so workers need no index:
+Имена сегментов выводятся из id задачи и пути исходника, поэтому рабочим не нужен индекс:
+- worker: attach to segment, or decode and publish it / рабочий: подключиться к сегменту или декодировать и опубликовать его
+- parent: keeps LRU order and memory budget from task reports, unlinks evicted segments
+  родитель: ведёт порядок LRU и бюджет памяти по отчётам задач, удаляет вытесненные сегменты
+
+The budget is shared by all running jobs of the server process, so concurrent jobs don't
+pin a budget each.
+Бюджет общий для всех выполняемых задач серверного процесса, поэтому одновременные задачи
+не занимают по бюджету каждая.
+"""
+
+import hashlib
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from PIL import Image
+from modules.image_processing import load_image, working_size
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+USE_SOURCE_CACHE = True  # Share decoded sources between workers / Делиться декодированными исходниками между рабочими
+SOURCE_CACHE_BUDGET_MB = 1024  # Memory budget of all jobs in MB / Бюджет памяти всех задач в МБ
+SHM_PREFIX = 'avsrc'  # Shared memory name prefix / Префикс имён общей памяти
+
+# Segment header: magic, width, height (written last, marks segment as ready)
+# Заголовок сегмента: магия, ширина, высота (пишется последним, помечает сегмент готовым)
+HEADER = struct.Struct('<4sII')
+MAGIC = b'AVS1'
+
+def segment_name(job_id, path):
+    """
+    Get shared memory segment name for a source / Получить имя сегмента общей памяти для исходника
+
+    Args:
+        job_id (str): Job id / Id задачи
+        path (str): Source file path / Путь к исходному файлу
+
+    Returns:
+        str: Segment name (short enough for all platforms) / Имя сегмента (достаточно короткое для всех платформ)
+    """
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+    return f"{SHM_PREFIX}_{job_id}_{digest}"
+
+def decode_source(path, max_size):
+    """
+    Decode source at exact working size / Декодировать исходник в точном рабочем размере
+
+    Args:
+        path (str): Source file path / Путь к исходному файлу
+        max_size (int or None): Max long side in px / Максимальная длинная сторона в px
+
+    Returns:
+        Image: RGB image / Изображение RGB
+    """
+    im = load_image(path, max_size)
+    size = working_size(im.size, max_size)
+    if im.size != size:
+        im = im.resize(size, Image.LANCZOS)
+    return im
+
+def untrack_segment(shm):
+    """
+    Stop this process's resource tracker from unlinking the segment on exit
+    Запретить трекеру ресурсов этого процесса удалять сегмент при выходе
+
+    Segment lifetime belongs to the parent SourceCache, not to the worker that touched it.
+    Временем жизни сегмента владеет родительский SourceCache, а не рабочий, который его открыл.
+    """
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+def _attach(name):
+    """Attach to ready segment or return None / Подключиться к готовому сегменту или вернуть None"""
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except (FileNotFoundError, ValueError):
+        # ValueError: created by another worker but not sized yet (empty file can't be mapped)
+        # ValueError: создан другим рабочим, но ещё без размера (пустой файл нельзя отобразить)
+        return None, None
+    untrack_segment(shm)
+    if shm.size < HEADER.size:
+        shm.close()
+        return None, None
+    magic, w, h = HEADER.unpack_from(shm.buf, 0)
+    if magic != MAGIC:
+        # Segment is still being written by another worker / Сегмент ещё записывается другим рабочим
+        shm.close()
+        return None, None
+    im = Image.frombuffer("RGB", (w, h), shm.buf[HEADER.size:HEADER.size + w * h * 3], "raw", "RGB", 0, 1)
+    return shm, im
+
+def _publish(name, im):
+    """Copy image into new segment, return its size or 0 / Скопировать изображение в новый сегмент, вернуть размер или 0"""
+    w, h = im.size
+    nbytes = HEADER.size + w * h * 3
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+    except FileExistsError:
+        # Another worker published it first / Другой рабочий опубликовал его раньше
+        return 0
+    untrack_segment(shm)
+    try:
+        shm.buf[HEADER.size:nbytes] = im.tobytes()
+        HEADER.pack_into(shm.buf, 0, MAGIC, w, h)
+    finally:
+        shm.close()
+    return nbytes
+
+@contextmanager
+def open_source(job_id, path, max_size, events):
+    """
+    Open decoded source from shared cache (worker side) / Открыть декодированный исходник из общего кэша (сторона рабочего)
+
+    Args:
+        job_id (str or None): Job id, None disables the cache / Id задачи, None отключает кэш
+        path (str): Source file path / Путь к исходному файлу
+        max_size (int or None): Max long side in px / Максимальная длинная сторона в px
+        events (list): Receives ('hit', name, 0) or ('put', name, nbytes) for the parent / Получает события для родителя
+
+    Yields:
+        Image: Read-only RGB image at working size / Изображение RGB рабочего размера только для чтения
+    """
+    if not job_id or not USE_SOURCE_CACHE:
+        yield decode_source(path, max_size)
+        return
+
+    name = segment_name(job_id, path)
+    shm, im = _attach(name)
+    if shm is None:
+        im = decode_source(path, max_size)
+        nbytes = _publish(name, im)
+        if nbytes:
+            events.append(('put', name, nbytes))
+        yield im
+        return
+
+    events.append(('hit', name, 0))
+    try:
+        yield im
+    finally:
+        # Buffer must be released before the mapping is closed / Буфер нужно освободить до закрытия отображения
+        del im
+        try:
+            shm.close()
+        except BufferError:
+            # Caller still holds a view (e.g. in a traceback): the mapping is closed when it is collected,
+            # the original error is not replaced
+            # Вызывающий ещё держит представление (например, в traceback): отображение закроется при сборке,
+            # исходная ошибка не подменяется
+            pass
+
+def unlink_segment(name):
+    """Unlink segment if it exists / Удалить сегмент если он существует"""
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    shm.unlink()
+    return True
+
+class SourceBudget:
+    """LRU memory budget shared by source caches of all jobs (parent side) / LRU бюджет памяти, общий для кэшей исходников всех задач (сторона родителя)"""
+
+    def __init__(self, budget_mb=SOURCE_CACHE_BUDGET_MB):
+        """
+        Args:
+            budget_mb (int): Memory budget in MB / Бюджет памяти в МБ
+        """
+        self.budget = budget_mb * 1024 * 1024
+        self.entries = OrderedDict()  # name -> (nbytes, SourceCache), oldest first / имя -> (байты, SourceCache), старые первыми
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def record(self, cache, events):
+        """
+        Apply worker events of a job and evict over budget / Применить события рабочих задачи и вытеснить сверх бюджета
+
+        Args:
+            cache (SourceCache): Cache of the job / Кэш задачи
+            events (list): Events from open_source / События из open_source
+        """
+        evicted = []
+        with self.lock:
+            for kind, name, nbytes in events:
+                if kind == 'put':
+                    cache.misses += 1
+                    if name not in self.entries:
+                        self.entries[name] = (nbytes, cache)
+                        self.used += nbytes
+                else:
+                    cache.hits += 1
+                if name in self.entries:
+                    self.entries.move_to_end(name)
+
+            # Budget is enforced after the fact, overshoot is bounded by tasks in flight;
+            # the oldest segment goes first whichever job it belongs to
+            # Бюджет соблюдается постфактум, превышение ограничено задачами в работе;
+            # первым уходит самый старый сегмент, какой бы задаче он ни принадлежал
+            while self.used > self.budget and self.entries:
+                name, (nbytes, owner) = self.entries.popitem(last=False)
+                self.used -= nbytes
+                owner.evicted += 1
+                evicted.append(name)
+        for name in evicted:
+            unlink_segment(name)
+
+    def release(self, cache):
+        """
+        Forget all segments of a job / Забыть все сегменты задачи
+
+        Args:
+            cache (SourceCache): Cache of the finished job / Кэш завершённой задачи
+        """
+        with self.lock:
+            for name in [name for name, (_, owner) in self.entries.items() if owner is cache]:
+                self.used -= self.entries.pop(name)[0]
+
+# Budget of the server process / Бюджет серверного процесса
+_budget = SourceBudget()
+
+class SourceCache:
+    """Per-job index of shared decoded sources (parent side) / Индекс общих декодированных исходников задачи (сторона родителя)"""
+
+    def __init__(self, job_id, paths, budget=None):
+        """
+        Args:
+            job_id (str): Job id used in segment names / Id задачи в именах сегментов
+            paths (iterable): All source paths of the job / Все пути исходников задачи
+            budget (SourceBudget): Shared budget, None uses the process-wide one / Общий бюджет, None - общий для процесса
+        """
+        self.job_id = job_id
+        self.paths = set(paths)
+        self.budget = budget or _budget
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def record(self, events):
+        """
+        Apply worker events and evict over budget / Применить события рабочих и вытеснить сверх бюджета
+
+        Args:
+            events (list): Events from open_source / События из open_source
+        """
+        self.budget.record(self, events)
+
+    def close(self):
+        """Unlink all segments of the job / Удалить все сегменты задачи"""
+        self.budget.release(self)
+        # Sweep all candidate names, covers segments of crashed workers / Проходим все возможные имена, покрывает сегменты упавших рабочих
+        for path in self.paths:
+            unlink_segment(segment_name(self.job_id, path))
+        log_message(f"🧠 Кэш исходников: попаданий {self.hits}, декодирований {self.misses}, вытеснено {self.evicted}")
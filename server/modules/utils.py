@@ -12,8 +12,13 @@ This module provides helper functions for logging, timestamp generation, request
 
 import pytz
 from datetime import datetime
+from contextlib import contextmanager
+import threading
 import os
 
+# Manager of the current thread for log lines / Менеджер текущего потока для строк лога
+_log_context = threading.local()
+
 def get_timestamp():
     """
     Get current timestamp in Moscow timezone / Получить текущую временную метку в московском часовом поясе
@@ -37,6 +42,9 @@ def log_message(message):
     - Appends to log file 'logs/main.txt' / Добавляет в лог-файл 'logs/main.txt'
     """
     timestamp = get_timestamp()
+    manager = getattr(_log_context, 'manager', None)
+    if manager:
+        message = f"{log_tag(manager)} {message}"
     log_entry = f"{timestamp} - {message}"
     print(log_entry)
     
@@ -49,6 +57,33 @@ def log_message(message):
     with open(log_path, "a", encoding="utf-8") as f:
         f.write(log_entry + "\n")
 
+def log_tag(manager):
+    """
+    Get tag that marks log lines of a manager / Получить метку, которой помечаются строки лога менеджера
+    
+    Args:
+        manager (str): Manager name / Имя менеджера
+    
+    Returns:
+        str: Tag like "[manager]" / Метка вида "[manager]"
+    """
+    return f"[{manager}]"
+
+@contextmanager
+def log_context(manager):
+    """
+    Tag log lines of this thread with a manager / Помечать строки лога этого потока менеджером
+    
+    Args:
+        manager (str): Manager name / Имя менеджера
+    """
+    previous = getattr(_log_context, 'manager', None)
+    _log_context.manager = manager
+    try:
+        yield
+    finally:
+        _log_context.manager = previous
+
 def is_suspicious_request():
     """
     Check if current request is suspicious / Проверить, является ли текущий запрос подозрительным
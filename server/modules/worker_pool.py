@@ -0,0 +1,180 @@
+# filename="worker_pool.py"
+# server/modules/worker_pool.py
+# Worker Pool Module / Модуль пула рабочих процессов
+
+"""
+Worker Pool Module / Модуль пула рабочих процессов
+
+This module keeps one long-lived process pool per server process for image uniquification,
+so jobs don't pay process spawn and PIL/NumPy import on every call.
+Данный модуль держит один долгоживущий пул процессов на серверный процесс для уникализации
+изображений, чтобы задачи не платили за запуск процессов и импорт PIL/NumPy при каждом вызове.
+
+Features / Функции:
+- Lazy start on first job / Ленивый запуск при первой задаче
+- Size from CPU count and memory budget / Размер по числу CPU и бюджету памяти
+- Worker recycling after MAX_TASKS_PER_CHILD tasks / Перезапуск рабочих после MAX_TASKS_PER_CHILD задач
+- Heavy modules preloaded in forkserver and worker initializer / Тяжёлые модули предзагружаются в forkserver и инициализаторе рабочих
+- Automatic restart of a broken pool / Автоматический перезапуск сломанного пула
+- Small separate pool for lazy photo renders, so page requests don't wait behind job tasks
+  Небольшой отдельный пул для отложенной отрисовки фото, чтобы запросы страниц не ждали за задачами
+"""
+
+import os
+import sys
+import signal
+import threading
+import multiprocessing
+import concurrent.futures
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+MAX_WORKERS = None  # Fixed pool size, None sizes from CPU and memory / Фиксированный размер пула, None - по CPU и памяти
+WORKER_MEMORY_MB = 400  # Expected peak memory per worker in MB / Ожидаемый пик памяти на рабочего в МБ
+MEMORY_BUDGET_FRACTION = 0.5  # Share of physical memory for workers / Доля физической памяти для рабочих
+MAX_TASKS_PER_CHILD = 500  # Tasks before a worker is replaced, bounds leaks / Задач до замены рабочего, ограничивает утечки
+LAZY_POOL_SIZE = 2  # Workers of the lazy render pool / Рабочих в пуле отложенной отрисовки
+PRELOAD_MODULES = [  # Imported once in forkserver and every worker / Импортируются один раз в forkserver и каждом рабочем
+    'numpy',
+    'PIL.Image',
+    'modules.image_processing',
+    'modules.logo_bank',
+    'modules.source_cache',
+    'modules.job_context',
+    'modules.lazy_render',
+    'modules.ad_processing',
+]
+
+# Global pool instance / Глобальный экземпляр пула
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+_lazy_pool = None
+
+def physical_memory_mb():
+    """
+    Get total physical memory / Получить общий объём физической памяти
+
+    Returns:
+        int or None: Memory in MB or None if unknown / Память в МБ или None если неизвестно
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def pool_size():
+    """
+    Compute worker count from CPU count and memory budget / Вычислить число рабочих по CPU и бюджету памяти
+
+    Returns:
+        int: Number of worker processes / Количество рабочих процессов
+    """
+    if MAX_WORKERS:
+        return MAX_WORKERS
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    memory = physical_memory_mb()
+    if memory:
+        cpus = min(cpus, int(memory * MEMORY_BUDGET_FRACTION) // WORKER_MEMORY_MB)
+    return max(1, cpus)
+
+def _init_worker():
+    """
+    Worker initializer: preload heavy modules / Инициализатор рабочего: предзагрузка тяжёлых модулей
+
+    Ctrl+C is handled by the server process, workers ignore it.
+    Ctrl+C обрабатывает серверный процесс, рабочие его игнорируют.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name in PRELOAD_MODULES:
+        __import__(name)
+
+def _mp_context():
+    """Get multiprocessing context for the pool / Получить контекст multiprocessing для пула"""
+    # Recycling requires spawn or forkserver / Перезапуск рабочих требует spawn или forkserver
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(PRELOAD_MODULES)
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+def _create_pool(size):
+    """Create process pool / Создать пул процессов"""
+    kwargs = {
+        'max_workers': size,
+        'mp_context': _mp_context(),
+        'initializer': _init_worker,
+    }
+    # max_tasks_per_child appeared in Python 3.11 / max_tasks_per_child появился в Python 3.11
+    if sys.version_info >= (3, 11) and MAX_TASKS_PER_CHILD:
+        kwargs['max_tasks_per_child'] = MAX_TASKS_PER_CHILD
+    return concurrent.futures.ProcessPoolExecutor(**kwargs)
+
+def get_worker_pool():
+    """
+    Get shared worker pool, starting it lazily / Получить общий пул рабочих, запуская его лениво
+
+    Returns:
+        ProcessPoolExecutor: Long-lived pool, must not be shut down by callers / Долгоживущий пул, вызывающие не должны его останавливать
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        _pool = _drop_broken(_pool)
+        if _pool is None:
+            _pool_size = pool_size()
+            _pool = _create_pool(_pool_size)
+            log_message(f"⚙️ Запущен пул из {_pool_size} рабочих процессов")
+        return _pool
+
+def _drop_broken(pool):
+    """Shut down a broken pool (worker killed) so it is replaced / Остановить сломанный пул (рабочий убит), чтобы он был заменён"""
+    if pool is not None and getattr(pool, '_broken', False):
+        log_message("⚠️ Пул рабочих процессов сломан, перезапуск")
+        pool.shutdown(wait=False, cancel_futures=True)
+        return None
+    return pool
+
+def get_lazy_pool():
+    """
+    Get pool for lazy photo renders, starting it lazily / Получить пул отложенной отрисовки фото, запуская его лениво
+
+    Returns:
+        ProcessPoolExecutor: Long-lived pool of LAZY_POOL_SIZE workers / Долгоживущий пул из LAZY_POOL_SIZE рабочих
+    """
+    global _lazy_pool
+    with _pool_lock:
+        _lazy_pool = _drop_broken(_lazy_pool)
+        if _lazy_pool is None:
+            _lazy_pool = _create_pool(LAZY_POOL_SIZE)
+            log_message(f"⚙️ Запущен пул отложенной отрисовки из {LAZY_POOL_SIZE} рабочих процессов")
+        return _lazy_pool
+
+def get_worker_pool_size():
+    """
+    Get number of workers in the pool / Получить число рабочих в пуле
+
+    Returns:
+        int: Worker count (planned size if pool is not started) / Число рабочих (плановый размер если пул не запущен)
+    """
+    return _pool_size or pool_size()
+
+def shutdown_worker_pool(wait=True):
+    """
+    Shut down shared worker pool and lazy render pool / Остановить общий пул рабочих и пул отложенной отрисовки
+
+    Args:
+        wait (bool): Wait for running tasks / Ждать выполняющиеся задачи
+    """
+    global _pool, _pool_size, _lazy_pool
+    with _pool_lock:
+        if _lazy_pool is not None:
+            _lazy_pool.shutdown(wait=wait, cancel_futures=True)
+            _lazy_pool = None
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
+            _pool_size = 0
+            log_message("🛑 Пул рабочих процессов остановлен")
@@ -0,0 +1,46 @@
+# server/rebuild_ready_counts.py
+# Ready Ads Counters Rebuild / Перестроение счётчиков готовых объявлений
+
+"""
+Ready Ads Counters Rebuild / Перестроение счётчиков готовых объявлений
+
+Recounts ready ads of every category from disk and rewrites the counters index
+(modules/ready_counts.py) and the ads manifests. Run after ready_photos was changed
+outside the server or to check that counters are consistent.
+Пересчитывает готовые объявления каждой категории с диска и перезаписывает индекс
+счётчиков (modules/ready_counts.py) и манифесты объявлений. Запускается после изменения
+ready_photos в обход сервера или для проверки согласованности счётчиков.
+
+Usage / Использование:
+    cd server
+    python rebuild_ready_counts.py [--trust-manifests] [manager ...]
+
+    --trust-manifests: count from existing ads manifests instead of rescanning ad directories
+                       считать по существующим манифестам объявлений вместо перечитывания директорий объявлений
+"""
+
+import os
+import sys
+from modules.ad_processing import BASE_DIR, rebuild_ready_counts
+from modules.ready_counts import load_ready_counts
+from modules.utils import log_message
+
+if __name__ == "__main__":
+    managers_dir = os.path.join(BASE_DIR, 'data', 'managers')
+    if not os.path.isdir(managers_dir):
+        log_message(f"❌ Директория менеджеров {managers_dir} не найдена")
+        sys.exit(1)
+    args = sys.argv[1:]
+    trust_manifests = '--trust-manifests' in args
+    args = [arg for arg in args if arg != '--trust-manifests']
+    managers = args or sorted(d for d in os.listdir(managers_dir) if os.path.isdir(os.path.join(managers_dir, d)))
+    for manager in managers:
+        manager_dir = os.path.join(managers_dir, manager)
+        if not os.path.isdir(manager_dir):
+            log_message(f"❌ Менеджер '{manager}' не найден")
+            continue
+        old_counts = load_ready_counts(manager_dir)
+        counts = rebuild_ready_counts(manager_dir, trust_manifests)
+        changed = old_counts is not None and old_counts != counts
+        log_message(f"🔢 Счётчики '{manager}' перестроены: {len(counts)} категорий, {sum(counts.values())} объявлений"
+                    + (" (были расхождения)" if changed else ""))
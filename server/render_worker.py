@@ -0,0 +1,73 @@
+# server/render_worker.py
+# Render Worker / Рабочий отрисовки
+
+"""
+Render Worker / Рабочий отрисовки
+
+Standalone worker mode: pulls uniquification render tasks from the Redis queue
+(modules/render_queue.py). Run on any node with the shared data/managers tree and
+access to the same Redis; enable USE_RENDER_QUEUE in render_queue on the server.
+Отдельный режим рабочего: забирает задачи отрисовки уникализации из очереди Redis
+(modules/render_queue.py). Запускается на любом узле с общим деревом data/managers и
+доступом к тому же Redis; на сервере включите USE_RENDER_QUEUE в render_queue.
+
+Worker processes that die (a crashing task, out of memory) are started again.
+Умершие рабочие процессы (падающая задача, нехватка памяти) запускаются заново.
+
+Usage / Использование:
+    cd server
+    python render_worker.py [processes]
+"""
+
+import sys
+import time
+import signal
+import multiprocessing
+from modules.redis_manager import initialize_redis, shutdown_redis
+from modules.render_queue import run_worker
+from modules.worker_pool import pool_size
+from modules.utils import log_message
+
+# ===== SETTINGS / НАСТРОЙКИ =====
+SUPERVISE_INTERVAL = 1.0  # Seconds between checks of worker processes / Секунд между проверками рабочих процессов
+RESPAWN_DELAY = 5.0  # Min seconds between restarts of one worker slot / Минимум секунд между перезапусками одного места рабочего
+
+def worker_main():
+    """Entry point of one worker process / Точка входа одного рабочего процесса"""
+    # Parent handles Ctrl+C and terminates children / Родитель обрабатывает Ctrl+C и завершает дочерние
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if not initialize_redis():
+        log_message("❌ Redis недоступен - рабочий отрисовки не запущен")
+        return
+    try:
+        run_worker()
+    finally:
+        shutdown_redis()
+
+def start_worker(ctx):
+    """Start one worker process / Запустить один рабочий процесс"""
+    worker = ctx.Process(target=worker_main, daemon=True)
+    worker.start()
+    return worker
+
+if __name__ == "__main__":
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else pool_size()
+    ctx = multiprocessing.get_context('spawn')
+    workers = [start_worker(ctx) for _ in range(processes)]
+    started = [time.time()] * processes
+    log_message(f"⚙️ Запущено {processes} рабочих отрисовки из очереди Redis")
+    try:
+        # Supervise: a dead worker is replaced, its claimed task becomes visible again after the timeout
+        # Надзор: умерший рабочий заменяется, его захваченная задача снова станет видимой после таймаута
+        while True:
+            time.sleep(SUPERVISE_INTERVAL)
+            for n, worker in enumerate(workers):
+                if worker.is_alive() or time.time() - started[n] < RESPAWN_DELAY:
+                    continue
+                log_message(f"⚠️ Рабочий отрисовки {worker.pid} завершился с кодом {worker.exitcode}, перезапуск")
+                workers[n] = start_worker(ctx)
+                started[n] = time.time()
+    except KeyboardInterrupt:
+        log_message("🛑 Получен сигнал остановки рабочих отрисовки")
+        for worker in workers:
+            worker.terminate()
@@ -0,0 +1,8 @@
+# server/tests/conftest.py
+# Test setup / Настройка тестов
+
+import os
+import sys
+
+# Tests import modules the way the server does (from server/) / Тесты импортируют модули так же, как сервер (из server/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,34 @@
+# server/tests/test_ad_selection.py
+# Ad Source Selection Test / Тест выбора исходников объявлений
+
+"""
+select_sources must not repeat a combination of kept ads in an incremental job.
+select_sources не должна повторять комбинации сохранённых объявлений в инкрементальной задаче.
+
+Run / Запуск:
+    cd server
+    python -m pytest -q tests
+"""
+
+import itertools
+import pytest
+from modules.ad_selection import select_sources
+
+POSITION_SOURCES = [['a1', 'a2', 'a3'], ['b1', 'b2', 'b3']]
+
+def combinations(selections):
+    """Selected rows as file tuples / Выбранные строки как кортежи файлов"""
+    return {tuple(files[k] for files, k in zip(POSITION_SOURCES, row)) for row in selections.tolist() if row[0] >= 0}
+
+@pytest.mark.parametrize('seed', range(20))
+def test_kept_combinations_are_not_repeated(seed):
+    all_rows = list(itertools.product(*POSITION_SOURCES))
+    kept = all_rows[seed % 3::3]
+    selections = select_sources(POSITION_SOURCES, len(all_rows) - len(kept), seed, exclude=kept)
+    # The rest of the space fits exactly, so every new ad gets one of the free combinations
+    # Остаток пространства помещается ровно, поэтому каждое новое объявление получает одну из свободных комбинаций
+    assert combinations(selections) == set(all_rows) - set(kept)
+
+def test_unknown_files_are_ignored():
+    selections = select_sources(POSITION_SOURCES, 3, 1, exclude=[('gone', 'b1'), ('a1',)])
+    assert (selections >= 0).all()
@@ -0,0 +1,63 @@
+# server/tests/test_color_matrix.py
+# Color Engine Regression Test / Регрессионный тест цветового движка
+
+"""
+apply_color_matrix must stay within COLOR_TOLERANCE levels per channel of the old
+ImageEnhance/NumPy chain it replaced.
+apply_color_matrix должна отличаться от заменённой цепочки ImageEnhance/NumPy не более
+чем на COLOR_TOLERANCE уровней на канал.
+
+Run / Запуск:
+    cd server
+    python -m pytest -q tests
+"""
+
+import random
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+from modules.image_processing import apply_color_matrix, BRIGHTNESS_RANGE, CONTRAST_RANGE, SATURATION_RANGE
+
+COLOR_TOLERANCE = 1  # Max per-channel difference in levels / Максимальная разница на канал в уровнях
+
+def old_color_chain(im, b, c, s):
+    """Color chain before the LUT + matrix engine / Цветовая цепочка до движка LUT + матрица"""
+    im = ImageEnhance.Brightness(im).enhance(b)
+    im = ImageEnhance.Contrast(im).enhance(c)
+    arr = np.array(im).astype(np.float32) / 255.0
+    gray = arr.mean(axis=2, keepdims=True)
+    arr = np.clip(gray + (arr - gray) * s, 0, 1)
+    return (arr * 255).astype(np.uint8)
+
+def make_image(rng, kind):
+    """Synthetic test frame / Синтетический тестовый кадр"""
+    if kind == 'full':
+        # Whole range, brightness and contrast clip / Весь диапазон, яркость и контраст обрезаются
+        arr = rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    elif kind == 'mid':
+        # Nothing clips / Ничего не обрезается
+        arr = rng.integers(40, 200, (48, 64, 3), dtype=np.uint8)
+    elif kind == 'gray':
+        arr = np.repeat(rng.integers(0, 256, (48, 64, 1), dtype=np.uint8), 3, axis=2)
+    else:
+        # Smooth gradient like a photo / Плавный градиент как на фото
+        y, x = np.mgrid[0:48, 0:64]
+        arr = np.stack([x * 4, y * 5, (x + y) * 2], axis=2).clip(0, 255).astype(np.uint8)
+    return Image.fromarray(arr)
+
+@pytest.mark.parametrize('kind', ['full', 'mid', 'gray', 'gradient'])
+def test_matches_old_chain(kind):
+    rng = np.random.default_rng(7)
+    factors = random.Random(7)
+    for _ in range(50):
+        im = make_image(rng, kind)
+        b = factors.uniform(*BRIGHTNESS_RANGE)
+        c = factors.uniform(*CONTRAST_RANGE)
+        s = factors.uniform(*SATURATION_RANGE)
+        expected = old_color_chain(im, b, c, s).astype(int)
+        actual = np.asarray(apply_color_matrix(im, b, c, s)).astype(int)
+        assert np.abs(actual - expected).max() <= COLOR_TOLERANCE, (kind, b, c, s)
+
+def test_identity_factors_keep_image():
+    im = make_image(np.random.default_rng(1), 'full')
+    assert np.array_equal(np.asarray(apply_color_matrix(im, 1.0, 1.0, 1.0)), np.asarray(im))
@@ -0,0 +1,34 @@
+# server/tests/test_generations.py
+# Generations Garbage Collection Test / Тест сборки мусора поколений
+
+"""
+A replaced generation must be kept GRACE_PERIOD seconds after the next one is published,
+even when the job that built the next one ran longer than that.
+Заменённое поколение должно храниться GRACE_PERIOD секунд после публикации следующего,
+даже если задача, собравшая следующее, шла дольше.
+
+Run / Запуск:
+    cd server
+    python -m pytest -q tests
+"""
+
+import os
+import time
+from modules.generations import publish_generation, collect_generations, generations_dir, GRACE_PERIOD
+
+def test_grace_period_counts_from_publish(tmp_path):
+    manager_dir = str(tmp_path)
+    gens_dir = generations_dir(manager_dir, 'cat')
+    now_ns = time.time_ns()
+    first = os.path.join(gens_dir, str(now_ns - 3 * GRACE_PERIOD * 10 ** 9))
+    os.makedirs(first)
+    publish_generation(manager_dir, 'cat', first)
+
+    # Staging created two grace periods ago: the job ran that long / Промежуточная директория создана два периода назад: задача шла так долго
+    second = os.path.join(gens_dir, str(now_ns - 2 * GRACE_PERIOD * 10 ** 9))
+    os.makedirs(second)
+    publish_generation(manager_dir, 'cat', second)
+    assert os.path.isdir(first)
+
+    assert collect_generations(manager_dir, 'cat', grace_period=0) == 1
+    assert not os.path.exists(first) and os.path.isdir(second)
@@ -0,0 +1,69 @@
+# server/tests/test_job_resume.py
+# Job Resume Test / Тест продолжения задачи
+
+"""
+A resumed job must publish the source combinations of every ad, including the ones finished
+before the interruption, so the next incremental job can't repeat them.
+Продолженная задача должна опубликовать комбинации исходников каждого объявления, включая
+готовые до прерывания, чтобы следующая инкрементальная задача не могла их повторить.
+
+Lazy mode is used: it writes recipes in the job thread, no worker pool is started.
+Используется отложенный режим: он пишет рецепты в потоке задачи, пул рабочих не запускается.
+
+Run / Запуск:
+    cd server
+    python -m pytest -q tests
+"""
+
+import os
+import pytest
+from PIL import Image
+import modules.ad_processing as ap
+from modules.ad_combinations import load_ad_combinations
+from modules.job_checkpoint import find_checkpoint
+from modules.lazy_render import load_recipe
+
+ADS_COUNT = 6
+SOURCES_COUNT = 14
+
+@pytest.fixture
+def manager_dir(tmp_path, monkeypatch):
+    """Manager with one category of small sources and no logo / Менеджер с одной категорией маленьких исходников без логотипа"""
+    monkeypatch.setattr(ap, 'BASE_DIR', str(tmp_path))
+    category = tmp_path / 'data' / 'managers' / 'm' / 'photo_cache' / 'cat'
+    category.mkdir(parents=True)
+    for k in range(SOURCES_COUNT):
+        Image.new('RGB', (64, 48), (k * 17, 255 - k * 17, 90)).save(category / f"src_{k:02d}.jpg")
+    return str(tmp_path / 'data' / 'managers' / 'm')
+
+def test_resumed_job_publishes_all_combinations(manager_dir, monkeypatch):
+    write_recipes = ap.write_recipes
+    calls = []
+
+    def crashing_write_recipes(context, manager_dir, photos):
+        """Server dies after a few chunks / Сервер падает после нескольких пачек"""
+        calls.append(photos)
+        if len(calls) > 3:
+            raise RuntimeError('interrupted')
+        return write_recipes(context, manager_dir, photos)
+
+    monkeypatch.setattr(ap, 'write_recipes', crashing_write_recipes)
+    ap.process_and_generate('cat', ADS_COUNT, False, 'm', lazy=True)
+    staging, _, completed = find_checkpoint(manager_dir, 'cat')
+    assert 0 < len(completed) < ADS_COUNT
+
+    monkeypatch.setattr(ap, 'write_recipes', write_recipes)
+    results = ap.process_and_generate('cat', ADS_COUNT, False, 'm', lazy=True, resume=True)
+    assert [number for number, _ in results] == list(range(1, ADS_COUNT + 1))
+
+    ready_dir = os.path.join(manager_dir, 'ready_photos', 'cat')
+    assert os.path.realpath(ready_dir) == os.path.realpath(staging)
+    combinations = load_ad_combinations(ready_dir, manager_dir)
+    assert sorted(combinations) == list(range(1, ADS_COUNT + 1))
+    for name in os.listdir(ready_dir):
+        recipe = load_recipe(os.path.join(ready_dir, name))
+        if recipe is None:
+            continue
+        number = int(ap.AD_DIR_PATTERN.match(name).group(1))
+        sources = [os.path.relpath(f, manager_dir) for f in combinations[number]]
+        assert sources == [photo['source'] for photo in recipe['photos']]
@@ -0,0 +1,50 @@
+# server/tests/test_job_scheduler.py
+# Job Scheduler Test / Тест планировщика задач
+
+"""
+A job whose category is already being built must wait in the queue, leaving the runner slot
+to other jobs.
+Задача, чья категория уже собирается, должна ждать в очереди, оставляя слот исполнителя
+другим задачам.
+
+Run / Запуск:
+    cd server
+    python -m pytest -q tests
+"""
+
+import threading
+from modules.job_scheduler import JobScheduler
+
+TIMEOUT = 5
+
+def test_same_key_waits_in_queue_not_in_a_slot():
+    scheduler = JobScheduler(max_running=2)
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def job(name):
+        order.append(name)
+        if name == 'first':
+            started.set()
+            assert release.wait(TIMEOUT)
+        return name
+
+    try:
+        first = scheduler.submit('m1', 10, job, 'first', key=('m1', 'cat'))
+        assert started.wait(TIMEOUT)
+        same = scheduler.submit('m1', 1, job, 'same category', key=('m1', 'cat'))
+        other = scheduler.submit('m2', 10, job, 'other', key=('m2', 'cat'))
+
+        # The second slot runs the other category although the same-category job is smaller
+        # Второй слот выполняет другую категорию, хотя задача той же категории меньше
+        assert other.result(TIMEOUT) == 'other'
+        assert not same.done()
+        assert scheduler.metrics()['queued'] == 1
+
+        release.set()
+        assert first.result(TIMEOUT) == 'first' and same.result(TIMEOUT) == 'same category'
+        assert order == ['first', 'other', 'same category']
+    finally:
+        release.set()
+        scheduler.shutdown()
@@ -0,0 +1,76 @@
+# server/tests/test_render_queue.py
+# Render Queue Test / Тест очереди отрисовки
+
+"""
+Queue operations against an in-process Redis (fakeredis): enqueue, claim, visibility timeout
+redelivery, ack and failing a task after MAX_ATTEMPTS claims.
+Операции очереди на Redis в процессе (fakeredis): постановка, захват, повторная выдача по
+таймауту видимости, подтверждение и провал задачи после MAX_ATTEMPTS захватов.
+
+Run / Запуск:
+    pip install fakeredis
+    cd server
+    python -m pytest -q tests
+"""
+
+import json
+import time
+import pytest
+from modules import render_queue as rq
+
+fakeredis = pytest.importorskip('fakeredis')
+
+PHOTOS = [[0, 11, 0], [0, 11, 1]]
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+def results(client, job_id):
+    """Published task results / Опубликованные результаты задач"""
+    return [json.loads(item) for item in client.lrange(rq.results_key(job_id), 0, -1)]
+
+def test_claim_hides_task_until_visibility_timeout(client):
+    rq.enqueue('job:0', {'job_id': 'job', 'photos': PHOTOS}, client)
+    now = time.time()
+    assert rq.claim(client, now=now) == ('job:0', 1, {'job_id': 'job', 'photos': PHOTOS})
+    assert rq.claim(client, now=now + 1) is None
+    assert rq.queue_depth(client) == 1
+
+    # Worker died: the task is delivered again / Рабочий упал: задача выдаётся снова
+    task_id, attempts, _ = rq.claim(client, now=now + rq.VISIBILITY_TIMEOUT + 1)
+    assert (task_id, attempts) == ('job:0', 2)
+
+def test_claim_is_fifo(client):
+    for k in range(3):
+        rq.enqueue(f"job:{k}", {'job_id': 'job', 'photos': []}, client)
+    assert [rq.claim(client)[0] for _ in range(3)] == ['job:0', 'job:1', 'job:2']
+
+def test_ack_removes_task_and_publishes_result(client):
+    rq.enqueue('job:0', {'job_id': 'job', 'photos': PHOTOS}, client)
+    task_id, _, _ = rq.claim(client)
+    rq.ack(task_id, 'job', {'done': [[0, 0, True]]}, client)
+
+    assert rq.queue_depth(client) == 0
+    assert not client.hexists(rq.TASKS_KEY, task_id) and not client.hexists(rq.ATTEMPTS_KEY, task_id)
+    assert results(client, 'job') == [{'done': [[0, 0, True]], 'task_id': 'job:0'}]
+    assert rq.claim(client, now=time.time() + rq.VISIBILITY_TIMEOUT + 1) is None
+
+def test_task_fails_after_max_attempts(client):
+    rq.enqueue('job:0', {'job_id': 'job', 'photos': PHOTOS}, client)
+    now = time.time()
+    for attempt in range(rq.MAX_ATTEMPTS + 1):
+        claimed = rq.claim(client, now=now + attempt * (rq.VISIBILITY_TIMEOUT + 1))
+    assert claimed[1] == rq.MAX_ATTEMPTS + 1
+
+    # Never rendered: its photos are reported failed and the task leaves the queue
+    # Не отрисовывается: её фотографии сообщаются неудачными, и задача уходит из очереди
+    rq.process_task(*claimed, client=client)
+    assert rq.queue_depth(client) == 0
+    assert results(client, 'job') == [{'done': [[0, 0, False], [0, 1, False]], 'task_id': 'job:0'}]
+
+def test_task_without_context_is_failed(client):
+    rq.enqueue('gone:0', {'job_id': 'gone', 'photos': PHOTOS}, client)
+    rq.process_task(*rq.claim(client), client=client)
+    assert rq.queue_depth(client) == 0
+    assert [photo[2] for photo in results(client, 'gone')[0]['done']] == [False, False]